@@ -0,0 +1,253 @@
+import argparse
+import json
+import re
+import sqlite3
+import sys
+import threading
+import time
+from collections import OrderedDict
+from concurrent.futures import Future, ThreadPoolExecutor
+from http.server import BaseHTTPRequestHandler, ThreadingHTTPServer
+from urllib.parse import parse_qs, urlparse
+
+import requests
+from requests.adapters import HTTPAdapter
+
+API_URL = 'https://api.duckduckgo.com/'
+NO_ANSWER = "I'm sorry, I don't know the answer to that."
+ERROR_ANSWER = "Sorry, I couldn't process that question."
+
+# (connect, read) timeouts in seconds for the remote API
+TIMEOUT = (3.05, 10)
+
+
+# Function to map questions that differ only in case, spacing or trailing punctuation to one key
+def normalize_query(question):
+    question = re.sub(r'\s+', ' ', question.lower()).strip()
+    return question.strip(' ?!.,;:')
+
+
+class TTLCache:
+    def __init__(self, max_size=1024, ttl=3600):
+        self.max_size = max_size
+        self.ttl = ttl
+        self.entries = OrderedDict()
+        self.lock = threading.Lock()
+
+    def get(self, key):
+        with self.lock:
+            entry = self.entries.get(key)
+            if entry is None:
+                return None
+            if entry[1] < time.monotonic():
+                del self.entries[key]
+                return None
+            self.entries.move_to_end(key)
+            return entry[0]
+
+    def set(self, key, value):
+        with self.lock:
+            self.entries[key] = (value, time.monotonic() + self.ttl)
+            self.entries.move_to_end(key)
+            while len(self.entries) > self.max_size:
+                self.entries.popitem(last=False)
+
+    def __len__(self):
+        return len(self.entries)
+
+
+# Optional second tier that keeps answers across restarts
+class DiskCache:
+    def __init__(self, path, ttl=7 * 24 * 3600):
+        self.ttl = ttl
+        self.conn = sqlite3.connect(path, check_same_thread=False, isolation_level=None)
+        self.conn.execute('PRAGMA journal_mode=WAL')
+        self.conn.execute('''
+            CREATE TABLE IF NOT EXISTS answers (
+                query TEXT PRIMARY KEY,
+                answer TEXT NOT NULL,
+                expires REAL NOT NULL
+            )
+        ''')
+        self.lock = threading.Lock()
+
+    def get(self, key):
+        with self.lock:
+            row = self.conn.execute('SELECT answer, expires FROM answers WHERE query = ?', (key,)).fetchone()
+        if row is None or row[1] < time.time():
+            return None
+        return row[0]
+
+    def set(self, key, value):
+        with self.lock:
+            self.conn.execute('INSERT OR REPLACE INTO answers (query, answer, expires) VALUES (?, ?, ?)',
+                              (key, value, time.time() + self.ttl))
+
+    def close(self):
+        self.conn.close()
+
+
+class AnswerService:
+    def __init__(self, api_url=API_URL, timeout=TIMEOUT, cache_size=1024, ttl=3600, disk_path=None,
+                 pool_size=10):
+        self.api_url = api_url
+        self.timeout = timeout
+        self.memory = TTLCache(cache_size, ttl)
+        self.disk = DiskCache(disk_path) if disk_path else None
+        # One keep-alive connection pool for every lookup instead of a new TCP connection each time
+        self.session = requests.Session()
+        adapter = HTTPAdapter(pool_connections=pool_size, pool_maxsize=pool_size)
+        self.session.mount('http://', adapter)
+        self.session.mount('https://', adapter)
+        self.in_flight = {}
+        self.lock = threading.Lock()
+        self.stats = {'memory_hits': 0, 'disk_hits': 0, 'coalesced': 0, 'fetches': 0, 'errors': 0}
+
+    def count(self, name):
+        with self.lock:
+            self.stats[name] += 1
+
+    def fetch(self, question):
+        self.count('fetches')
+        response = self.session.get(self.api_url, params={'q': question, 'format': 'json'}, timeout=self.timeout)
+        response.raise_for_status()
+        data = response.json()
+        if not isinstance(data, dict):
+            raise ValueError("Unexpected API response")
+        return data.get("AbstractText") or NO_ANSWER
+
+    def cached(self, key):
+        answer = self.memory.get(key)
+        if answer is not None:
+            self.count('memory_hits')
+            return answer
+        if self.disk is not None:
+            answer = self.disk.get(key)
+            if answer is not None:
+                self.count('disk_hits')
+                self.memory.set(key, answer)
+                return answer
+        return None
+
+    def answer(self, question):
+        key = normalize_query(question)
+        answer = self.cached(key)
+        if answer is not None:
+            return answer
+
+        # Identical questions asked while a fetch is running wait for that fetch
+        with self.lock:
+            future = self.in_flight.get(key)
+            leader = future is None
+            if leader:
+                future = Future()
+                self.in_flight[key] = future
+            else:
+                self.stats['coalesced'] += 1
+        if not leader:
+            return future.result()
+
+        # Whatever happens the future is resolved, or the waiters would block forever
+        try:
+            try:
+                answer = self.fetch(key)
+            except (requests.RequestException, ValueError):
+                self.count('errors')
+                answer = ERROR_ANSWER
+            else:
+                self.memory.set(key, answer)
+                if self.disk is not None:
+                    self.disk.set(key, answer)
+        except BaseException as error:
+            self.count('errors')
+            future.set_exception(error)
+            raise
+        else:
+            future.set_result(answer)
+        finally:
+            with self.lock:
+                del self.in_flight[key]
+        return answer
+
+    def metrics(self):
+        with self.lock:
+            stats = dict(self.stats)
+        lookups = stats['memory_hits'] + stats['disk_hits'] + stats['coalesced'] + stats['fetches']
+        stats['hit_rate'] = (stats['memory_hits'] + stats['disk_hits']) / lookups if lookups else 0.0
+        stats['cached_answers'] = len(self.memory)
+        return stats
+
+    def close(self):
+        self.session.close()
+        if self.disk is not None:
+            self.disk.close()
+
+
+# Local stand-in for the DuckDuckGo API, answers every question after an optional delay
+class StubAnswerServer:
+    def __init__(self, delay=0.0, host='127.0.0.1', port=0):
+        stub = self
+        self.delay = delay
+        self.requests = 0
+
+        class Handler(BaseHTTPRequestHandler):
+            protocol_version = 'HTTP/1.1'
+
+            def do_GET(self):
+                stub.requests += 1
+                query = parse_qs(urlparse(self.path).query).get('q', [''])[0]
+                if stub.delay:
+                    time.sleep(stub.delay)
+                body = json.dumps({'AbstractText': f"Stub answer for {query}"}).encode()
+                self.send_response(200)
+                self.send_header('Content-Type', 'application/json')
+                self.send_header('Content-Length', str(len(body)))
+                self.end_headers()
+                self.wfile.write(body)
+
+            def log_message(self, format, *args):
+                pass
+
+        self.server = ThreadingHTTPServer((host, port), Handler)
+        self.server.daemon_threads = True
+        self.url = f"http://{host}:{self.server.server_address[1]}/"
+        self.thread = threading.Thread(target=self.server.serve_forever, daemon=True)
+
+    def __enter__(self):
+        self.thread.start()
+        return self
+
+    def __exit__(self, *exc):
+        self.server.shutdown()
+        self.server.server_close()
+
+
+def benchmark(questions=200, asks=5000, clients=32, delay=0.02):
+    with StubAnswerServer(delay) as stub:
+        service = AnswerService(stub.url, pool_size=clients)
+        # Popular questions repeat and arrive with different spelling, as chat users type them
+        texts = [f"What is topic {index % questions}{'?' if index % 3 else ''}" for index in range(asks)]
+        start = time.perf_counter()
+        with ThreadPoolExecutor(max_workers=clients) as executor:
+            list(executor.map(service.answer, texts))
+        seconds = time.perf_counter() - start
+        results = service.metrics()
+        results['answers_per_second'] = asks / seconds
+        results['stub_requests'] = stub.requests
+        service.close()
+    return results
+
+
+def main(argv=None):
+    parser = argparse.ArgumentParser(description="Benchmark the cached answer service against a local stub API")
+    parser.add_argument('--questions', type=int, default=200, help="distinct questions")
+    parser.add_argument('--asks', type=int, default=5000)
+    parser.add_argument('--clients', type=int, default=32)
+    parser.add_argument('--delay', type=float, default=0.02, help="stub API latency in seconds")
+    args = parser.parse_args(argv)
+    print(json.dumps(benchmark(args.questions, args.asks, args.clients, args.delay), indent=2))
+    return 0
+
+
+if __name__ == '__main__':
+    sys.exit(main())
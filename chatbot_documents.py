@@ -0,0 +1,150 @@
+import hashlib
+import os
+import zipfile
+import xml.etree.ElementTree as ET
+from concurrent.futures import ThreadPoolExecutor
+
+from chatbot_knowledge import KnowledgeBase
+
+# Every user's uploads go in a database of their own here, so they only ever answer that user
+DOCUMENTS_DIR = 'uploaded_documents'
+DOCUMENT_EXTENSIONS = ('.txt', '.pdf', '.docx')
+CHUNK_CHARS = 2000
+# Most of a document is only indexed, this much of it is shown in the chat
+PREVIEW_CHARS = 1500
+READ_SIZE = 1 << 16
+# Share of a question's words a part of an upload must contain to answer it. Looser than the knowledge
+# base's: only the user's own documents are searched, and questions about them name things that the
+# document words differently ("can I return the blender" against a returns paragraph).
+DOCUMENT_COVERAGE = 0.5
+
+WORD_NAMESPACE = '{http://schemas.openxmlformats.org/wordprocessingml/2006/main}'
+
+
+class DocumentError(Exception):
+    pass
+
+
+def extract_txt(path):
+    with open(path, 'r', encoding='utf-8', errors='replace') as file:
+        for block in iter(lambda: file.read(READ_SIZE), ''):
+            yield block
+
+
+def extract_docx(path):
+    # Paragraphs are parsed one at a time from the zipped XML and then discarded
+    try:
+        archive = zipfile.ZipFile(path)
+    except zipfile.BadZipFile:
+        raise DocumentError(f"{os.path.basename(path)} is not a valid .docx file")
+    with archive, archive.open('word/document.xml') as document:
+        for event, element in ET.iterparse(document, events=('end',)):
+            if element.tag == WORD_NAMESPACE + 'p':
+                text = ''.join(node.text or '' for node in element.iter(WORD_NAMESPACE + 't'))
+                if text:
+                    yield text + '\n'
+                element.clear()
+
+
+def extract_pdf(path):
+    try:
+        from pypdf import PdfReader
+    except ImportError:
+        raise DocumentError("Reading PDF files needs the pypdf package")
+    # Given a path PdfReader reads the whole file into memory, an open file is read as pages need it
+    with open(path, 'rb') as file:
+        reader = PdfReader(file)
+        for page in reader.pages:
+            text = page.extract_text() or ''
+            if text:
+                yield text + '\n'
+
+
+EXTRACTORS = {'.txt': extract_txt, '.docx': extract_docx, '.pdf': extract_pdf}
+
+
+def extract_text(path):
+    extension = os.path.splitext(path)[1].lower()
+    extractor = EXTRACTORS.get(extension)
+    if extractor is None:
+        raise DocumentError(f"Unsupported file type: {extension}")
+    return extractor(path)
+
+
+# Function to regroup a stream of text pieces into chunks of about chunk_chars, split on whitespace.
+# Chunks are cut from each piece by offset, the leftover is copied once per piece.
+def chunk_text(pieces, chunk_chars=CHUNK_CHARS):
+    buffer = ''
+    for piece in pieces:
+        buffer += piece
+        start = 0
+        while len(buffer) - start >= chunk_chars:
+            cut = buffer.rfind(' ', start, start + chunk_chars)
+            if cut <= start:
+                cut = start + chunk_chars
+            yield buffer[start:cut].strip()
+            start = cut
+        buffer = buffer[start:]
+    if buffer.strip():
+        yield buffer.strip()
+
+
+def documents_path_for(username, directory=DOCUMENTS_DIR):
+    return os.path.join(directory, hashlib.sha256(username.encode('utf-8')).hexdigest()[:32] + '.db')
+
+
+class DocumentIndex:
+    def __init__(self, path, batch_size=500):
+        directory = os.path.dirname(path)
+        if directory:
+            os.makedirs(directory, exist_ok=True)
+        self.knowledge_base = KnowledgeBase(path)
+        self.batch_size = batch_size
+
+    def ingest(self, path, chunk_chars=CHUNK_CHARS, preview_chars=PREVIEW_CHARS):
+        name = os.path.basename(path)
+        preview = ''
+        total_chars = 0
+        chunks = 0
+        batch = []
+        for chunk in chunk_text(extract_text(path), chunk_chars):
+            if len(preview) < preview_chars:
+                # Chunks are stripped at the cut, put the space back between them
+                preview += (' ' if preview else '') + chunk
+                preview = preview[:preview_chars]
+            total_chars += len(chunk)
+            chunks += 1
+            batch.append((f"{name} part {chunks}", chunk, None))
+            if len(batch) >= self.batch_size:
+                self.knowledge_base.add_documents(batch)
+                batch = []
+        if batch:
+            self.knowledge_base.add_documents(batch)
+        return preview, chunks, total_chars
+
+    def answer(self, question, min_coverage=DOCUMENT_COVERAGE):
+        return self.knowledge_base.answer(question, min_coverage)
+
+
+def open_document_index(username):
+    return DocumentIndex(documents_path_for(username))
+
+
+# Ingests uploads into the uploader's index on a worker thread and hands the preview back through schedule
+class DocumentIngestor:
+    def __init__(self, schedule=None):
+        self.schedule = schedule or (lambda callback: callback())
+        self.executor = ThreadPoolExecutor(max_workers=1, thread_name_prefix='document-ingest')
+
+    def submit(self, index, path, on_done):
+        def run():
+            try:
+                preview, chunks, total_chars = index.ingest(path)
+                result = (preview, chunks, total_chars, None)
+            except Exception as error:  # unreadable or malformed file, reported to the chat
+                result = ('', 0, 0, str(error))
+            self.schedule(lambda: on_done(path, *result))
+        return self.executor.submit(run)
+
+    def shutdown(self):
+        self.executor.shutdown(wait=False, cancel_futures=True)
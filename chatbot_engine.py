@@ -0,0 +1,54 @@
+import os
+
+from chatbot_intents import load_intents
+from chatbot_answers import AnswerService
+from chatbot_knowledge import open_knowledge_base
+try:
+    from chatbot_retrieval import load_faq
+except ImportError:  # numpy/scipy are only needed for FAQ retrieval
+    load_faq = None
+
+# The chatbot's answers without any UI, shared by the Kivy app and the chat server
+
+intent_engine = load_intents()
+
+def chatbot_response(user_input):
+    response = intent_engine.respond(user_input)
+    if response is not None:
+        return response
+    return answer_general_question(user_input.lower())
+
+# FAQ retrieval, the user's uploaded documents and the local knowledge base answer first. The remote API is off unless
+# CHATBOT_REMOTE_API=1 is set or use_remote_api() is called, so an offline install never reaches out.
+USE_REMOTE_API = os.environ.get('CHATBOT_REMOTE_API') == '1'
+faq_retriever = load_faq() if load_faq is not None else None
+knowledge_base = open_knowledge_base()
+answer_service = None
+
+def use_remote_api(enabled=True):
+    global answer_service
+    if answer_service is not None:
+        answer_service.close()
+        answer_service = None
+    if enabled:
+        answer_service = AnswerService(disk_path='answers_cache.db')
+
+use_remote_api(USE_REMOTE_API)
+
+# Function to answer a question; documents is the asking user's DocumentIndex, if they have one
+def answer_general_question(question, documents=None):
+    if faq_retriever is not None:
+        answer = faq_retriever.answer(question)
+        if answer is not None:
+            return answer
+    if documents is not None:
+        answer = documents.answer(question)
+        if answer is not None:
+            return answer
+    if knowledge_base is not None:
+        answer = knowledge_base.answer(question)
+        if answer is not None:
+            return answer
+    if answer_service is not None:
+        return answer_service.answer(question)
+    return "I'm sorry, I don't know the answer to that."
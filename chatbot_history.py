@@ -0,0 +1,295 @@
+import os
+import queue
+import sqlite3
+import sys
+import tempfile
+import threading
+import time
+
+from user_store import DB_PATH, ConnectionPool
+
+MAX_IN_MEMORY = 1000
+PAGE_SIZE = 200
+# Longest a read waits for queued messages to reach the database, the UI thread must not hang on a stuck writer
+FLUSH_TIMEOUT = 5.0
+# Tries at writing a batch before it is given up on
+WRITE_ATTEMPTS = 3
+
+
+# Messages that have left the in-memory window, kept in SQLite until the user scrolls back to them.
+# Without a path they go to a temporary file, removed on close, so they really leave process memory.
+class MessageSpill:
+    persistent = False
+
+    def __init__(self, path=None):
+        self.temporary = path is None
+        if self.temporary:
+            descriptor, path = tempfile.mkstemp(prefix='chat-spill-', suffix='.db')
+            os.close(descriptor)
+        self.path = path
+        self.conn = sqlite3.connect(path, check_same_thread=False, isolation_level=None)
+        self.conn.execute('''
+            CREATE TABLE IF NOT EXISTS chat_spill (
+                seq INTEGER PRIMARY KEY,
+                text TEXT NOT NULL,
+                bot INTEGER NOT NULL
+            )
+        ''')
+        self.lock = threading.Lock()
+
+    def record(self, message):
+        pass
+
+    def push(self, messages):
+        with self.lock:
+            self.conn.execute('BEGIN')
+            self.conn.executemany('INSERT OR IGNORE INTO chat_spill (seq, text, bot) VALUES (?, ?, ?)',
+                                  [(message['seq'], message['text'], int(message['bot'])) for message in messages])
+            self.conn.execute('COMMIT')
+
+    def before(self, seq, count):
+        with self.lock:
+            rows = self.conn.execute('SELECT seq, text, bot FROM chat_spill WHERE seq < ? ORDER BY seq DESC LIMIT ?',
+                                     (seq, count)).fetchall()
+        return [{'seq': row[0], 'text': row[1], 'bot': bool(row[2])} for row in reversed(rows)]
+
+    def after(self, seq, count):
+        with self.lock:
+            rows = self.conn.execute('SELECT seq, text, bot FROM chat_spill WHERE seq > ? ORDER BY seq LIMIT ?',
+                                     (seq, count)).fetchall()
+        return [{'seq': row[0], 'text': row[1], 'bot': bool(row[2])} for row in rows]
+
+    def clear(self):
+        with self.lock:
+            self.conn.execute('DELETE FROM chat_spill')
+
+    def close(self):
+        self.conn.close()
+        if self.temporary:
+            try:
+                os.remove(self.path)
+            except OSError:
+                pass
+
+
+# Every user's conversation, stored next to the users table and written in batches by a background thread
+class ConversationStore:
+    def __init__(self, path=DB_PATH, batch_size=100, flush_interval=0.5):
+        self.pool = ConnectionPool(path, size=4)
+        self.batch_size = batch_size
+        self.flush_interval = flush_interval
+        with self.pool.connection() as conn:
+            conn.execute('''
+                CREATE TABLE IF NOT EXISTS messages (
+                    username TEXT NOT NULL,
+                    seq INTEGER NOT NULL,
+                    timestamp REAL NOT NULL,
+                    text TEXT NOT NULL,
+                    bot INTEGER NOT NULL,
+                    PRIMARY KEY (username, seq)
+                ) WITHOUT ROWID
+            ''')
+            conn.execute('CREATE INDEX IF NOT EXISTS idx_messages_user_time ON messages (username, timestamp)')
+        self.pending = queue.Queue()
+        self.writer = threading.Thread(target=self.write_loop, name='conversation-writer', daemon=True)
+        self.writer.start()
+
+    def for_user(self, username):
+        return UserConversation(self, username)
+
+    def write_loop(self):
+        while True:
+            batch = [self.pending.get()]
+            deadline = time.monotonic() + self.flush_interval
+            # Wait a little for more messages so they share one transaction, unless a reader is waiting
+            while len(batch) < self.batch_size:
+                timeout = deadline - time.monotonic()
+                if timeout <= 0 or not isinstance(batch[-1], tuple):
+                    break
+                try:
+                    batch.append(self.pending.get(timeout=timeout))
+                except queue.Empty:
+                    break
+            rows = [row for row in batch if isinstance(row, tuple)]
+            try:
+                if rows:
+                    self.write_rows(rows)
+            finally:
+                for item in batch:
+                    # flush() queues an Event to be told its messages are written
+                    if isinstance(item, threading.Event):
+                        item.set()
+                    self.pending.task_done()
+            if batch[-1] is None:
+                return
+
+    # Function to commit a batch, retrying when the database is busy. A batch that still fails is dropped
+    # with a message rather than stopping the writer, which would leave every later flush() waiting.
+    def write_rows(self, rows):
+        for attempt in range(WRITE_ATTEMPTS):
+            try:
+                with self.pool.transaction() as conn:
+                    conn.executemany('INSERT OR REPLACE INTO messages (username, seq, timestamp, text, bot) '
+                                     'VALUES (?, ?, ?, ?, ?)', rows)
+                return
+            except sqlite3.Error as error:
+                if attempt == WRITE_ATTEMPTS - 1:
+                    print(f"Dropped {len(rows)} chat messages that could not be saved: {error}", file=sys.stderr)
+                else:
+                    time.sleep(self.flush_interval)
+
+    def write(self, username, message):
+        self.pending.put((username, message['seq'], message['time'], message['text'], int(message['bot'])))
+
+    # Function to wait until every queued message is on disk. Reads call it from the UI thread, so the
+    # writer is told to commit right away rather than at the end of its flush_interval, and the wait is
+    # cut off after timeout seconds. Returns False if it stopped waiting before the writer got there.
+    def flush(self, timeout=FLUSH_TIMEOUT):
+        if not self.pending.unfinished_tasks:
+            return True
+        if not self.writer.is_alive():
+            return False
+        written = threading.Event()
+        self.pending.put(written)
+        return written.wait(timeout)
+
+    def query(self, sql, params):
+        self.flush()
+        with self.pool.connection() as conn:
+            rows = conn.execute(sql, params).fetchall()
+        return [{'seq': row[0], 'time': row[1], 'text': row[2], 'bot': bool(row[3])} for row in rows]
+
+    def last_seq(self, username):
+        self.flush()
+        with self.pool.connection() as conn:
+            row = conn.execute('SELECT max(seq) FROM messages WHERE username = ?', (username,)).fetchone()
+        return row[0] if row[0] is not None else -1
+
+    def close(self):
+        self.pending.put(None)
+        self.writer.join()
+        self.pool.close()
+
+
+class UserConversation:
+    persistent = True
+
+    def __init__(self, store, username):
+        self.store = store
+        self.username = username
+
+    def record(self, message):
+        self.store.write(self.username, message)
+
+    def push(self, messages):
+        # Already written by record, nothing has to be saved when messages leave memory
+        pass
+
+    def before(self, seq, count):
+        rows = self.store.query('SELECT seq, timestamp, text, bot FROM messages WHERE username = ? AND seq < ? '
+                                'ORDER BY seq DESC LIMIT ?', (self.username, seq, count))
+        return rows[::-1]
+
+    def after(self, seq, count):
+        return self.store.query('SELECT seq, timestamp, text, bot FROM messages WHERE username = ? AND seq > ? '
+                                'ORDER BY seq LIMIT ?', (self.username, seq, count))
+
+    def last_seq(self):
+        return self.store.last_seq(self.username)
+
+    def clear(self):
+        with self.store.pool.connection() as conn:
+            self.store.flush()
+            conn.execute('DELETE FROM messages WHERE username = ?', (self.username,))
+
+
+# The conversation as a sliding window of message dicts over the spill store: at most
+# max_in_memory messages are held (and laid out), the rest are paged in on scroll
+class ChatHistory:
+    def __init__(self, spill=None, max_in_memory=MAX_IN_MEMORY, page_size=PAGE_SIZE):
+        self.spill = spill if spill is not None else MessageSpill()
+        self.max_in_memory = max_in_memory
+        self.page_size = page_size
+        # Messages before first_seq were cleared from the screen but stay in a persistent store
+        self.first_seq = 0
+        if self.spill.persistent:
+            # Reopening a conversation reads only its newest page
+            self.next_seq = self.spill.last_seq() + 1
+            self.messages = self.spill.before(self.next_seq, page_size)
+        else:
+            self.next_seq = 0
+            self.messages = []
+
+    def __len__(self):
+        return len(self.messages)
+
+    def at_latest(self):
+        return not self.messages or self.messages[-1]['seq'] == self.next_seq - 1
+
+    def older_page(self, count):
+        if not self.messages:
+            return []
+        return [message for message in self.spill.before(self.messages[0]['seq'], count)
+                if message['seq'] >= self.first_seq]
+
+    def has_older(self):
+        return bool(self.older_page(1))
+
+    def has_newer(self):
+        return not self.at_latest()
+
+    def trim_oldest(self):
+        extra = len(self.messages) - self.max_in_memory
+        if extra <= 0:
+            return 0
+        # Trim a page at a time so the spill cost is paid once every page_size messages
+        count = max(extra, min(self.page_size, len(self.messages) - 1))
+        self.spill.push(self.messages[:count])
+        del self.messages[:count]
+        return count
+
+    def trim_newest(self):
+        extra = len(self.messages) - self.max_in_memory
+        if extra <= 0:
+            return 0
+        self.spill.push(self.messages[-extra:])
+        del self.messages[-extra:]
+        return extra
+
+    # Function to add a message, returns it and how many old messages were dropped from the front
+    def append(self, text, bot):
+        if not self.at_latest():
+            self.jump_to_latest()
+        message = {'seq': self.next_seq, 'time': time.time(), 'text': text, 'bot': bot}
+        self.next_seq += 1
+        self.messages.append(message)
+        self.spill.record(message)
+        return message, self.trim_oldest()
+
+    def load_older(self):
+        older = self.older_page(self.page_size)
+        self.messages[:0] = older
+        return older, self.trim_newest()
+
+    def load_newer(self):
+        if not self.messages:
+            return [], 0
+        newer = self.spill.after(self.messages[-1]['seq'], self.page_size)
+        self.messages.extend(newer)
+        return newer, self.trim_oldest()
+
+    def jump_to_latest(self):
+        self.spill.push(self.messages)
+        self.messages = [message for message in self.spill.before(self.next_seq, self.page_size)
+                         if message['seq'] >= self.first_seq]
+
+    def clear(self):
+        self.messages = []
+        if self.spill.persistent:
+            self.first_seq = self.next_seq
+        else:
+            self.spill.clear()
+
+    def close(self):
+        if not self.spill.persistent:
+            self.spill.close()
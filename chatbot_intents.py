@@ -0,0 +1,148 @@
+import argparse
+import json
+import os
+import random
+import re
+import sys
+import time
+
+INTENTS_PATH = os.path.join(os.path.dirname(os.path.abspath(__file__)), 'chatbot_intents.json')
+
+# Words are runs of letters/digits, keeping apostrophes inside words like "what's"
+WORD_RE = re.compile(r"[^\W_]+(?:'[^\W_]+)*")
+
+
+def tokenize(text):
+    return WORD_RE.findall(text.lower())
+
+
+class Intent:
+    def __init__(self, name, patterns, responses, priority=0, order=0):
+        if not responses:
+            raise ValueError(f"Intent {name} has no responses")
+        self.name = name
+        self.patterns = patterns
+        self.responses = responses
+        self.priority = priority
+        # Earlier intents in the rules file win ties, like the old if/elif chain
+        self.rank = (-priority, order)
+
+    def respond(self):
+        return random.choice(self.responses)
+
+
+# Patterns are compiled into one trie over word tokens, so a message is matched in a single
+# pass over its words whatever the number of rules, and "hi" can no longer match inside "this"
+class IntentEngine:
+    def __init__(self, intents):
+        self.intents = intents
+        self.trie = {}
+        for intent in intents:
+            for pattern in intent.patterns:
+                words = tokenize(pattern)
+                if not words:
+                    continue
+                node = self.trie
+                for word in words:
+                    node = node.setdefault(word, {})
+                best = node.get(None)
+                if best is None or intent.rank < best.rank:
+                    node[None] = intent
+
+    @classmethod
+    def from_rules(cls, rules):
+        intents = [
+            Intent(rule['name'], rule.get('patterns', []), rule.get('responses', []), rule.get('priority', 0), order)
+            for order, rule in enumerate(rules)
+        ]
+        return cls(intents)
+
+    def match(self, text):
+        words = tokenize(text)
+        best = None
+        trie = self.trie
+        for start in range(len(words)):
+            node = trie
+            for word in words[start:]:
+                node = node.get(word)
+                if node is None:
+                    break
+                intent = node.get(None)
+                if intent is not None and (best is None or intent.rank < best.rank):
+                    best = intent
+        return best
+
+    def respond(self, text):
+        intent = self.match(text)
+        return intent.respond() if intent is not None else None
+
+
+def load_intents(path=INTENTS_PATH):
+    with open(path, encoding='utf-8') as file:
+        return IntentEngine.from_rules(json.load(file)['intents'])
+
+
+def legacy_chain(rules):
+    # The if/elif chain generalised to any rule list: a substring test per pattern, in order
+    ordered = sorted(enumerate(rules), key=lambda item: (-item[1].get('priority', 0), item[0]))
+    chain = [(pattern.lower(), rule['responses'][0]) for _, rule in ordered for pattern in rule['patterns']]
+
+    def respond(text):
+        text = text.lower()
+        for pattern, response in chain:
+            if pattern in text:
+                return response
+        return None
+    return respond
+
+
+def synthetic_rules(count):
+    with open(INTENTS_PATH, encoding='utf-8') as file:
+        rules = json.load(file)['intents']
+    for index in range(count - len(rules)):
+        rules.append({
+            'name': f'topic{index}',
+            'priority': 0,
+            'patterns': [f'topic{index}', f'ask about subject{index}'],
+            'responses': [f'Here is what I know about topic {index}.'],
+        })
+    return rules
+
+
+def benchmark(rule_counts=(5, 100, 1000, 5000), messages=2000):
+    # Most real messages match no rule and fall through to the general question lookup,
+    # which is the worst case for the chain: every pattern is tested
+    sample = [
+        "hello there", "what's your name", "can you help me with topic42 please",
+        "what year was the eiffel tower completed", "tell me a joke", "who wrote war and peace",
+        "what is the capital of australia", "explain quantum computing simply",
+    ]
+    texts = [sample[index % len(sample)] for index in range(messages)]
+    results = []
+    for count in rule_counts:
+        rules = synthetic_rules(count)
+        engine = IntentEngine.from_rules(rules)
+        chain = legacy_chain(rules)
+        timings = {}
+        for name, respond in (('engine', engine.respond), ('if_elif_chain', chain)):
+            start = time.perf_counter()
+            for text in texts:
+                respond(text)
+            timings[name] = (time.perf_counter() - start) / messages * 1e6
+        results.append((count, timings['engine'], timings['if_elif_chain']))
+    return results
+
+
+def main(argv=None):
+    parser = argparse.ArgumentParser(description="Benchmark the compiled intent engine against the if/elif chain")
+    parser.add_argument('--messages', type=int, default=2000)
+    parser.add_argument('--rules', type=int, nargs='+', default=[5, 100, 1000, 5000])
+    args = parser.parse_args(argv)
+    print(f"{'rules':>8} {'engine us/msg':>14} {'if/elif us/msg':>15}")
+    for count, engine_us, chain_us in benchmark(args.rules, args.messages):
+        print(f"{count:>8} {engine_us:>14.2f} {chain_us:>15.2f}")
+    return 0
+
+
+if __name__ == '__main__':
+    sys.exit(main())
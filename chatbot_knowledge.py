@@ -0,0 +1,225 @@
+import argparse
+import json
+import os
+import random
+import sqlite3
+import sys
+import tempfile
+import threading
+import time
+
+from chatbot_intents import tokenize
+
+KNOWLEDGE_PATH = 'knowledge.db'
+MAX_ANSWER_CHARS = 500
+# Share of the question's words a document must contain before it is used as the answer. The search ORs
+# the words, so without this "capital of germany" would be answered by the best "capital of france" entry.
+MIN_COVERAGE = 0.75
+# Best ranked documents checked for coverage when answering
+CANDIDATES = 20
+
+# Question words that appear everywhere and would only slow the index down
+STOPWORDS = frozenset('''
+    a an and are as at be by can could do does did for from how i in is it me of on or please tell
+    that the this to was were what when where which who whom why will with would you your
+'''.split())
+
+
+class KnowledgeBase:
+    def __init__(self, path=KNOWLEDGE_PATH):
+        self.path = path
+        self.local = threading.local()
+        with self.connection() as conn:
+            conn.execute('''
+                CREATE VIRTUAL TABLE IF NOT EXISTS documents USING fts5(
+                    title, body, answer UNINDEXED, tokenize = 'porter unicode61'
+                )
+            ''')
+
+    # One connection per thread, the chat pipeline queries from its worker threads
+    def connection(self):
+        conn = getattr(self.local, 'conn', None)
+        if conn is None:
+            conn = sqlite3.connect(self.path, isolation_level=None)
+            conn.execute('PRAGMA journal_mode=WAL')
+            self.local.conn = conn
+        return _Transaction(conn)
+
+    def __len__(self):
+        with self.connection() as conn:
+            return conn.execute('SELECT count(*) FROM documents').fetchone()[0]
+
+    def add_documents(self, documents):
+        with self.connection() as conn:
+            conn.executemany('INSERT INTO documents (title, body, answer) VALUES (?, ?, ?)', documents)
+
+    # Function to stream a .jsonl ({"question", "answer"} or {"title", "text"}) or .txt corpus into the index
+    def ingest(self, path, chunk_size=10000, progress=None):
+        count = 0
+        chunk = []
+        for document in read_documents(path):
+            chunk.append(document)
+            if len(chunk) >= chunk_size:
+                self.add_documents(chunk)
+                count += len(chunk)
+                chunk = []
+                if progress is not None:
+                    progress(count)
+        if chunk:
+            self.add_documents(chunk)
+            count += len(chunk)
+        with self.connection() as conn:
+            conn.execute("INSERT INTO documents (documents) VALUES ('optimize')")
+        if progress is not None:
+            progress(count)
+        return count
+
+    # Function to find the best matches for a question, leaving out those containing less than
+    # min_coverage of its words
+    def search(self, question, limit=3, min_coverage=0.0):
+        words = list(dict.fromkeys(word for word in tokenize(question) if word not in STOPWORDS))
+        if not words:
+            return []
+        # Quote every word so user text can never be read as FTS5 query syntax
+        terms = ['"' + word.replace('"', '""') + '"' for word in words]
+        with self.connection() as conn:
+            rows = conn.execute(
+                'SELECT rowid, title, body, answer, bm25(documents, 2.0, 1.0) AS score FROM documents '
+                'WHERE documents MATCH ? ORDER BY score LIMIT ?',
+                (' OR '.join(terms), max(limit, CANDIDATES) if min_coverage else limit),
+            ).fetchall()
+            if min_coverage and rows:
+                rowids = [row[0] for row in rows]
+                placeholders = ','.join('?' * len(rowids))
+                matched = dict.fromkeys(rowids, 0)
+                # One lookup per word, limited to the candidates, counts the words each candidate contains
+                for term in terms:
+                    for (rowid,) in conn.execute(f'SELECT rowid FROM documents WHERE documents MATCH ? '
+                                                 f'AND rowid IN ({placeholders})', (term, *rowids)):
+                        matched[rowid] += 1
+                rows = [row for row in rows if matched[row[0]] >= min_coverage * len(terms)]
+        return [row[1:] for row in rows[:limit]]
+
+    def answer(self, question, min_coverage=MIN_COVERAGE):
+        results = self.search(question, 1, min_coverage)
+        if not results:
+            return None
+        title, body, answer, _ = results[0]
+        text = answer or body
+        if len(text) > MAX_ANSWER_CHARS:
+            text = text[:MAX_ANSWER_CHARS].rsplit(' ', 1)[0] + '...'
+        return text
+
+    def close(self):
+        conn = getattr(self.local, 'conn', None)
+        if conn is not None:
+            conn.close()
+            self.local.conn = None
+
+
+class _Transaction:
+    def __init__(self, conn):
+        self.conn = conn
+
+    def __enter__(self):
+        self.conn.execute('BEGIN')
+        return self.conn
+
+    def __exit__(self, exc_type, exc, traceback):
+        self.conn.execute('ROLLBACK' if exc_type else 'COMMIT')
+
+
+def read_documents(path):
+    with open(path, encoding='utf-8') as file:
+        if path.endswith(('.jsonl', '.json')):
+            for line in file:
+                if not line.strip():
+                    continue
+                record = json.loads(line)
+                if 'question' in record:
+                    yield record['question'], record.get('context', ''), record['answer']
+                else:
+                    yield record.get('title', ''), record['text'], None
+        else:
+            # Plain text: one document per blank-line separated paragraph, first line as title
+            paragraph = []
+            for line in file:
+                if line.strip():
+                    paragraph.append(line.strip())
+                elif paragraph:
+                    yield paragraph[0], ' '.join(paragraph), None
+                    paragraph = []
+            if paragraph:
+                yield paragraph[0], ' '.join(paragraph), None
+
+
+def open_knowledge_base(path=KNOWLEDGE_PATH):
+    if not os.path.exists(path):
+        return None
+    return KnowledgeBase(path)
+
+
+def benchmark(documents=1000000, queries=1000, chunk_size=50000):
+    rng = random.Random(0)
+    vocabulary = [f"term{index}" for index in range(50000)]
+    results = {}
+    with tempfile.TemporaryDirectory() as directory:
+        kb = KnowledgeBase(os.path.join(directory, 'knowledge.db'))
+        start = time.perf_counter()
+        for offset in range(0, documents, chunk_size):
+            kb.add_documents(
+                (f"question {index} " + ' '.join(rng.choices(vocabulary, k=4)),
+                 ' '.join(rng.choices(vocabulary, k=30)),
+                 f"answer {index}")
+                for index in range(offset, min(offset + chunk_size, documents))
+            )
+        with kb.connection() as conn:
+            conn.execute("INSERT INTO documents (documents) VALUES ('optimize')")
+        results['index_documents_per_second'] = documents / (time.perf_counter() - start)
+
+        latencies = []
+        for _ in range(queries):
+            question = "what is " + ' '.join(rng.choices(vocabulary, k=3))
+            start = time.perf_counter()
+            kb.answer(question)
+            latencies.append(time.perf_counter() - start)
+        latencies.sort()
+        results['query_ms_p50'] = latencies[len(latencies) // 2] * 1000
+        results['query_ms_p99'] = latencies[int(len(latencies) * 0.99)] * 1000
+        results['database_mb'] = os.path.getsize(os.path.join(directory, 'knowledge.db')) / 2 ** 20
+        kb.close()
+    return results
+
+
+def main(argv=None):
+    parser = argparse.ArgumentParser(description="Build and query the chatbot's offline knowledge base")
+    parser.add_argument('--db', default=KNOWLEDGE_PATH)
+    subparsers = parser.add_subparsers(dest='command', required=True)
+    index_parser = subparsers.add_parser('index', help="add a .jsonl or .txt corpus to the knowledge base")
+    index_parser.add_argument('paths', nargs='+')
+    query_parser = subparsers.add_parser('query', help="answer a question from the knowledge base")
+    query_parser.add_argument('question')
+    bench_parser = subparsers.add_parser('bench', help="index synthetic documents and time queries")
+    bench_parser.add_argument('--documents', type=int, default=1000000)
+    bench_parser.add_argument('--queries', type=int, default=1000)
+    args = parser.parse_args(argv)
+
+    if args.command == 'index':
+        kb = KnowledgeBase(args.db)
+        for path in args.paths:
+            count = kb.ingest(path, progress=lambda done: print(f"\r{path}: {done} documents", end='', file=sys.stderr))
+            print(f"\r{path}: indexed {count} documents", file=sys.stderr)
+    elif args.command == 'query':
+        kb = KnowledgeBase(args.db)
+        start = time.perf_counter()
+        answer = kb.answer(args.question)
+        print(answer if answer is not None else "No answer found.")
+        print(f"({(time.perf_counter() - start) * 1000:.1f} ms)", file=sys.stderr)
+    else:
+        for name, value in benchmark(args.documents, args.queries).items():
+            print(f"{name}: {value:.2f}")
+    return 0
+
+
+if __name__ == '__main__':
+    sys.exit(main())
@@ -0,0 +1,185 @@
+import hashlib
+import os
+import sqlite3
+import threading
+from collections import OrderedDict
+from concurrent.futures import ProcessPoolExecutor, ThreadPoolExecutor
+from concurrent.futures.process import BrokenProcessPool
+
+import pytesseract
+from PIL import Image as PILImage, ImageOps
+
+OCR_CACHE_PATH = 'ocr_cache.db'
+IMAGE_EXTENSIONS = ('.png', '.jpg', '.jpeg', '.bmp', '.gif')
+# Tesseract reads text well at this size, bigger photos only cost time
+MAX_SIDE = 2000
+# OCR results kept in memory, the rest are read back from the cache database
+MEMORY_ENTRIES = 256
+
+
+# Raised by ocr_image in place of the original error, which may not survive the trip back from the worker
+class OCRError(Exception):
+    pass
+
+
+def file_hash(path, chunk_size=1 << 20):
+    digest = hashlib.sha256()
+    with open(path, 'rb') as file:
+        for chunk in iter(lambda: file.read(chunk_size), b''):
+            digest.update(chunk)
+    return digest.hexdigest()
+
+
+# Function to pick the black/white threshold that best separates the histogram into two classes
+def otsu_threshold(histogram):
+    total = sum(histogram)
+    weighted_total = sum(level * count for level, count in enumerate(histogram))
+    background = weighted_background = 0
+    best_level, best_variance = 127, -1.0
+    for level, count in enumerate(histogram):
+        background += count
+        if background == 0:
+            continue
+        foreground = total - background
+        if foreground == 0:
+            break
+        weighted_background += level * count
+        mean_background = weighted_background / background
+        mean_foreground = (weighted_total - weighted_background) / foreground
+        variance = background * foreground * (mean_background - mean_foreground) ** 2
+        if variance > best_variance:
+            best_level, best_variance = level, variance
+    return best_level
+
+
+def preprocess(image, max_side=MAX_SIDE):
+    image = ImageOps.exif_transpose(image)
+    if max(image.size) > max_side:
+        image.thumbnail((max_side, max_side), PILImage.LANCZOS)
+    gray = ImageOps.autocontrast(image.convert('L'))
+    threshold = otsu_threshold(gray.histogram())
+    return gray.point(lambda level: 255 if level > threshold else 0, mode='1')
+
+
+# Runs in a worker process. Some pytesseract errors can't be unpickled, and one that reached the parent
+# would break the whole pool, so every failure goes back as a plain OCRError.
+def ocr_image(path, max_side=MAX_SIDE):
+    try:
+        with PILImage.open(path) as image:
+            return pytesseract.image_to_string(preprocess(image, max_side))
+    except Exception as error:
+        raise OCRError(f"{type(error).__name__}: {error}") from None
+
+
+class OCRCache:
+    def __init__(self, path=OCR_CACHE_PATH, memory_entries=MEMORY_ENTRIES):
+        self.memory = OrderedDict()
+        self.memory_entries = memory_entries
+        self.conn = sqlite3.connect(path, check_same_thread=False, isolation_level=None)
+        self.conn.execute('CREATE TABLE IF NOT EXISTS ocr_cache (hash TEXT PRIMARY KEY, text TEXT NOT NULL)')
+        self.lock = threading.Lock()
+
+    def get(self, key):
+        with self.lock:
+            text = self.memory.get(key)
+            if text is not None:
+                self.memory.move_to_end(key)
+                return text
+            row = self.conn.execute('SELECT text FROM ocr_cache WHERE hash = ?', (key,)).fetchone()
+            if row is not None:
+                text = row[0]
+                self.remember(key, text)
+        return text
+
+    def set(self, key, text):
+        with self.lock:
+            self.remember(key, text)
+            self.conn.execute('INSERT OR REPLACE INTO ocr_cache (hash, text) VALUES (?, ?)', (key, text))
+
+    def remember(self, key, text):
+        self.memory[key] = text
+        self.memory.move_to_end(key)
+        while len(self.memory) > self.memory_entries:
+            self.memory.popitem(last=False)
+
+    def close(self):
+        self.conn.close()
+
+
+class OCRJob:
+    def __init__(self, paths):
+        self.total = len(paths)
+        self.done = 0
+        self.cancelled = False
+        self.lock = threading.Lock()
+
+    def finish_one(self):
+        with self.lock:
+            self.done += 1
+            return self.done
+
+
+# Hashing and cache lookups run on threads, the OCR itself on a process pool; every result and
+# progress update is handed back through schedule (Clock.schedule_once in the Kivy app)
+class OCRQueue:
+    def __init__(self, workers=None, cache=None, schedule=None, max_side=MAX_SIDE):
+        self.workers = workers or os.cpu_count() or 1
+        self.processes = ProcessPoolExecutor(max_workers=self.workers)
+        self.pool_lock = threading.Lock()
+        self.threads = ThreadPoolExecutor(max_workers=4, thread_name_prefix='ocr')
+        self.cache = cache if cache is not None else OCRCache()
+        self.schedule = schedule or (lambda callback: callback())
+        self.max_side = max_side
+        self.jobs = set()
+
+    def submit_batch(self, paths, on_result, on_progress=None):
+        job = OCRJob(paths)
+        self.jobs.add(job)
+        if on_progress is not None:
+            self.schedule(lambda: on_progress(0, job.total))
+        for path in paths:
+            self.threads.submit(self.run, job, path, on_result, on_progress)
+        return job
+
+    def run(self, job, path, on_result, on_progress):
+        if job.cancelled:
+            return
+        try:
+            key = file_hash(path)
+            text = self.cache.get(key)
+            if text is None:
+                text = self.recognize(path)
+                self.cache.set(key, text)
+        except Exception as error:  # unreadable image or OCR failure, reported to the chat
+            text = None
+            path = f"{path} ({error})"
+        done = job.finish_one()
+        if done == job.total:
+            self.jobs.discard(job)
+        if job.cancelled:
+            return
+        self.schedule(lambda: on_result(path, text))
+        if on_progress is not None:
+            self.schedule(lambda: on_progress(done, job.total))
+
+    # Function to OCR one image on the process pool, replacing the pool once if a worker died
+    def recognize(self, path):
+        processes = self.processes
+        try:
+            return processes.submit(ocr_image, path, self.max_side).result()
+        except BrokenProcessPool:
+            with self.pool_lock:
+                if self.processes is processes:
+                    processes.shutdown(wait=False, cancel_futures=True)
+                    self.processes = ProcessPoolExecutor(max_workers=self.workers)
+            return self.processes.submit(ocr_image, path, self.max_side).result()
+
+    def cancel_all(self):
+        for job in list(self.jobs):
+            job.cancelled = True
+        self.jobs.clear()
+
+    def shutdown(self):
+        self.cancel_all()
+        self.threads.shutdown(wait=False, cancel_futures=True)
+        self.processes.shutdown(wait=False, cancel_futures=True)
@@ -0,0 +1,153 @@
+import argparse
+import json
+import sys
+import threading
+import time
+from concurrent.futures import ThreadPoolExecutor
+
+from chatbot_answers import AnswerService, StubAnswerServer
+from chatbot_intents import load_intents
+
+DEADLINE = 5.0
+DEADLINE_ANSWER = "Sorry, that is taking too long to look up. Please try asking again later."
+
+
+class PendingAnswer:
+    def __init__(self, message, on_answer):
+        self.message = message
+        self.on_answer = on_answer
+        self.done = False
+        self.timer = None
+        self.future = None
+        self.lock = threading.Lock()
+
+    def finish(self):
+        # Only the first of answer, deadline or cancel gets through
+        with self.lock:
+            if self.done:
+                return False
+            self.done = True
+        if self.timer is not None:
+            self.timer.cancel()
+        return True
+
+    def cancel(self):
+        if self.finish() and self.future is not None:
+            self.future.cancel()
+
+
+# Answers rule-based messages straight away and looks everything else up on worker threads,
+# handing results back through schedule (Clock.schedule_once in the Kivy app)
+class AnswerPipeline:
+    def __init__(self, intent_engine, answer, deadline=DEADLINE, workers=8, schedule=None,
+                 deadline_answer=DEADLINE_ANSWER):
+        self.intent_engine = intent_engine
+        self.answer = answer
+        self.deadline = deadline
+        self.deadline_answer = deadline_answer
+        self.schedule = schedule or (lambda callback: callback())
+        self.executor = ThreadPoolExecutor(max_workers=workers, thread_name_prefix='chat-answer')
+        self.pending = set()
+        self.lock = threading.Lock()
+
+    def submit(self, message, on_answer, on_pending=None):
+        response = self.intent_engine.respond(message)
+        if response is not None:
+            on_answer(response)
+            return None
+
+        request = PendingAnswer(message, on_answer)
+        with self.lock:
+            self.pending.add(request)
+        if on_pending is not None:
+            on_pending()
+        request.timer = threading.Timer(self.deadline, self.deliver, (request, self.deadline_answer))
+        request.timer.daemon = True
+        request.timer.start()
+        request.future = self.executor.submit(self.lookup, request)
+        return request
+
+    def lookup(self, request):
+        if request.done:
+            return
+        self.deliver(request, self.answer(request.message.lower()))
+
+    def deliver(self, request, answer):
+        if not request.finish():
+            return
+        with self.lock:
+            self.pending.discard(request)
+        self.schedule(lambda: request.on_answer(answer))
+
+    @property
+    def pending_count(self):
+        return len(self.pending)
+
+    def cancel_all(self):
+        with self.lock:
+            pending, self.pending = self.pending, set()
+        for request in pending:
+            request.cancel()
+
+    def shutdown(self):
+        self.cancel_all()
+        self.executor.shutdown(wait=False)
+
+
+def benchmark(messages=50, delay=2.0, deadline=1.0):
+    with StubAnswerServer(delay) as stub:
+        service = AnswerService(stub.url)
+        pipeline = AnswerPipeline(load_intents(), service.answer, deadline=deadline, workers=messages)
+        texts = [f"what is slow topic {index}" for index in range(messages)]
+        texts += ["hello", "what's your name"]
+
+        # Time the UI thread is blocked per message, the old synchronous path first
+        start = time.perf_counter()
+        service.answer("what is a warm-up question")
+        blocking_sync = time.perf_counter() - start
+
+        answered = threading.Semaphore(0)
+        latencies = []
+        fallbacks = []
+        submit_times = []
+
+        def on_answer(started):
+            def record(answer):
+                latencies.append(time.perf_counter() - started)
+                fallbacks.append(answer == DEADLINE_ANSWER)
+                answered.release()
+            return record
+
+        for text in texts:
+            started = time.perf_counter()
+            pipeline.submit(text, on_answer(started))
+            submit_times.append(time.perf_counter() - started)
+        for _ in texts:
+            answered.acquire()
+        pipeline.shutdown()
+        service.close()
+    latencies.sort()
+    return {
+        'stub_delay_s': delay,
+        'deadline_s': deadline,
+        'sync_blocking_ms': blocking_sync * 1000,
+        'pipeline_blocking_ms_max': max(submit_times) * 1000,
+        'answer_latency_ms_p50': latencies[len(latencies) // 2] * 1000,
+        'answer_latency_ms_max': latencies[-1] * 1000,
+        'deadline_fallbacks': sum(fallbacks),
+        'messages': len(texts),
+    }
+
+
+def main(argv=None):
+    parser = argparse.ArgumentParser(description="Latency of the chat answer pipeline against a slow stub API")
+    parser.add_argument('--messages', type=int, default=50)
+    parser.add_argument('--delay', type=float, default=2.0, help="stub API latency in seconds")
+    parser.add_argument('--deadline', type=float, default=1.0)
+    args = parser.parse_args(argv)
+    print(json.dumps(benchmark(args.messages, args.delay, args.deadline), indent=2))
+    return 0
+
+
+if __name__ == '__main__':
+    sys.exit(main())
@@ -0,0 +1,238 @@
+import argparse
+import json
+import os
+import random
+import sys
+import time
+import zlib
+
+import numpy as np
+import scipy.sparse as sp
+
+from chatbot_intents import tokenize
+from chatbot_knowledge import read_documents
+
+FAQ_PATH = 'faq.jsonl'
+N_FEATURES = 2 ** 18
+MIN_SCORE = 0.3
+
+
+# Words and word pairs hashed into a fixed number of columns, so no vocabulary has to be kept
+def hashed_features(text, n_features=N_FEATURES):
+    words = tokenize(text)
+    grams = words + [f"{first} {second}" for first, second in zip(words, words[1:])]
+    return [zlib.crc32(gram.encode()) % n_features for gram in grams]
+
+
+def count_matrix(texts, n_features=N_FEATURES):
+    indptr = [0]
+    indices = []
+    for text in texts:
+        indices.extend(hashed_features(text, n_features))
+        indptr.append(len(indices))
+    data = np.ones(len(indices), dtype=np.float32)
+    matrix = sp.csr_matrix((data, np.array(indices, dtype=np.int32), np.array(indptr, dtype=np.int64)),
+                           shape=(len(texts), n_features))
+    matrix.sum_duplicates()
+    return matrix
+
+
+def normalize_rows(matrix):
+    norms = np.sqrt(np.asarray(matrix.multiply(matrix).sum(axis=1)).ravel())
+    norms[norms == 0] = 1
+    return sp.diags(1 / norms).dot(matrix).tocsr()
+
+
+def top_k_rows(scores, k):
+    results = []
+    for row in range(scores.shape[0]):
+        start, end = scores.indptr[row], scores.indptr[row + 1]
+        data = scores.data[start:end]
+        columns = scores.indices[start:end]
+        if len(data) > k:
+            keep = np.argpartition(-data, k)[:k]
+            data, columns = data[keep], columns[keep]
+        order = np.argsort(-data, kind='stable')
+        results.append([(int(columns[index]), float(data[index])) for index in order])
+    return results
+
+
+class FAQRetriever:
+    def __init__(self, questions, answers, n_features=N_FEATURES):
+        self.answers = list(answers)
+        self.n_features = n_features
+        counts = count_matrix(questions, n_features)
+        document_frequency = np.bincount(counts.indices, minlength=n_features)
+        self.idf = (np.log((1 + counts.shape[0]) / (1 + document_frequency)) + 1).astype(np.float32)
+        self.matrix = self.weight(counts)
+        # Kept as features x documents so a query row multiplies straight into document scores
+        self.matrix_t = self.matrix.T.tocsr()
+        self.partitions = None
+
+    def weight(self, counts):
+        counts = counts.copy()
+        counts.data = (1 + np.log(counts.data)) * self.idf[counts.indices]
+        return normalize_rows(counts)
+
+    def vectorize(self, messages):
+        return self.weight(count_matrix(messages, self.n_features))
+
+    # Function to split the corpus into clusters (spherical k-means) so queries only score a few of them
+    def build_partitions(self, clusters=None, iterations=3, seed=0):
+        rows = self.matrix.shape[0]
+        clusters = clusters or max(1, int(np.sqrt(rows)))
+        rng = np.random.default_rng(seed)
+        centroids = self.matrix[rng.choice(rows, size=min(clusters, rows), replace=False)]
+        for _ in range(iterations):
+            assignment = np.asarray(self.matrix.dot(centroids.T).argmax(axis=1)).ravel()
+            membership = sp.csr_matrix((np.ones(rows, dtype=np.float32), (assignment, np.arange(rows))),
+                                       shape=(centroids.shape[0], rows))
+            centroids = normalize_rows(membership.dot(self.matrix))
+        order = np.argsort(assignment, kind='stable')
+        bounds = np.searchsorted(assignment[order], np.arange(centroids.shape[0] + 1))
+        ordered = self.matrix[order]
+        blocks = [ordered[bounds[cluster]:bounds[cluster + 1]].T.tocsr() for cluster in range(centroids.shape[0])]
+        self.partitions = (centroids.T.tocsr(), order, bounds, blocks)
+
+    # Function to find the k best documents for every message. Exact unless probes is given and
+    # build_partitions has run, then only the probes clusters nearest each message are scored.
+    def query_batch(self, messages, k=5, probes=None):
+        queries = self.vectorize(messages)
+        if self.partitions is None or probes is None:
+            return top_k_rows(queries.dot(self.matrix_t).tocsr(), k)
+
+        centroids_t, order, bounds, blocks = self.partitions
+        probes = min(probes, centroids_t.shape[1])
+        closeness = queries.dot(centroids_t).toarray()
+        nearest = np.argpartition(-closeness, probes - 1, axis=1)[:, :probes]
+        # Group the batch by cluster so every probed cluster is scored with one matrix product
+        pair_rows = np.repeat(np.arange(len(messages)), probes)
+        pair_clusters = nearest.ravel()
+        by_cluster = np.argsort(pair_clusters, kind='stable')
+        pair_rows, pair_clusters = pair_rows[by_cluster], pair_clusters[by_cluster]
+        starts = np.flatnonzero(np.diff(pair_clusters, prepend=-1))
+        ends = np.append(starts[1:], len(pair_clusters))
+        found_rows, found_documents, found_scores = [], [], []
+        for start, end in zip(starts, ends):
+            cluster = pair_clusters[start]
+            scores = queries[pair_rows[start:end]].dot(blocks[cluster]).tocoo()
+            found_rows.append(pair_rows[start:end][scores.row])
+            found_documents.append(order[bounds[cluster] + scores.col])
+            found_scores.append(scores.data)
+        if not found_rows:
+            return [[] for _ in messages]
+        rows = np.concatenate(found_rows)
+        documents = np.concatenate(found_documents)
+        scores = np.concatenate(found_scores)
+        # Best first within each message, ties to the lower document, then keep each message's first k
+        ranked = np.lexsort((documents, -scores, rows))
+        rows, documents, scores = rows[ranked], documents[ranked], scores[ranked]
+        row_starts = np.searchsorted(rows, np.arange(len(messages) + 1))
+        keep = np.arange(len(rows)) - row_starts[rows] < k
+        rows, documents, scores = rows[keep], documents[keep].tolist(), scores[keep].tolist()
+        row_starts = np.searchsorted(rows, np.arange(len(messages) + 1)).tolist()
+        return [list(zip(documents[row_starts[row]:row_starts[row + 1]], scores[row_starts[row]:row_starts[row + 1]]))
+                for row in range(len(messages))]
+
+    def answer_batch(self, messages, min_score=MIN_SCORE):
+        answers = []
+        for matches in self.query_batch(messages, k=1):
+            if matches and matches[0][1] >= min_score:
+                answers.append(self.answers[matches[0][0]])
+            else:
+                answers.append(None)
+        return answers
+
+    def answer(self, message, min_score=MIN_SCORE):
+        return self.answer_batch([message], min_score)[0]
+
+
+def load_faq(path=FAQ_PATH):
+    if not os.path.exists(path):
+        return None
+    questions = []
+    answers = []
+    for title, body, answer in read_documents(path):
+        questions.append(f"{title} {body}".strip())
+        answers.append(answer or body)
+    return FAQRetriever(questions, answers)
+
+
+# Offline evaluation: {"message": ..., "answer": ...} lines scored in one batch
+def evaluate(retriever, path, batch_size=1000):
+    with open(path, encoding='utf-8') as file:
+        cases = [json.loads(line) for line in file if line.strip()]
+    correct = 0
+    start = time.perf_counter()
+    for offset in range(0, len(cases), batch_size):
+        batch = cases[offset:offset + batch_size]
+        for case, answer in zip(batch, retriever.answer_batch([case['message'] for case in batch])):
+            correct += answer == case['answer']
+    seconds = time.perf_counter() - start
+    return {'cases': len(cases), 'accuracy': correct / len(cases) if cases else 0.0,
+            'queries_per_second': len(cases) / seconds if seconds else 0.0}
+
+
+def benchmark(documents=100000, queries=2000, clusters=None, probes=None):
+    rng = random.Random(0)
+    vocabulary = [f"word{index}" for index in range(20000)]
+    questions = [' '.join(rng.choices(vocabulary, k=8)) for _ in range(documents)]
+    messages = [' '.join(rng.sample(questions[rng.randrange(documents)].split(), 5)) for _ in range(queries)]
+    results = {}
+    start = time.perf_counter()
+    retriever = FAQRetriever(questions, range(documents))
+    results['build_seconds'] = time.perf_counter() - start
+
+    start = time.perf_counter()
+    exact = retriever.query_batch(messages, k=1)
+    results['exact_batch_qps'] = queries / (time.perf_counter() - start)
+    start = time.perf_counter()
+    for message in messages[:200]:
+        retriever.query_batch([message], k=1)
+    results['exact_single_qps'] = 200 / (time.perf_counter() - start)
+
+    start = time.perf_counter()
+    retriever.build_partitions(clusters)
+    results['partition_seconds'] = time.perf_counter() - start
+    probes = probes or max(1, retriever.partitions[0].shape[1] // 10)
+    start = time.perf_counter()
+    approximate = retriever.query_batch(messages, k=1, probes=probes)
+    results['partitioned_batch_qps'] = queries / (time.perf_counter() - start)
+    agree = sum(1 for a, b in zip(exact, approximate) if a and b and a[0][0] == b[0][0])
+    results['partitioned_recall_at_1'] = agree / queries
+    return results
+
+
+def main(argv=None):
+    parser = argparse.ArgumentParser(description="TF-IDF retrieval over the chatbot FAQ")
+    subparsers = parser.add_subparsers(dest='command', required=True)
+    query_parser = subparsers.add_parser('query', help="answer messages from an FAQ file")
+    query_parser.add_argument('messages', nargs='+')
+    query_parser.add_argument('--faq', default=FAQ_PATH)
+    eval_parser = subparsers.add_parser('evaluate', help="batch-score labelled messages")
+    eval_parser.add_argument('cases')
+    eval_parser.add_argument('--faq', default=FAQ_PATH)
+    bench_parser = subparsers.add_parser('bench', help="queries/sec on a synthetic corpus")
+    bench_parser.add_argument('--documents', type=int, default=100000)
+    bench_parser.add_argument('--queries', type=int, default=2000)
+    bench_parser.add_argument('--clusters', type=int, default=None)
+    bench_parser.add_argument('--probes', type=int, default=None, help="clusters scored per query, default a tenth")
+    args = parser.parse_args(argv)
+
+    if args.command == 'bench':
+        for name, value in benchmark(args.documents, args.queries, args.clusters, args.probes).items():
+            print(f"{name}: {value:.3f}")
+        return 0
+    retriever = load_faq(args.faq)
+    if retriever is None:
+        parser.error(f"FAQ file not found: {args.faq}")
+    if args.command == 'query':
+        for message, answer in zip(args.messages, retriever.answer_batch(args.messages)):
+            print(f"{message} -> {answer}")
+    else:
+        print(json.dumps(evaluate(retriever, args.cases), indent=2))
+    return 0
+
+
+if __name__ == '__main__':
+    sys.exit(main())
@@ -0,0 +1,249 @@
+import argparse
+import asyncio
+import json
+import os
+import random
+import sqlite3
+import sys
+import tempfile
+import time
+from concurrent.futures import ThreadPoolExecutor
+
+from chatbot_intents import load_intents
+from chatbot_pipeline import DEADLINE, DEADLINE_ANSWER
+from chatbot_session import BURST, RATE, ChatError, RateLimited, SessionManager
+from user_store import UserStore, default_store
+
+# Protocol: one JSON object per line in each direction.
+#   {"op": "login", "username": "amy", "password": "..."}  -> {"ok": true, "session": "Xy...", "username": "amy"}
+#   {"op": "message", "session": "Xy...", "text": "hi"}     -> {"ok": true, "reply": "Hello! How can I help you?"}
+#   {"op": "logout", "session": "Xy..."}                    -> {"ok": true}
+# Errors come back as {"ok": false, "error": "..."}, plus "retry_after" (seconds) when rate limited.
+HOST = '127.0.0.1'
+PORT = 8766
+
+
+class ChatServer:
+    def __init__(self, intent_engine, answer, store=None, manager=None, deadline=DEADLINE, answer_threads=32,
+                 db_threads=4):
+        self.intent_engine = intent_engine
+        self.answer = answer
+        self.store = store or default_store
+        self.manager = manager or SessionManager()
+        self.deadline = deadline
+        # Lookups can wait on the network and logins on SQLite, neither may block the event loop
+        self.answer_pool = ThreadPoolExecutor(max_workers=answer_threads, thread_name_prefix='chat-answer')
+        self.db_pool = ThreadPoolExecutor(max_workers=db_threads, thread_name_prefix='chat-db')
+        self.requests = 0
+
+    async def login(self, username, password):
+        if not isinstance(username, str) or not isinstance(password, str):
+            raise ChatError("Username and password are required")
+        loop = asyncio.get_running_loop()
+        if not await loop.run_in_executor(self.db_pool, self.store.authenticate, username, password):
+            raise ChatError("Invalid username or password")
+        # Not waited for, the reply doesn't depend on it; a failure is still reported
+        recorded = loop.run_in_executor(self.db_pool, self.store.record_login, username)
+        recorded.add_done_callback(report_failure)
+        return self.manager.login(username)
+
+    async def respond(self, text):
+        reply = self.intent_engine.respond(text)
+        if reply is not None:
+            return reply
+        lookup = asyncio.get_running_loop().run_in_executor(self.answer_pool, self.answer, text.lower())
+        try:
+            return await asyncio.wait_for(lookup, self.deadline)
+        except asyncio.TimeoutError:
+            return DEADLINE_ANSWER
+
+    async def handle_request(self, request):
+        op = request.get('op')
+        if op == 'login':
+            session = await self.login(request.get('username'), request.get('password'))
+            return session.snapshot()
+        session = self.manager.get(str(request.get('session')))
+        if op == 'message':
+            text = request.get('text')
+            session.check_message(text)
+            reply = await self.respond(text)
+            session.record(text, reply)
+            return session.snapshot(reply)
+        if op == 'logout':
+            self.manager.close(session.session_id)
+            return {}
+        raise ChatError(f"Unknown op: {op}")
+
+    async def handle_client(self, reader, writer):
+        try:
+            while True:
+                line = await reader.readline()
+                if not line:
+                    break
+                self.requests += 1
+                try:
+                    reply = await self.handle_request(json.loads(line))
+                    reply['ok'] = True
+                except RateLimited as error:
+                    reply = {'ok': False, 'error': str(error), 'retry_after': error.retry_after}
+                except (ChatError, ValueError, TypeError, AttributeError) as error:
+                    reply = {'ok': False, 'error': str(error)}
+                except sqlite3.Error as error:
+                    print(f"Users database error: {error}", file=sys.stderr)
+                    reply = {'ok': False, 'error': "The user database is unavailable, try again later"}
+                writer.write(json.dumps(reply).encode() + b'\n')
+                await writer.drain()
+        except ConnectionError:
+            pass
+        finally:
+            writer.close()
+
+    async def expire_loop(self, interval=60):
+        while True:
+            await asyncio.sleep(interval)
+            self.manager.expire_idle()
+
+    async def start(self, host=HOST, port=PORT):
+        server = await asyncio.start_server(self.handle_client, host, port, limit=2 ** 16, backlog=4096)
+        self.expire_task = asyncio.create_task(self.expire_loop())
+        return server
+
+    def close(self):
+        self.expire_task.cancel()
+        self.answer_pool.shutdown(wait=False)
+        self.db_pool.shutdown(wait=False)
+
+
+def report_failure(future):
+    if not future.cancelled() and future.exception() is not None:
+        print(f"Could not record login: {future.exception()}", file=sys.stderr)
+
+
+async def serve(host=HOST, port=PORT, rate=RATE, burst=BURST, remote_api=False):
+    # Loads the FAQ, knowledge base and answer cache, so only imported when actually serving
+    from chatbot_engine import answer_general_question, intent_engine, use_remote_api
+    if remote_api:
+        use_remote_api()
+    # Creates the users table on a fresh install and brings an older users.db up to the current schema
+    default_store.create_table()
+    chat_server = ChatServer(intent_engine, answer_general_question, manager=SessionManager(rate=rate, burst=burst))
+    server = await chat_server.start(host, port)
+    print(f"Chat server listening on {host}:{port}")
+    async with server:
+        await server.serve_forever()
+
+
+# Load generator: each client logs in over its own connection and sends a mix of small talk and questions,
+# backing off when the server says it is rate limited
+LOAD_MESSAGES = ["hello", "what's your name", "how are you", "thank you", "what is the capital of france",
+                 "how do i reset my password", "tell me about the weather", "bye"]
+
+
+async def run_client(host, port, username, messages, latencies, counts):
+    reader, writer = await asyncio.open_connection(host, port)
+
+    async def call(request):
+        start = time.perf_counter()
+        writer.write(json.dumps(request).encode() + b'\n')
+        await writer.drain()
+        reply = json.loads(await reader.readline())
+        latencies.append(time.perf_counter() - start)
+        return reply
+
+    reply = await call({'op': 'login', 'username': username, 'password': 'password'})
+    if not reply['ok']:
+        raise RuntimeError(reply['error'])
+    session = reply['session']
+    sent = 0
+    while sent < messages:
+        reply = await call({'op': 'message', 'session': session, 'text': random.choice(LOAD_MESSAGES)})
+        if reply['ok']:
+            sent += 1
+            counts['answered'] += 1
+        elif 'retry_after' in reply:
+            counts['rate_limited'] += 1
+            await asyncio.sleep(reply['retry_after'])
+        else:
+            raise RuntimeError(reply['error'])
+    await call({'op': 'logout', 'session': session})
+    writer.close()
+
+
+def percentile(sorted_values, fraction):
+    if not sorted_values:
+        return 0.0
+    return sorted_values[min(int(fraction * len(sorted_values)), len(sorted_values) - 1)]
+
+
+async def benchmark(clients=2000, messages=10, answer_delay=0.05, rate=RATE, burst=BURST, host=None, port=PORT):
+    chat_server = server = directory = None
+    if host is None:
+        # No remote server given: run one in this process on an ephemeral port, with throwaway accounts
+        # and an answer function that only sleeps, so the numbers measure the server and not the API
+        directory = tempfile.TemporaryDirectory()
+        store = UserStore(os.path.join(directory.name, 'users.db'))
+        store.create_table()
+        store.add_users((f"user{index}", 'password') for index in range(clients))
+
+        def answer(question):
+            time.sleep(answer_delay)
+            return f"An answer to: {question}"
+
+        chat_server = ChatServer(load_intents(), answer, store, SessionManager(rate=rate, burst=burst))
+        server = await chat_server.start(HOST, 0)
+        host, port = HOST, server.sockets[0].getsockname()[1]
+    latencies = []
+    counts = {'answered': 0, 'rate_limited': 0}
+    start = time.perf_counter()
+    await asyncio.gather(*(run_client(host, port, f"user{index}", messages, latencies, counts)
+                           for index in range(clients)))
+    seconds = time.perf_counter() - start
+    if server is not None:
+        chat_server.close()
+        server.close()
+        await server.wait_closed()
+        store.close()
+        directory.cleanup()
+    latencies.sort()
+    return {
+        'clients': clients,
+        'requests': len(latencies),
+        'seconds': seconds,
+        'requests_per_second': len(latencies) / seconds,
+        'messages_per_second': counts['answered'] / seconds,
+        'rate_limited': counts['rate_limited'],
+        'latency_ms': {name: percentile(latencies, fraction) * 1000
+                       for name, fraction in (('p50', 0.5), ('p90', 0.9), ('p99', 0.99), ('max', 1.0))},
+    }
+
+
+def main(argv=None):
+    parser = argparse.ArgumentParser(description="Headless multi-user chatbot server")
+    subparsers = parser.add_subparsers(dest='command', required=True)
+    serve_parser = subparsers.add_parser('serve', help="run the chat server")
+    serve_parser.add_argument('--host', default=HOST)
+    serve_parser.add_argument('--port', type=int, default=PORT)
+    serve_parser.add_argument('--rate', type=float, default=RATE, help="messages per second per session")
+    serve_parser.add_argument('--burst', type=int, default=BURST)
+    serve_parser.add_argument('--remote-api', action='store_true', help="ask the remote answer API as a last resort")
+    bench_parser = subparsers.add_parser('bench', help="measure throughput and latency with a local load generator")
+    bench_parser.add_argument('--clients', type=int, default=2000)
+    bench_parser.add_argument('--messages', type=int, default=10, help="messages per client")
+    bench_parser.add_argument('--answer-delay', type=float, default=0.05, help="seconds the stub lookup takes")
+    bench_parser.add_argument('--rate', type=float, default=RATE)
+    bench_parser.add_argument('--burst', type=int, default=BURST)
+    bench_parser.add_argument('--host', default=None, help="benchmark a running server instead of an in-process one")
+    bench_parser.add_argument('--port', type=int, default=PORT)
+    args = parser.parse_args(argv)
+
+    if args.command == 'serve':
+        asyncio.run(serve(args.host, args.port, args.rate, args.burst, args.remote_api))
+    else:
+        results = asyncio.run(benchmark(args.clients, args.messages, args.answer_delay, args.rate, args.burst,
+                                        args.host, args.port))
+        print(json.dumps(results, indent=2))
+    return 0
+
+
+if __name__ == '__main__':
+    sys.exit(main())
@@ -0,0 +1,96 @@
+import secrets
+import time
+from collections import deque
+
+RATE = 2.0
+BURST = 5
+MAX_MESSAGE_CHARS = 2000
+
+
+class ChatError(Exception):
+    pass
+
+
+class RateLimited(ChatError):
+    def __init__(self, retry_after):
+        super().__init__(f"Too many messages, try again in {retry_after:.1f}s")
+        self.retry_after = retry_after
+
+
+# Token bucket: burst messages at once, then rate messages per second
+class RateLimiter:
+    def __init__(self, rate=RATE, burst=BURST):
+        self.rate = rate
+        self.burst = burst
+        self.tokens = float(burst)
+        self.updated = time.monotonic()
+
+    def acquire(self):
+        now = time.monotonic()
+        self.tokens = min(self.burst, self.tokens + (now - self.updated) * self.rate)
+        self.updated = now
+        if self.tokens < 1:
+            raise RateLimited((1 - self.tokens) / self.rate)
+        self.tokens -= 1
+
+
+# One logged in user talking to the bot, with no UI attached
+class ChatSession:
+    def __init__(self, session_id, username, rate=RATE, burst=BURST, history_size=50):
+        self.session_id = session_id
+        self.username = username
+        self.limiter = RateLimiter(rate, burst)
+        self.history = deque(maxlen=history_size)
+        self.last_active = time.monotonic()
+
+    def check_message(self, text):
+        self.last_active = time.monotonic()
+        if not isinstance(text, str) or not text.strip():
+            raise ChatError("Message text is required")
+        if len(text) > MAX_MESSAGE_CHARS:
+            raise ChatError(f"Messages are limited to {MAX_MESSAGE_CHARS} characters")
+        self.limiter.acquire()
+
+    def record(self, text, reply):
+        self.history.append((text, reply))
+
+    def snapshot(self, reply=None):
+        return {'session': self.session_id, 'username': self.username, 'reply': reply}
+
+
+class SessionManager:
+    def __init__(self, max_sessions=100000, idle_timeout=1800, rate=RATE, burst=BURST):
+        self.max_sessions = max_sessions
+        self.idle_timeout = idle_timeout
+        self.rate = rate
+        self.burst = burst
+        self.sessions = {}
+
+    def __len__(self):
+        return len(self.sessions)
+
+    def login(self, username):
+        if len(self.sessions) >= self.max_sessions:
+            self.expire_idle()
+            if len(self.sessions) >= self.max_sessions:
+                raise ChatError("Too many active sessions")
+        # Session ids stand in for the password on every later request, so they must not be guessable
+        session = ChatSession(secrets.token_urlsafe(16), username, self.rate, self.burst)
+        self.sessions[session.session_id] = session
+        return session
+
+    def get(self, session_id):
+        session = self.sessions.get(session_id)
+        if session is None:
+            raise ChatError("Unknown or expired session, please log in again")
+        return session
+
+    def close(self, session_id):
+        return self.sessions.pop(session_id, None) is not None
+
+    def expire_idle(self):
+        cutoff = time.monotonic() - self.idle_timeout
+        expired = [session_id for session_id, session in self.sessions.items() if session.last_active < cutoff]
+        for session_id in expired:
+            del self.sessions[session_id]
+        return len(expired)
@@ -1,6 +1,5 @@
-import sqlite3
-import requests
 from kivy.app import App
+from kivy.clock import Clock
 from kivy.uix.boxlayout import BoxLayout
 from kivy.uix.label import Label
 from kivy.uix.textinput import TextInput
@@ -8,6 +7,10 @@ from kivy.uix.button import Button
 from kivy.uix.popup import Popup
 from kivy.uix.screenmanager import ScreenManager, Screen
 from kivy.uix.scrollview import ScrollView
+from kivy.uix.recycleview import RecycleView
+from kivy.uix.recycleboxlayout import RecycleBoxLayout
+from kivy.core.text.markup import MarkupLabel
+from kivy.metrics import sp
 from kivy.graphics import Color, Rectangle
 from kivy.uix.filechooser import FileChooserIconView
 from kivy.uix.image import Image
@@ -16,76 +19,28 @@ from kivy.core.window import Window
 from kivy.uix.gridlayout import GridLayout
 from kivy.uix.togglebutton import ToggleButton
 from kivy.uix.progressbar import ProgressBar
-import pytesseract
-from PIL import Image as PILImage
+import os
+from user_store import default_store
+from chatbot_engine import intent_engine, chatbot_response, answer_general_question
+from chatbot_pipeline import AnswerPipeline
+from chatbot_history import ChatHistory, ConversationStore
+from chatbot_ocr import OCRQueue, IMAGE_EXTENSIONS
+from chatbot_documents import DocumentIngestor, DOCUMENT_EXTENSIONS, open_document_index
 
 def create_user_table():
-    conn = sqlite3.connect('users.db')
-    c = conn.cursor()
-    c.execute('''
-        CREATE TABLE IF NOT EXISTS users (
-            id INTEGER PRIMARY KEY AUTOINCREMENT,
-            username TEXT UNIQUE NOT NULL,
-            password TEXT NOT NULL
-        )
-    ''')
-    conn.commit()
-    conn.close()
+    default_store.create_table()
 
 def add_user(username, password):
-    conn = sqlite3.connect('users.db')
-    c = conn.cursor()
-    try:
-        c.execute('INSERT INTO users (username, password) VALUES (?, ?)', (username, password))
-        conn.commit()
-    except sqlite3.IntegrityError:
-        return False
-    finally:
-        conn.close()
-    return True
+    return default_store.add_user(username, password)
 
 def authenticate_user(username, password):
-    conn = sqlite3.connect('users.db')
-    c = conn.cursor()
-    c.execute('SELECT * FROM users WHERE username = ? AND password = ?', (username, password))
-    user = c.fetchone()
-    conn.close()
-    return user is not None
+    return default_store.authenticate(username, password)
 
 def recover_password(username):
-    conn = sqlite3.connect('users.db')
-    c = conn.cursor()
-    c.execute('SELECT password FROM users WHERE username = ?', (username,))
-    result = c.fetchone()
-    conn.close()
-    return result[0] if result else None
+    return default_store.recover_password(username)
 
 create_user_table()
 
-def chatbot_response(user_input):
-    user_input = user_input.lower()
-
-    if 'hello' in user_input or 'hi' in user_input:
-        return "Hello! How can I help you today?"
-    elif 'how are you' in user_input:
-        return "I'm just a bot, but I'm here to help you!"
-    elif 'bye' in user_input or 'goodbye' in user_input:
-        return "Goodbye! Have a great day!"
-    elif 'name' in user_input:
-        return "I am Beso Chatbot, here to assist you."
-    elif 'help' in user_input:
-        return "Sure! How can I assist you today?"
-    else:
-        return answer_general_question(user_input)
-
-def answer_general_question(question):
-    try:
-        response = requests.get(f"https://api.duckduckgo.com/?q={question}&format=json")
-        answer = response.json().get("AbstractText", "I'm sorry, I don't know the answer to that.")
-        return answer
-    except:
-        return "Sorry, I couldn't process that question."
-
 class LoginRegisterScreen(BoxLayout):
     def __init__(self, **kwargs):
         super(LoginRegisterScreen, self).__init__(**kwargs)
@@ -117,7 +72,7 @@ class LoginRegisterScreen(BoxLayout):
         username = self.username_input.text
         password = self.password_input.text
         if authenticate_user(username, password):
-            App.get_running_app().show_chat_screen()
+            App.get_running_app().show_chat_screen(username)
         else:
             self.show_popup("Login failed", "Invalid username or password")
 
@@ -141,8 +96,97 @@ class LoginRegisterScreen(BoxLayout):
         popup = Popup(title=title, content=Label(text=message), size_hint=(None, None), size=(400, 200))
         popup.open()
 
+WELCOME_MESSAGE = "Beso Chatbot: Hello! I am Beso Chatbot. Type 'bye' to exit."
+ROW_PADDING = 6
+
+class ChatMessageLabel(Label):
+    def __init__(self, **kwargs):
+        super(ChatMessageLabel, self).__init__(**kwargs)
+        self.markup = True
+        self.halign = 'left'
+        self.valign = 'top'
+        self.size_hint_y = None
+
+# Only the rows on screen are widgets; rows are recycled as the conversation scrolls
+class ChatHistoryView(RecycleView):
+    def __init__(self, history, **kwargs):
+        super(ChatHistoryView, self).__init__(**kwargs)
+        self.history = history
+        self.viewclass = ChatMessageLabel
+        self.font_size = sp(15)
+        layout = RecycleBoxLayout(orientation='vertical', default_size_hint=(1, None), size_hint_y=None,
+                                  padding=[5, 5, 5, 5])
+        layout.bind(minimum_height=layout.setter('height'))
+        self.add_widget(layout)
+        self.loading = False
+        self.remeasure_trigger = Clock.create_trigger(self.remeasure, 0.1)
+        self.bind(width=lambda *args: self.remeasure_trigger(), scroll_y=self.on_scroll)
+
+    # Function to lay out a message once at the current width to get its real row height
+    def row(self, message):
+        width = max(self.width - 10, 50)
+        label = MarkupLabel(text=message['text'], font_size=self.font_size, text_size=(width, None))
+        label.refresh()
+        return {'text': message['text'], 'text_size': (width, None), 'font_size': self.font_size,
+                'height': label.texture.size[1] + ROW_PADDING}
+
+    def remeasure(self, *args):
+        self.data = [self.row(message) for message in self.history.messages]
+
+    def append_message(self, text, bot):
+        was_latest = self.history.at_latest()
+        message, dropped = self.history.append(text, bot)
+        if not was_latest:
+            self.remeasure()
+        else:
+            # In-place edits let the RecycleView update incrementally instead of re-reading all rows
+            if dropped:
+                del self.data[:dropped]
+            self.data.append(self.row(message))
+        Clock.schedule_once(lambda dt: setattr(self, 'scroll_y', 0))
+
+    def on_scroll(self, instance, value):
+        if self.loading:
+            return
+        if value >= 1 and self.history.has_older():
+            self.load(self.history.load_older, older=True)
+        elif value <= 0 and self.history.has_newer():
+            self.load(self.history.load_newer, older=False)
+
+    def load(self, loader, older):
+        self.loading = True
+        messages, dropped = loader()
+        rows = [self.row(message) for message in messages]
+        added = sum(row['height'] for row in rows)
+        if older:
+            self.data = rows + self.data[:len(self.data) - dropped]
+        else:
+            self.data = self.data[dropped:] + rows
+        # Keep the rows the user was looking at in place after the new page is added
+        scrollable = max(sum(row['height'] for row in self.data) - self.height, 1)
+        self.scroll_y = 1 - added / scrollable if older else added / scrollable
+        self.loading = False
+
+    def set_history(self, history):
+        self.history.close()
+        self.history = history
+        self.remeasure()
+        Clock.schedule_once(lambda dt: setattr(self, 'scroll_y', 0))
+
+    def clear(self):
+        self.history.clear()
+        self.data = []
+
 class ChatBotApp(App):
     def build(self):
+        self.conversation_store = ConversationStore()
+        self.ocr_queue = OCRQueue(schedule=lambda callback: Clock.schedule_once(lambda dt: callback()))
+        self.document_ingestor = DocumentIngestor(schedule=lambda callback: Clock.schedule_once(lambda dt: callback()))
+        # The logged in user's uploads, opened at login
+        self.document_index = None
+        self.document_indexes = {}
+        self.answer_pipeline = AnswerPipeline(intent_engine, self.answer_question,
+                                              schedule=lambda callback: Clock.schedule_once(lambda dt: callback()))
         self.screen_manager = ScreenManager()
         self.login_screen = Screen(name='login')
         self.login_screen.add_widget(LoginRegisterScreen())
@@ -163,12 +207,15 @@ class ChatBotApp(App):
         
         chat_layout.bind(size=self._update_rect, pos=self._update_rect)
 
-        scroll_view = ScrollView(size_hint=(1, 1), scroll_type=['bars'], bar_width=10)
-        self.chat_history = Label(size_hint_y=None, height=400, width=400, text="Beso Chatbot: Hello! I am Beso Chatbot. Type 'bye' to exit.\n", valign='top', halign='left', markup=True)
-        self.chat_history.bind(size=self.chat_history.setter('text_size'))
+        self.chat_view = ChatHistoryView(ChatHistory(), size_hint=(1, 1), scroll_type=['bars', 'content'], bar_width=10)
+        self.chat_view.append_message(WELCOME_MESSAGE, bot=True)
+        chat_layout.add_widget(self.chat_view)
 
-        scroll_view.add_widget(self.chat_history)
-        chat_layout.add_widget(scroll_view)
+        self.pending_label = Label(text="", size_hint_y=None, height=20, halign='left', color=(0.7, 0.7, 0.7, 1))
+        chat_layout.add_widget(self.pending_label)
+
+        self.ocr_progress = ProgressBar(max=1, value=0, size_hint_y=None, height=10, opacity=0)
+        chat_layout.add_widget(self.ocr_progress)
 
         self.user_input = TextInput(multiline=False, size_hint_y=None, height=50)
         chat_layout.add_widget(self.user_input)
@@ -205,7 +252,17 @@ class ChatBotApp(App):
         self.rect.pos = instance.pos
         self.rect.size = instance.size
 
-    def show_chat_screen(self):
+    def answer_question(self, question):
+        return answer_general_question(question, self.document_index)
+
+    def show_chat_screen(self, username):
+        if username not in self.document_indexes:
+            self.document_indexes[username] = open_document_index(username)
+        self.document_index = self.document_indexes[username]
+        # Reopening a conversation only reads its newest page, older ones load on scroll back
+        self.chat_view.set_history(ChatHistory(self.conversation_store.for_user(username)))
+        if not len(self.chat_view.history):
+            self.chat_view.append_message(WELCOME_MESSAGE, bot=True)
         self.screen_manager.current = 'chat'
 
     def on_button_press(self, instance):
@@ -215,44 +272,78 @@ class ChatBotApp(App):
             self.user_input.disabled = True
             self.submit_button.disabled = True
         else:
-            response = chatbot_response(user_message)
             self.update_chat_history(f"[color=00FF00]You: {user_message}[/color]", bot_response=False)
-            self.update_chat_history(f"[color=FF4500]Beso Chatbot: {response}[/color]", bot_response=True)
+            self.answer_pipeline.submit(user_message, self.on_answer, self.update_pending)
             self.user_input.text = ""
 
+    def on_answer(self, response):
+        self.update_chat_history(f"[color=FF4500]Beso Chatbot: {response}[/color]", bot_response=True)
+        self.update_pending()
+
+    def update_pending(self):
+        self.pending_label.text = "Beso Chatbot is looking that up..." if self.answer_pipeline.pending_count else ""
+
     def update_chat_history(self, message, bot_response):
-        self.chat_history.text += message + "\n"
-        self.chat_history.height += 20
+        self.chat_view.append_message(message, bot_response)
 
     def clear_chat(self, instance):
-        self.chat_history.text = "Beso Chatbot: Hello! I am Beso Chatbot. Type 'bye' to exit.\n"
-        self.chat_history.height = 400
+        self.answer_pipeline.cancel_all()
+        self.update_pending()
+        self.chat_view.clear()
+        self.chat_view.append_message(WELCOME_MESSAGE, bot=True)
 
     def logout(self, instance):
         self.screen_manager.current = 'login'
         self.user_input.disabled = False
         self.submit_button.disabled = False
-        self.clear_chat(None)
+        self.answer_pipeline.cancel_all()
+        self.update_pending()
+        self.conversation_store.flush()
+        self.chat_view.set_history(ChatHistory())
+        self.document_index = None
 
     def open_file_chooser(self, instance):
-        content = FileChooserIconView()
-        file_chooser_popup = Popup(title="Choose an Image or File", content=content, size_hint=(0.9, 0.9))
-        content.bind(on_selection=lambda *x: self.process_selected_file(content.selection, file_chooser_popup))
+        content = BoxLayout(orientation='vertical', spacing=5)
+        chooser = FileChooserIconView(multiselect=True)
+        content.add_widget(chooser)
+        upload_button = Button(text="Upload selected", size_hint_y=None, height=50)
+        content.add_widget(upload_button)
+        file_chooser_popup = Popup(title="Choose Images or Files", content=content, size_hint=(0.9, 0.9))
+        upload_button.bind(on_press=lambda *x: self.process_selected_file(chooser.selection, file_chooser_popup))
         file_chooser_popup.open()
 
     def process_selected_file(self, selection, popup):
         if selection:
-            file_path = selection[0]
             popup.dismiss()
-            if file_path.lower().endswith(('.png', '.jpg', '.jpeg', '.bmp', '.gif')):
-                # Process image file
-                text = pytesseract.image_to_string(PILImage.open(file_path))
-                self.update_chat_history(f"[color=00FF00]You (from image): {text}[/color]", bot_response=False)
-            elif file_path.lower().endswith(('.txt', '.pdf', '.docx')):
-                # Process text file
-                with open(file_path, 'r') as file:
-                    text = file.read()
-                self.update_chat_history(f"[color=00FF00]You (from file): {text}[/color]", bot_response=False)
+            images = [path for path in selection if path.lower().endswith(IMAGE_EXTENSIONS)]
+            if images:
+                # OCR runs on the worker pool, results arrive through on_ocr_result
+                self.ocr_queue.submit_batch(images, self.on_ocr_result, self.on_ocr_progress)
+            for file_path in selection:
+                if file_path.lower().endswith(DOCUMENT_EXTENSIONS) and self.document_index is not None:
+                    # Documents are streamed into the user's index, only a preview is shown in the chat
+                    self.document_ingestor.submit(self.document_index, file_path, self.on_document_indexed)
+
+    def on_ocr_result(self, file_path, text):
+        if text is None:
+            self.update_chat_history(f"[color=FF4500]Beso Chatbot: I couldn't read text from {file_path}[/color]", bot_response=True)
+        else:
+            self.update_chat_history(f"[color=00FF00]You (from image): {text}[/color]", bot_response=False)
+
+    def on_document_indexed(self, file_path, preview, chunks, total_chars, error):
+        if error is not None:
+            self.update_chat_history(f"[color=FF4500]Beso Chatbot: I couldn't read {file_path} ({error})[/color]", bot_response=True)
+            return
+        if total_chars > len(preview):
+            preview += f"... ({total_chars - len(preview)} more characters)"
+        self.update_chat_history(f"[color=00FF00]You (from file): {preview}[/color]", bot_response=False)
+        self.update_chat_history(f"[color=FF4500]Beso Chatbot: I've read {os.path.basename(file_path)} "
+                                 f"({chunks} sections), ask me anything about it.[/color]", bot_response=True)
+
+    def on_ocr_progress(self, done, total):
+        self.ocr_progress.max = total
+        self.ocr_progress.value = done
+        self.ocr_progress.opacity = 0 if done == total else 1
 
     def toggle_dark_mode(self, instance):
         if instance.state == 'down':
@@ -262,5 +353,12 @@ class ChatBotApp(App):
             Window.clearcolor = (1, 1, 1, 1)  # Light Mode
             self.rect.color = (0, 0, 0, 1)  # Black background for chat box
 
+    def on_stop(self):
+        self.answer_pipeline.shutdown()
+        self.ocr_queue.shutdown()
+        self.document_ingestor.shutdown()
+        self.chat_view.history.close()
+        self.conversation_store.close()
+
 if __name__ == "__main__":
     ChatBotApp().run()
@@ -0,0 +1,428 @@
+import argparse
+import hashlib
+import itertools
+import json
+import os
+import sys
+import tempfile
+import time
+from concurrent.futures import ThreadPoolExecutor
+
+import numpy as np
+import scipy.sparse as sp
+
+from recommendation_catalog import CATALOG_PATH, file_signature, load_catalog
+
+RATINGS_PATH = os.path.join(os.path.dirname(os.path.abspath(__file__)), 'ratings.csv')
+FACTORS_SUFFIX = '.factors.npz'
+FACTORS = 16
+REGULARIZATION = 0.05
+ITERATIONS = 10
+RESULTS = 10
+CHUNK_ROWS = 1000000
+# Rows solved together; big enough for the batched solve to pay off, small enough to stay in cache
+BLOCK_ROWS = 4096
+
+
+class RatingsError(Exception):
+    pass
+
+
+# Function to stream (user ids, movie ids, ratings) arrays out of a MovieLens style CSV
+# (userId,movieId,rating[,timestamp]), chunk_rows lines at a time so the file never sits in memory as text
+def read_ratings(path, chunk_rows=CHUNK_ROWS):
+    with open(path, encoding='utf-8') as file:
+        first = file.readline()
+        names = [name.strip() for name in first.split(',')]
+        if all(name in names for name in ('userId', 'movieId', 'rating')):
+            columns = tuple(names.index(name) for name in ('userId', 'movieId', 'rating'))
+            lines = file
+        else:
+            # No header, the columns are in the usual order
+            columns = (0, 1, 2)
+            lines = itertools.chain([first], file)
+        while True:
+            chunk = [line for line in itertools.islice(lines, chunk_rows) if line.strip()]
+            if not chunk:
+                break
+            try:
+                values = np.loadtxt(chunk, delimiter=',', usecols=columns, ndmin=2)
+            except ValueError as error:
+                raise RatingsError(f"{path}: {error}")
+            yield values[:, 0].astype(np.int64), values[:, 1].astype(np.int64), values[:, 2].astype(np.float32)
+
+
+# Function to give every new id in ids the next free position in positions (id -> position, in order of
+# first appearance) and return the positions of all of ids
+def assign_positions(ids, positions):
+    unique, inverse = np.unique(ids, return_inverse=True)
+    assigned = np.fromiter((positions.setdefault(key, len(positions)) for key in unique.tolist()),
+                           dtype=np.int32, count=len(unique))
+    return assigned[inverse]
+
+
+# Function to turn positions (id -> position) into the ids in sorted order and, for every position, its rank
+def sorted_positions(positions):
+    ids = np.fromiter(positions, dtype=np.int64, count=len(positions))
+    order = np.argsort(ids)
+    rank = np.empty(len(ids), dtype=np.int32)
+    rank[order] = np.arange(len(ids), dtype=np.int32)
+    return ids[order], rank
+
+
+# Ratings gathered a chunk at a time on their way into CSR. Each chunk is mapped to (row, column) as it
+# arrives and only those int32 positions and the float32 ratings are kept, so the parsed chunks never
+# pile up. With a catalog, movies are joined on its movie id column and their columns are its rows.
+class RatingsBuilder:
+    def __init__(self, catalog=None):
+        if catalog is not None and not catalog.has_movie_ids:
+            raise RatingsError("The movie catalog has no movieId column to match the ratings against")
+        self.catalog = catalog
+        self.user_rows = {}
+        self.item_columns = {}
+        self.rows = []
+        self.columns = []
+        self.ratings = []
+        self.received = 0
+        self.dropped = 0
+
+    def add(self, users, movies, ratings):
+        self.received += len(users)
+        if self.catalog is not None:
+            columns = self.catalog.rows_for(movies)
+            known = columns >= 0
+            self.dropped += int(len(known) - known.sum())
+            users, columns, ratings = users[known], columns[known].astype(np.int32), ratings[known]
+        else:
+            columns = assign_positions(movies, self.item_columns)
+        self.rows.append(assign_positions(users, self.user_rows))
+        self.columns.append(columns)
+        self.ratings.append(np.asarray(ratings, dtype=np.float32))
+
+    # Function to sort everything added so far into a Ratings, rows by user id and (without a catalog)
+    # columns by movie id
+    def build(self):
+        user_ids, user_rank = sorted_positions(self.user_rows)
+        rows = user_rank[np.concatenate(self.rows)] if self.rows else np.zeros(0, dtype=np.int32)
+        columns = np.concatenate(self.columns) if self.columns else np.zeros(0, dtype=np.int32)
+        ratings = np.concatenate(self.ratings) if self.ratings else np.zeros(0, dtype=np.float32)
+        self.rows, self.columns, self.ratings = [], [], []
+        if self.catalog is not None:
+            item_ids = np.asarray(self.catalog.movie_ids)
+        else:
+            item_ids, item_rank = sorted_positions(self.item_columns)
+            columns = item_rank[columns]
+        # Sorting by (user, item) puts the entries in CSR order; a rating given twice keeps the later one
+        keys = rows.astype(np.int64) * len(item_ids) + columns
+        del rows, columns
+        order = np.argsort(keys, kind='stable')
+        keys = keys[order]
+        last = np.append(keys[1:] != keys[:-1], True)
+        keys = keys[last]
+        data = ratings[order[last]]
+        indptr = np.zeros(len(user_ids) + 1, dtype=np.int64)
+        np.cumsum(np.bincount(keys // len(item_ids), minlength=len(user_ids)), out=indptr[1:])
+        matrix = sp.csr_matrix((data, (keys % len(item_ids)).astype(np.int32), indptr),
+                               shape=(len(user_ids), len(item_ids)))
+        return Ratings(matrix, user_ids, item_ids, self.dropped)
+
+
+# Ratings as a users x items CSR matrix. Rows are users in id order and columns are either the rows of a
+# catalog (ratings for movies it doesn't have are dropped) or the rated movie ids in order.
+class Ratings:
+    def __init__(self, matrix, user_ids, item_ids, dropped=0):
+        self.matrix = matrix
+        self.user_ids = user_ids
+        self.item_ids = item_ids
+        self.dropped = dropped
+
+    def __len__(self):
+        return self.matrix.nnz
+
+    @classmethod
+    def from_file(cls, path, catalog=None, chunk_rows=CHUNK_ROWS):
+        builder = RatingsBuilder(catalog)
+        for chunk in read_ratings(path, chunk_rows):
+            builder.add(*chunk)
+        if not builder.received:
+            raise RatingsError(f"{path} has no ratings")
+        return builder.build()
+
+    @classmethod
+    def from_arrays(cls, users, movies, ratings, catalog=None):
+        builder = RatingsBuilder(catalog)
+        builder.add(np.asarray(users, dtype=np.int64), np.asarray(movies, dtype=np.int64), ratings)
+        return builder.build()
+
+    # Function to hold out a random fraction of the ratings, for measuring the model on ratings it never saw
+    def split(self, fraction=0.01, seed=0):
+        held = np.random.default_rng(seed).random(self.matrix.nnz) < fraction
+        coo = self.matrix.tocoo()
+        train = self.matrix.copy()
+        train.data[held] = 0
+        train.eliminate_zeros()
+        return (Ratings(train, self.user_ids, self.item_ids, self.dropped),
+                (coo.row[held], coo.col[held], coo.data[held]))
+
+
+# Function to solve one side of ALS: for every row of matrix, the factors minimising the squared error
+# against its ratings given the other side's (fixed) factors, with the penalty scaled by the rating count.
+# The normal equations of all rows are built at once: each row's Gram matrix is the sum of the outer
+# products of the items it rated, i.e. a 0/1 sparse matrix times every item's flattened upper triangle.
+def solve_side(matrix, fixed, regularization, pool, block_rows=BLOCK_ROWS):
+    factors = fixed.shape[1]
+    upper = np.triu_indices(factors)
+    diagonal = np.arange(factors)
+    outer = fixed[:, upper[0]] * fixed[:, upper[1]]
+    counts = np.diff(matrix.indptr)
+    solved = np.zeros((matrix.shape[0], factors), dtype=np.float32)
+
+    def solve_block(start):
+        end = min(start + block_rows, matrix.shape[0])
+        block = matrix[start:end]
+        rated = sp.csr_matrix((np.ones(block.nnz, dtype=np.float32), block.indices, block.indptr), shape=block.shape)
+        packed = rated @ outer
+        gram = np.empty((end - start, factors, factors), dtype=np.float64)
+        gram[:, upper[0], upper[1]] = packed
+        gram[:, upper[1], upper[0]] = packed
+        # Rows with no ratings get the identity, so they solve to zero instead of failing
+        gram[:, diagonal, diagonal] += regularization * np.maximum(counts[start:end], 1)[:, None]
+        rhs = block @ fixed
+        solved[start:end] = np.linalg.solve(gram, rhs[..., None].astype(np.float64))[..., 0]
+
+    # Sparse products and the batched solve release the GIL, so the blocks run on every core
+    list(pool.map(solve_block, range(0, matrix.shape[0], block_rows)))
+    return solved
+
+
+# Matrix factorization of the ratings: rating(user, item) ~ mean + user_factors[user] . item_factors[item].
+# The rated matrix is kept so recommendations can leave out what a user has already rated.
+class FactorModel:
+    def __init__(self, user_factors, item_factors, mean, ratings):
+        self.user_factors = user_factors
+        self.item_factors = item_factors
+        self.mean = mean
+        self.ratings = ratings
+
+    @property
+    def item_ids(self):
+        return self.ratings.item_ids
+
+    # Function to map user ids to factor rows, -1 for users without ratings
+    def user_rows(self, user_ids):
+        user_ids = np.asarray(user_ids, dtype=np.int64)
+        known = self.ratings.user_ids
+        positions = np.minimum(np.searchsorted(known, user_ids), max(len(known) - 1, 0))
+        return np.where(known[positions] == user_ids, positions, -1) if len(known) else np.full(len(user_ids), -1)
+
+    def predict(self, rows, columns, batch_size=CHUNK_ROWS):
+        predicted = np.empty(len(rows), dtype=np.float32)
+        for start in range(0, len(rows), batch_size):
+            end = start + batch_size
+            predicted[start:end] = self.mean + np.einsum('ij,ij->i', self.user_factors[rows[start:end]],
+                                                         self.item_factors[columns[start:end]])
+        return predicted
+
+    def rmse(self, rows, columns, ratings):
+        if not len(rows):
+            return 0.0
+        return float(np.sqrt(np.mean((self.predict(rows, columns) - ratings) ** 2)))
+
+    # Function to find the top n items for a batch of users: one matrix product for the whole batch,
+    # rated items masked out, and argpartition instead of a full sort. Returns (item ids, predicted ratings),
+    # both users x n; users without ratings get -1 ids and NaN scores.
+    def recommend(self, user_ids, n=RESULTS, exclude_rated=True, batch_size=1024):
+        rows = self.user_rows(user_ids)
+        n = min(n, self.item_factors.shape[0])
+        items = np.full((len(rows), n), -1, dtype=np.int64)
+        scores = np.full((len(rows), n), np.nan, dtype=np.float32)
+        for start in range(0, len(rows), batch_size):
+            batch = np.arange(start, min(start + batch_size, len(rows)))
+            batch = batch[rows[batch] >= 0]
+            if not len(batch):
+                continue
+            predicted = self.user_factors[rows[batch]] @ self.item_factors.T + self.mean
+            if exclude_rated:
+                rated = self.ratings.matrix[rows[batch]]
+                predicted[np.repeat(np.arange(len(batch)), np.diff(rated.indptr)), rated.indices] = -np.inf
+            top = np.argpartition(-predicted, n - 1, axis=1)[:, :n]
+            top = np.take_along_axis(top, np.argsort(-np.take_along_axis(predicted, top, axis=1), axis=1), axis=1)
+            items[batch] = self.item_ids[top]
+            scores[batch] = np.take_along_axis(predicted, top, axis=1)
+        items[~np.isfinite(scores)] = -1
+        return items, scores
+
+    def save(self, path, signature=None):
+        matrix = self.ratings.matrix
+        # Written next to the target and renamed, so a reader never sees half a file
+        directory = os.path.dirname(os.path.abspath(path))
+        with tempfile.NamedTemporaryFile(dir=directory, suffix='.npz', delete=False) as file:
+            np.savez(file, user_factors=self.user_factors, item_factors=self.item_factors, mean=self.mean,
+                     user_ids=self.ratings.user_ids, item_ids=self.ratings.item_ids, data=matrix.data,
+                     indices=matrix.indices, indptr=matrix.indptr, shape=np.array(matrix.shape),
+                     signature=np.array(json.dumps(signature)))
+        os.chmod(file.name, 0o644)
+        os.replace(file.name, path)
+
+    # Function to read saved factors; with a signature, factors saved under a different one are refused
+    @classmethod
+    def load(cls, path, signature=None):
+        with np.load(path) as saved:
+            if signature is not None and ('signature' not in saved.files or
+                                          json.loads(str(saved['signature'])) != signature):
+                raise ValueError(f"{path} is out of date")
+            matrix = sp.csr_matrix((saved['data'], saved['indices'], saved['indptr']), shape=tuple(saved['shape']))
+            ratings = Ratings(matrix, saved['user_ids'], saved['item_ids'])
+            return cls(saved['user_factors'], saved['item_factors'], float(saved['mean']), ratings)
+
+
+# Function to fit a FactorModel by alternating least squares: with the item factors fixed every user's
+# factors are an independent small least-squares problem, and the other way round. progress, when given,
+# is called with (iteration, seconds, held-out RMSE) after each pass.
+def train_als(ratings, factors=FACTORS, regularization=REGULARIZATION, iterations=ITERATIONS, workers=None,
+              seed=0, held_out=None, progress=None):
+    matrix = ratings.matrix.astype(np.float32)
+    mean = float(matrix.data.mean()) if matrix.nnz else 0.0
+    matrix.data -= mean
+    by_item = matrix.T.tocsr()
+    rng = np.random.default_rng(seed)
+    user_factors = np.zeros((matrix.shape[0], factors), dtype=np.float32)
+    item_factors = (rng.standard_normal((matrix.shape[1], factors)) * 0.1).astype(np.float32)
+    model = FactorModel(user_factors, item_factors, mean, ratings)
+    with ThreadPoolExecutor(max_workers=workers or os.cpu_count(), thread_name_prefix='als') as pool:
+        for iteration in range(iterations):
+            start = time.perf_counter()
+            model.user_factors = solve_side(matrix, model.item_factors, regularization, pool)
+            model.item_factors = solve_side(by_item, model.user_factors, regularization, pool)
+            if progress is not None:
+                progress(iteration + 1, time.perf_counter() - start,
+                         model.rmse(*held_out) if held_out is not None else None)
+    return model
+
+
+def factors_path_for(path):
+    return path + FACTORS_SUFFIX
+
+
+# Function to identify what saved factors were trained from: the ratings file, and the catalog ids
+# their columns line up with (None when the columns are the rated movie ids)
+def model_signature(path, catalog=None):
+    movie_ids = None
+    if catalog is not None:
+        movie_ids = [len(catalog), hashlib.sha1(np.ascontiguousarray(catalog.movie_ids).tobytes()).hexdigest()]
+    return {'ratings': file_signature(path), 'movie_ids': movie_ids}
+
+
+# Function to get the model for a ratings file, from its saved factors when they were trained on this
+# very file and catalog
+def load_model(path=RATINGS_PATH, catalog=None, rebuild=False, **options):
+    factors_path = factors_path_for(path)
+    signature = model_signature(path, catalog)
+    if not rebuild and os.path.exists(factors_path):
+        try:
+            return FactorModel.load(factors_path, signature)
+        except (OSError, ValueError, KeyError):
+            pass
+    model = train_als(Ratings.from_file(path, catalog), **options)
+    try:
+        model.save(factors_path, signature)
+    except OSError:
+        pass
+    return model
+
+
+# Synthetic ratings shaped like MovieLens 25M: a long tail of user activity and item popularity,
+# with ratings in half stars coming from a hidden low-rank model plus noise
+def synthetic_ratings(ratings=25000000, users=162541, items=59047, rank=8, seed=0):
+    rng = np.random.default_rng(seed)
+    activity = rng.lognormal(0, 1.2, users)
+    per_user = np.maximum(1, np.round(activity / activity.sum() * ratings)).astype(np.int64)
+    user_column = np.repeat(np.arange(1, users + 1, dtype=np.int64), per_user)[:ratings]
+    popularity = np.cumsum(1 / np.arange(1, items + 1) ** 0.9)
+    item_rows = np.searchsorted(popularity, rng.random(len(user_column)) * popularity[-1])
+    item_rows = rng.permutation(items)[item_rows]
+    # Scaled so the taste term has unit variance, twice the noise
+    user_taste = rng.standard_normal((users, rank)).astype(np.float32) / rank ** 0.25
+    item_taste = rng.standard_normal((items, rank)).astype(np.float32) / rank ** 0.25
+    values = np.empty(len(user_column), dtype=np.float32)
+    for start in range(0, len(values), CHUNK_ROWS):
+        end = start + CHUNK_ROWS
+        values[start:end] = 3.5 + np.einsum('ij,ij->i', user_taste[user_column[start:end] - 1],
+                                            item_taste[item_rows[start:end]])
+    values += rng.normal(0, 0.5, len(values)).astype(np.float32)
+    values = np.clip(np.round(values * 2) / 2, 0.5, 5.0)
+    return user_column, item_rows.astype(np.int64) + 1, values
+
+
+def write_ratings_csv(path, users, movies, ratings, chunk_rows=CHUNK_ROWS):
+    with open(path, 'w', encoding='utf-8') as file:
+        file.write('userId,movieId,rating,timestamp\n')
+        for start in range(0, len(users), chunk_rows):
+            end = start + chunk_rows
+            file.writelines(f"{user},{movie},{rating},1112486027\n" for user, movie, rating in
+                            zip(users[start:end].tolist(), movies[start:end].tolist(), ratings[start:end].tolist()))
+
+
+def benchmark(ratings=25000000, factors=FACTORS, iterations=ITERATIONS, workers=None, users=1024):
+    results = {'ratings': ratings, 'factors': factors, 'workers': workers or os.cpu_count()}
+    arrays = synthetic_ratings(ratings)
+    with tempfile.TemporaryDirectory() as directory:
+        path = os.path.join(directory, 'ratings.csv')
+        write_ratings_csv(path, *arrays)
+        del arrays
+        start = time.perf_counter()
+        data = Ratings.from_file(path)
+        results['ingest_seconds'] = time.perf_counter() - start
+    results['users'], results['items'] = data.matrix.shape
+    results['csr_mb'] = (data.matrix.data.nbytes + data.matrix.indices.nbytes + data.matrix.indptr.nbytes) / 2 ** 20
+    train, held_out = data.split()
+    passes = []
+    start = time.perf_counter()
+    model = train_als(train, factors, iterations=iterations, workers=workers, held_out=held_out,
+                      progress=lambda iteration, seconds, rmse: passes.append((seconds, rmse)))
+    results['train_seconds'] = time.perf_counter() - start
+    results['seconds_per_iteration'] = sum(seconds for seconds, _ in passes) / len(passes)
+    results['held_out_rmse'] = passes[-1][1]
+    results['baseline_rmse'] = float(np.sqrt(np.mean((held_out[2] - model.mean) ** 2)))
+
+    sample = np.random.default_rng(1).choice(data.user_ids, users)
+    start = time.perf_counter()
+    model.recommend(sample)
+    results['recommend_users_per_second'] = users / (time.perf_counter() - start)
+    return results
+
+
+def main(argv=None):
+    parser = argparse.ArgumentParser(description="Collaborative filtering from user ratings")
+    subparsers = parser.add_subparsers(dest='command', required=True)
+    train_parser = subparsers.add_parser('train', help="fit factors for a ratings file and save them next to it")
+    train_parser.add_argument('path', nargs='?', default=RATINGS_PATH)
+    train_parser.add_argument('--catalog', default=CATALOG_PATH,
+                              help="movies the ratings are joined to, the app loads factors trained against it")
+    train_parser.add_argument('--factors', type=int, default=FACTORS)
+    train_parser.add_argument('--regularization', type=float, default=REGULARIZATION)
+    train_parser.add_argument('--iterations', type=int, default=ITERATIONS)
+    train_parser.add_argument('--workers', type=int, default=None)
+    bench_parser = subparsers.add_parser('bench', help="ingest, train and recommend on synthetic ratings")
+    bench_parser.add_argument('--ratings', type=int, default=25000000)
+    bench_parser.add_argument('--factors', type=int, default=FACTORS)
+    bench_parser.add_argument('--iterations', type=int, default=ITERATIONS)
+    bench_parser.add_argument('--workers', type=int, default=None)
+    args = parser.parse_args(argv)
+
+    if args.command == 'train':
+        start = time.perf_counter()
+        catalog = load_catalog(args.catalog)
+        model = load_model(args.path, catalog, rebuild=True, factors=args.factors,
+                           regularization=args.regularization, iterations=args.iterations, workers=args.workers,
+                           progress=lambda iteration, seconds, _: print(f"iteration {iteration}: {seconds:.2f}s"))
+        print(f"{len(model.ratings)} ratings from {len(model.ratings.user_ids)} users "
+              f"({model.ratings.dropped} for movies not in {args.catalog} skipped), factors saved to "
+              f"{factors_path_for(args.path)} ({time.perf_counter() - start:.2f}s)")
+    else:
+        print(json.dumps(benchmark(args.ratings, args.factors, args.iterations, args.workers), indent=2))
+    return 0
+
+
+if __name__ == '__main__':
+    sys.exit(main())
@@ -0,0 +1,211 @@
+import argparse
+import bisect
+import difflib
+import json
+import random
+import re
+import sys
+import time
+from collections import OrderedDict
+
+import numpy as np
+
+RESULTS = 10
+CUTOFF = 0.1
+# Candidates sharing the most trigrams with the query that get the exact (SequenceMatcher) score
+SHORTLIST = 100
+
+NON_WORD_RE = re.compile(r'[\W_]+')
+
+
+def normalize_title(title):
+    return NON_WORD_RE.sub(' ', title.lower()).strip()
+
+
+def padded(text):
+    return (' ' + text + ' ').encode('utf-8')
+
+
+def trigram_codes(data):
+    data = data.astype(np.int32)
+    return (data[:-2] << 16) | (data[1:-1] << 8) | data[2:]
+
+
+# Fuzzy title search. Every title is split into byte trigrams and an inverted index maps each trigram to
+# the titles containing it; a query only scores the titles it shares trigrams with, keeps the best
+# SHORTLIST by trigram overlap and ranks those with the same ratio difflib uses. Prefix matches, found by
+# binary search in the sorted titles, are ranked first so results make sense while the user is typing.
+class TitleIndex:
+    def __init__(self, titles):
+        self.titles = titles
+        normalized = [normalize_title(title) for title in titles]
+        self.build_trigrams(normalized)
+        order = sorted(range(len(normalized)), key=normalized.__getitem__)
+        self.sorted_keys = [normalized[row] for row in order]
+        self.sorted_rows = np.array(order, dtype=np.int32)
+        self.normalized = normalized
+
+    def __len__(self):
+        return len(self.titles)
+
+    def build_trigrams(self, normalized):
+        encoded = [padded(text) for text in normalized]
+        lengths = np.fromiter((len(data) for data in encoded), dtype=np.int64, count=len(encoded))
+        data = np.frombuffer(b''.join(encoded), dtype=np.uint8)
+        owner = np.repeat(np.arange(len(encoded), dtype=np.int64), lengths)
+        codes = trigram_codes(data)
+        # Drop the trigrams that run across two titles
+        inside = owner[:-2] == owner[2:]
+        keys = (codes[inside].astype(np.int64) << 32) | owner[:-2][inside]
+        keys.sort()
+        keys = keys[np.concatenate(([True], keys[1:] != keys[:-1]))]
+        # Postings: the rows containing trigram codes[i] are postings[offsets[i]:offsets[i + 1]]
+        key_codes = keys >> 32
+        starts = np.flatnonzero(np.concatenate(([True], key_codes[1:] != key_codes[:-1])))
+        self.codes = key_codes[starts]
+        self.offsets = np.append(starts, len(keys)).astype(np.int64)
+        self.postings = (keys & 0xFFFFFFFF).astype(np.int32)
+        self.trigram_counts = np.bincount(self.postings, minlength=len(normalized)).astype(np.int32)
+
+    # Function to find the titles starting with prefix, as a slice of the sorted titles within lo:hi
+    def prefix_range(self, prefix, lo=0, hi=None):
+        hi = len(self.sorted_keys) if hi is None else hi
+        start = bisect.bisect_left(self.sorted_keys, prefix, lo, hi)
+        return start, bisect.bisect_left(self.sorted_keys, prefix + '\uffff', start, hi)
+
+    def trigram_candidates(self, query, shortlist=SHORTLIST):
+        codes = np.unique(trigram_codes(np.frombuffer(padded(query), dtype=np.uint8)))
+        found = np.searchsorted(self.codes, codes)
+        found = found[(found < len(self.codes)) & (self.codes[np.minimum(found, len(self.codes) - 1)] == codes)]
+        if not len(found):
+            return np.empty(0, dtype=np.int32)
+        rows = np.concatenate([self.postings[self.offsets[index]:self.offsets[index + 1]] for index in found])
+        shared = np.bincount(rows, minlength=len(self.titles))
+        rows = np.flatnonzero(shared)
+        shared = shared[rows]
+        overlap = shared / (len(codes) + self.trigram_counts[rows] - shared)
+        if len(rows) > shortlist:
+            keep = np.argpartition(-overlap, shortlist - 1)[:shortlist]
+            rows = rows[keep]
+        return rows
+
+    def search(self, query, n=RESULTS, cutoff=CUTOFF, shortlist=SHORTLIST):
+        query = normalize_title(query)
+        if not query:
+            return []
+        start, end = self.prefix_range(query)
+        candidates = set(self.trigram_candidates(query, shortlist).tolist())
+        return self.rank(query, self.sorted_rows[start:min(end, start + n)], candidates, n, cutoff)
+
+    def rank(self, query, prefix_rows, candidates, n=RESULTS, cutoff=CUTOFF):
+        prefix = set(prefix_rows.tolist())
+        candidates = prefix.union(candidates)
+        matcher = difflib.SequenceMatcher()
+        matcher.set_seq2(query)
+        scored = []
+        for row in candidates:
+            matcher.set_seq1(self.normalized[row])
+            score = matcher.ratio()
+            if row in prefix or score >= cutoff:
+                scored.append((row in prefix, score, row))
+        scored.sort(key=lambda match: (-match[0], -match[1], match[2]))
+        return [self.titles[row] for _, _, row in scored[:n]]
+
+
+# Search as you type: one query after another from the same text box. Typing another character narrows
+# the previous prefix range instead of searching all titles, and recent queries (e.g. after a backspace)
+# are answered from a cache. Only the narrowed range and this query's own shortlist are ranked, so the
+# results are the ones TitleIndex.search gives whatever was typed before. Not thread safe, meant for a
+# single search worker.
+class IncrementalSearch:
+    def __init__(self, index, n=RESULTS, cutoff=CUTOFF, cache_size=64):
+        self.index = index
+        self.n = n
+        self.cutoff = cutoff
+        self.cache = OrderedDict()
+        self.cache_size = cache_size
+        self.last_query = None
+        self.last_range = (0, len(index))
+
+    def search(self, query):
+        query = normalize_title(query)
+        if not query:
+            return []
+        if query in self.cache:
+            self.cache.move_to_end(query)
+            return self.cache[query]
+        if self.last_query and query.startswith(self.last_query):
+            start, end = self.index.prefix_range(query, *self.last_range)
+        else:
+            start, end = self.index.prefix_range(query)
+        candidates = set(self.index.trigram_candidates(query).tolist())
+        results = self.index.rank(query, self.index.sorted_rows[start:min(end, start + self.n)],
+                                  candidates, self.n, self.cutoff)
+        self.last_query = query
+        self.last_range = (start, end)
+        self.cache[query] = results
+        if len(self.cache) > self.cache_size:
+            self.cache.popitem(last=False)
+        return results
+
+
+def synthetic_titles(count, seed=0):
+    rng = random.Random(seed)
+    words = ['the', 'of', 'and', 'star', 'night', 'return', 'dark', 'king', 'love', 'war', 'city', 'last', 'man',
+             'woman', 'ghost', 'house', 'river', 'island', 'secret', 'empire', 'dream', 'fire', 'ice', 'shadow']
+    words += [f"{rng.choice('bcdfghklmnprstvz')}{rng.choice('aeiou')}{rng.choice('lmnrst')}"
+              f"{rng.choice('aeiou')}{rng.choice('bcdklmnrstx')}" for _ in range(20000)]
+    return [' '.join(rng.choices(words, k=rng.randint(1, 5))).title() + f" ({rng.randint(1920, 2024)})"
+            for _ in range(count)]
+
+
+def misspell(title, rng):
+    characters = list(title)
+    for _ in range(2):
+        position = rng.randrange(len(characters))
+        characters[position] = rng.choice('abcdefghijklmnopqrstuvwxyz')
+    return ''.join(characters)
+
+
+def benchmark(titles=1000000, queries=1000, difflib_queries=5):
+    catalog = synthetic_titles(titles)
+    rng = random.Random(1)
+    targets = [catalog[rng.randrange(titles)] for _ in range(queries)]
+    typed = [misspell(title.rsplit(' (', 1)[0], rng) for title in targets]
+    prefixes = [title[:rng.randint(2, 6)] for title in targets]
+
+    start = time.perf_counter()
+    index = TitleIndex(catalog)
+    results = {'titles': titles, 'build_seconds': time.perf_counter() - start}
+    for name, sample in (('fuzzy', typed), ('prefix', prefixes)):
+        latencies = []
+        hits = 0
+        for query, target in zip(sample, targets):
+            start = time.perf_counter()
+            found = index.search(query)
+            latencies.append(time.perf_counter() - start)
+            hits += target in found
+        latencies.sort()
+        results[f'{name}_ms_p50'] = latencies[len(latencies) // 2] * 1000
+        results[f'{name}_ms_p99'] = latencies[int(len(latencies) * 0.99)] * 1000
+        results[f'{name}_target_in_results'] = hits / queries
+
+    start = time.perf_counter()
+    for query in typed[:difflib_queries]:
+        difflib.get_close_matches(query, catalog, n=RESULTS, cutoff=CUTOFF)
+    results['difflib_ms_per_query'] = (time.perf_counter() - start) / difflib_queries * 1000
+    return results
+
+
+def main(argv=None):
+    parser = argparse.ArgumentParser(description="Fuzzy movie title search benchmark against difflib")
+    parser.add_argument('--titles', type=int, default=1000000)
+    parser.add_argument('--queries', type=int, default=1000)
+    parser.add_argument('--difflib-queries', type=int, default=5)
+    args = parser.parse_args(argv)
+    print(json.dumps(benchmark(args.titles, args.queries, args.difflib_queries), indent=2))
+    return 0
+
+
+if __name__ == '__main__':
+    sys.exit(main())
@@ -0,0 +1,166 @@
+import argparse
+import json
+import random
+import sys
+import time
+
+import numpy as np
+import scipy.sparse as sp
+
+TOP_K = 10
+METRICS = ('jaccard', 'cosine')
+
+
+def parse_genres(genres):
+    if isinstance(genres, str):
+        return [genre.strip() for genre in genres.split(',') if genre.strip()]
+    return list(genres)
+
+
+# Function to build the movies x genres 0/1 matrix, genre lists are parsed once here
+def genre_matrix(genre_lists, genre_names=None):
+    genre_ids = {name: index for index, name in enumerate(genre_names or [])}
+    indptr = [0]
+    indices = []
+    for genres in genre_lists:
+        row = {genre_ids.setdefault(genre, len(genre_ids)) for genre in parse_genres(genres)}
+        indices.extend(sorted(row))
+        indptr.append(len(indices))
+    matrix = sp.csr_matrix((np.ones(len(indices), dtype=np.float32), np.array(indices, dtype=np.int32),
+                            np.array(indptr, dtype=np.int64)), shape=(len(indptr) - 1, len(genre_ids)))
+    return matrix, sorted(genre_ids, key=genre_ids.get)
+
+
+def similarity(intersections, sizes_a, sizes_b, metric='jaccard'):
+    if metric == 'jaccard':
+        union = sizes_a[:, None] + sizes_b[None, :] - intersections
+    elif metric == 'cosine':
+        union = np.sqrt(sizes_a[:, None] * sizes_b[None, :])
+    else:
+        raise ValueError(f"Unknown metric: {metric}")
+    with np.errstate(divide='ignore', invalid='ignore'):
+        scores = intersections / union
+    scores[union == 0] = 0
+    return scores
+
+
+# Item-item genre similarity. Movies with the same set of genres have the same neighbours, so the
+# catalog is collapsed into its distinct genre sets (a few thousand, even for a million titles),
+# those are scored against each other in batched matrix products, and every set keeps its top-k
+# movies. Looking up a movie's neighbours is then one row read.
+class GenreRecommender:
+    def __init__(self, titles, matrix, genre_names=None, k=TOP_K, metric='jaccard', batch_size=1024, lookup=None):
+        self.titles = titles
+        # Title to row; a catalog can pass its own lookup instead of a dict over every title
+        self.lookup = lookup or {title: row for row, title in enumerate(self.titles)}.get
+        self.k = k
+        self.metric = metric
+        self.matrix = matrix.tocsr()
+        self.genre_names = genre_names
+        self.build(batch_size)
+
+    @classmethod
+    def from_genres(cls, titles, genre_lists, **options):
+        matrix, genre_names = genre_matrix(genre_lists)
+        return cls(list(titles), matrix, genre_names, **options)
+
+    def build(self, batch_size):
+        rows = self.matrix.shape[0]
+        bits = np.packbits(self.matrix.toarray().astype(bool), axis=1)
+        keys = np.ascontiguousarray(bits).view(np.dtype((np.void, bits.shape[1]))).ravel()
+        _, first, self.signature = np.unique(keys, return_index=True, return_inverse=True)
+        self.signature = self.signature.ravel().astype(np.int32)
+        sets = self.matrix[first]
+        set_sizes = np.asarray(sets.sum(axis=1), dtype=np.float32).ravel()
+        # Movies grouped by genre set, members of set s are members[bounds[s]:bounds[s + 1]]
+        self.members = np.argsort(self.signature, kind='stable').astype(np.int32)
+        bounds = np.searchsorted(self.signature[self.members], np.arange(len(first) + 1))
+        group_sizes = np.diff(bounds)
+
+        # One extra slot so a movie can be dropped from its own list
+        width = min(self.k + 1, rows)
+        self.neighbours = np.empty((len(first), width), dtype=np.int32)
+        self.scores = np.empty((len(first), width), dtype=np.float32)
+        sets_t = sets.T.tocsr()
+        for start in range(0, len(first), batch_size):
+            end = min(start + batch_size, len(first))
+            intersections = sets[start:end].dot(sets_t).toarray()
+            scores = similarity(intersections, set_sizes[start:end], set_sizes, self.metric)
+            # Every set has at least one movie, so the top-k movies are always within the top-k sets
+            top = min(width, scores.shape[1])
+            order = np.argpartition(-scores, top - 1, axis=1)[:, :top]
+            order = np.take_along_axis(order, np.argsort(-np.take_along_axis(scores, order, axis=1), axis=1,
+                                                         kind='stable'), axis=1)
+            # Walk the most similar sets until they hold enough movies
+            needed = (np.cumsum(group_sizes[order], axis=1) < width).sum(axis=1) + 1
+            needed = np.minimum(needed, top)
+            for row, count in enumerate(needed):
+                chosen = order[row, :count]
+                movies = np.concatenate([self.members[bounds[group]:bounds[group + 1]] for group in chosen])
+                self.neighbours[start + row] = movies[:width]
+                self.scores[start + row] = np.repeat(scores[row, chosen], group_sizes[chosen])[:width]
+
+    def similar(self, title, k=None):
+        k = k or self.k
+        row = self.lookup(title)
+        if row is None:
+            return []
+        group = self.signature[row]
+        results = []
+        for movie, score in zip(self.neighbours[group], self.scores[group]):
+            if movie != row and score > 0:
+                results.append((self.titles[movie], float(score)))
+                if len(results) == k:
+                    break
+        return results
+
+
+def synthetic_catalog(titles, genres=25, seed=0):
+    rng = random.Random(seed)
+    names = [f"Genre {index}" for index in range(genres)]
+    weights = [1 / (index + 1) for index in range(genres)]
+    catalog = []
+    for index in range(titles):
+        count = rng.choice((1, 2, 2, 3, 3, 3, 4))
+        catalog.append((f"Movie {index}", set(rng.choices(names, weights, k=count))))
+    return catalog
+
+
+def benchmark(titles=1000000, genres=25, k=TOP_K, metric='jaccard', queries=10000):
+    catalog = synthetic_catalog(titles, genres)
+    start = time.perf_counter()
+    matrix, genre_names = genre_matrix([genres for _, genres in catalog])
+    parse_seconds = time.perf_counter() - start
+    start = time.perf_counter()
+    recommender = GenreRecommender([title for title, _ in catalog], matrix, genre_names, k, metric)
+    build_seconds = time.perf_counter() - start
+    rng = random.Random(1)
+    sample = [catalog[rng.randrange(titles)][0] for _ in range(queries)]
+    start = time.perf_counter()
+    for title in sample:
+        recommender.similar(title)
+    query_seconds = time.perf_counter() - start
+    return {
+        'titles': titles,
+        'genre_sets': int(recommender.neighbours.shape[0]),
+        'parse_seconds': parse_seconds,
+        'build_seconds': build_seconds,
+        'query_us': query_seconds / queries * 1e6,
+        'neighbour_table_mb': (recommender.neighbours.nbytes + recommender.scores.nbytes
+                               + recommender.signature.nbytes) / 2 ** 20,
+    }
+
+
+def main(argv=None):
+    parser = argparse.ArgumentParser(description="Genre-based movie similarity")
+    parser.add_argument('--titles', type=int, default=1000000)
+    parser.add_argument('--genres', type=int, default=25)
+    parser.add_argument('--k', type=int, default=TOP_K)
+    parser.add_argument('--metric', choices=METRICS, default='jaccard')
+    args = parser.parse_args(argv)
+    print(json.dumps(benchmark(args.titles, args.genres, args.k, args.metric), indent=2))
+    return 0
+
+
+if __name__ == '__main__':
+    sys.exit(main())
@@ -1,373 +1,24 @@
+import os
+import queue
+import threading
 import tkinter as tk
 from tkinter import messagebox, ttk
-import difflib
+from recommendation_catalog import CATALOG_PATH, load_catalog
+from recommendation_ratings import RATINGS_PATH, RatingsError, load_model
+from recommendation_similarity import GenreRecommender
+from recommendation_search import IncrementalSearch, TitleIndex
 
-# List of movies with attributes
-movies_data = {
-       'Avatar': {'genres': 'Action, Adventure, Fantasy'},
-    'Titanic': {'genres': 'Drama, Romance'},
-    'Avengers: Endgame': {'genres': 'Action, Adventure, Drama'},
-    'The Lion King (2019)': {'genres': 'Animation, Adventure, Drama'},
-    'Jurassic Park': {'genres': 'Action, Adventure, Sci-Fi'},
-    'The Avengers': {'genres': 'Action, Adventure, Sci-Fi'},
-    'Frozen II': {'genres': 'Animation, Adventure, Comedy'},
-    'The Fate of the Furious': {'genres': 'Action, Adventure, Crime'},
-    'Harry Potter and the Deathly Hallows – Part 2': {'genres': 'Adventure, Drama, Fantasy'},
-    'Star Wars: Episode I – The Phantom Menace': {'genres': 'Action, Adventure, Fantasy'},
-    'Black Panther': {'genres': 'Action, Adventure, Sci-Fi'},
-    'Harry Potter and the Philosopher\'s Stone': {'genres': 'Adventure, Family, Fantasy'},
-    'Star Wars: The Last Jedi': {'genres': 'Action, Adventure, Fantasy'},
-    'Jurassic World: Fallen Kingdom': {'genres': 'Action, Adventure, Sci-Fi'},
-    'Beauty and the Beast (2017)': {'genres': 'Family, Fantasy, Musical'},
-    'Incredibles 2': {'genres': 'Animation, Action, Adventure'},
-    'The Fate of the Furious': {'genres': 'Action, Adventure, Crime'},
-    'Iron Man 3': {'genres': 'Action, Adventure, Sci-Fi'},
-    'Minions': {'genres': 'Animation, Adventure, Comedy'},
-    'Aquaman': {'genres': 'Action, Adventure, Fantasy'},
+# The catalog lives in movies.csv (movieId, title, genres) next to this file, read through its memory-mapped binary cache
+catalog = load_catalog(CATALOG_PATH)
 
-    'Spider-Man: Far From Home': {'genres': 'Action, Adventure, Sci-Fi'},
-    'Captain Marvel': {'genres': 'Action, Adventure, Sci-Fi'},
-    'Transformers: Dark of the Moon': {'genres': 'Action, Adventure, Sci-Fi'},
-    'Skyfall': {'genres': 'Action, Adventure, Thriller'},
-    'The Dark Knight Rises': {'genres': 'Action, Thriller'},
-    'Toy Story 4': {'genres': 'Animation, Adventure, Comedy'},
-    'Alice in Wonderland (2010)': {'genres': 'Adventure, Family, Fantasy'},
-    'Pirates of the Caribbean: Dead Man\'s Chest': {'genres': 'Action, Adventure, Fantasy'},
-    'Despicable Me 3': {'genres': 'Animation, Adventure, Comedy'},
-    'The Jungle Book (2016)': {'genres': 'Adventure, Drama, Family'},
-    'Finding Dory': {'genres': 'Animation, Adventure, Comedy'},
-    'Star Wars: Episode III – Revenge of the Sith': {'genres': 'Action, Adventure, Fantasy'},
-    'Harry Potter and the Order of the Phoenix': {'genres': 'Action, Adventure, Family'},
-    'The Dark Knight': {'genres': 'Action, Crime, Drama'},
-    'Harry Potter and the Half-Blood Prince': {'genres': 'Action, Adventure, Family'},
-    'Shrek 2': {'genres': 'Animation, Adventure, Comedy'},
-    'Finding Nemo': {'genres': 'Animation, Adventure, Comedy'},
-    'Harry Potter and the Goblet of Fire': {'genres': 'Adventure, Family, Fantasy'},
-    'Spider-Man: No Way Home': {'genres': 'Action, Adventure, Fantasy'},
-    'Harry Potter and the Chamber of Secrets': {'genres': 'Adventure, Family, Fantasy'},
-    'The Dark Knight Rises': {'genres': 'Action, Thriller'},
-    'Pirates of the Caribbean: On Stranger Tides': {'genres': 'Action, Adventure, Fantasy'},
-    'Jurassic World': {'genres': 'Action, Adventure, Sci-Fi'},
-    'The Lion King': {'genres': 'Animation, Adventure, Drama'},
-    'The Avengers': {'genres': 'Action, Adventure, Sci-Fi'},
-    'The Avengers: Age of Ultron': {'genres': 'Action, Adventure, Sci-Fi'},
-    'Frozen': {'genres': 'Animation, Adventure, Comedy'},
-    'Beauty and the Beast': {'genres': 'Animation, Family, Fantasy'},
-    'Incredibles 2': {'genres': 'Animation, Action, Adventure'},
-    'The Fate of the Furious': {'genres': 'Action, Adventure, Crime'},
-    'Iron Man 3': {'genres': 'Action, Adventure, Sci-Fi'},
-    'Minions': {'genres': 'Animation, Adventure, Comedy'},
-    'Aquaman': {'genres': 'Action, Adventure, Fantasy'},
-    'Skyfall': {'genres': 'Action, Adventure, Thriller'},
-    'The Dark Knight Rises': {'genres': 'Action, Thriller'},
-    'Alice in Wonderland': {'genres': 'Adventure, Family, Fantasy'},
-    'Pirates of the Caribbean: Dead Man\'s Chest': {'genres': 'Action, Adventure, Fantasy'},
-    'Despicable Me 3': {'genres': 'Animation, Adventure, Comedy'},
-    'The Jungle Book': {'genres': 'Adventure, Drama, Family'},
-    'Finding Dory': {'genres': 'Animation, Adventure, Comedy'},
-    'Star Wars: Episode III – Revenge of the Sith': {'genres': 'Action, Adventure, Fantasy'},
-    'Harry Potter and the Order of the Phoenix': {'genres': 'Action, Adventure, Family'},
-    'Harry Potter and the Half-Blood Prince': {'genres': 'Action, Adventure, Family'},
-    'Shrek 2': {'genres': 'Animation, Adventure, Comedy'},
-    'Finding Nemo': {'genres': 'Animation, Adventure, Comedy'},
-    'Harry Potter and the Goblet of Fire': {'genres': 'Adventure, Family, Fantasy'},
-    'Spider-Man: No Way Home': {'genres': 'Action, Adventure, Fantasy'},
-    'Spider-Man: Far From Home': {'genres': 'Action, Adventure, Sci-Fi'},
-    'Harry Potter and the Chamber of Secrets': {'genres': 'Adventure, Family, Fantasy'},
-    'Jurassic Park': {'genres': 'Action, Adventure, Sci-Fi'},
-    'Star Wars: Episode I – The Phantom Menace': {'genres': 'Action, Adventure, Fantasy'},
-    'Black Panther': {'genres': 'Action, Adventure, Sci-Fi'},
-    'Harry Potter and the Philosopher\'s Stone': {'genres': 'Adventure, Family, Fantasy'},
-    'Star Wars: The Last Jedi': {'genres': 'Action, Adventure, Fantasy'},
-    'Jurassic World: Fallen Kingdom': {'genres': 'Action, Adventure, Sci-Fi'},
-    'Beauty and the Beast': {'genres': 'Family, Fantasy, Musical'},
-    'Toy Story 4': {'genres': 'Animation, Adventure, Comedy'},
-    'The Jungle Book (2016)': {'genres': 'Adventure, Drama, Family'},
-    'Alice in Wonderland (2010)': {'genres': 'Adventure, Family, Fantasy'},
-    'Pirates of the Caribbean: Dead Man\'s Chest': {'genres': 'Action, Adventure, Fantasy'},
-    'Despicable Me 3': {'genres': 'Animation, Adventure, Comedy'},
-    'Spider-Man: Far From Home': {'genres': 'Action, Adventure, Sci-Fi'},
-    'The Lion King (2019)': {'genres': 'Animation, Adventure, Drama'},
-    'Transformers: Dark of the Moon': {'genres': 'Action, Adventure, Sci-Fi'},
-    'Harry Potter and the Deathly Hallows – Part 2': {'genres': 'Adventure, Drama, Fantasy'},
-    'Star Wars: Episode I – The Phantom Menace': {'genres': 'Action, Adventure, Fantasy'},
-    'Black Panther': {'genres': 'Action, Adventure, Sci-Fi'},
-    'Harry Potter and the Philosopher\'s Stone': {'genres': 'Adventure, Family, Fantasy'},
-    'Star Wars: The Last Jedi': {'genres': 'Action, Adventure, Fantasy'},
-    'Jurassic World: Fallen Kingdom': {'genres': 'Action, Adventure, Sci-Fi'},
-    'Beauty and the Beast (2017)': {'genres': 'Family, Fantasy, Musical'},
-    'Incredibles 2': {'genres': 'Animation, Action, Adventure'},
-    'The Fate of the Furious': {'genres': 'Action, Adventure, Crime'},
-    'Iron Man 3': {'genres': 'Action, Adventure, Sci-Fi'},
-    'Minions': {'genres': 'Animation, Adventure, Comedy'},
-    'Aquaman': {'genres': 'Action, Adventure, Fantasy'},
-    'Spider-Man: Far From Home': {'genres': 'Action, Adventure, Sci-Fi'},
-    'Captain Marvel': {'genres': 'Action, Adventure, Sci-Fi'},
-    'Transformers: Dark of the Moon': {'genres': 'Action, Adventure, Sci-Fi'},
-    'Skyfall': {'genres': 'Action, Adventure, Thriller'},
-    'The Dark Knight Rises': {'genres': 'Action, Thriller'},
-    'Toy Story 4': {'genres': 'Animation, Adventure, Comedy'},
-    'Alice in Wonderland (2010)': {'genres': 'Adventure, Family, Fantasy'},
-    'Pirates of the Caribbean: Dead Man\'s Chest': {'genres': 'Action, Adventure, Fantasy'},
-    'Despicable Me 3': {'genres': 'Animation, Adventure, Comedy'},
-    'The Jungle Book (2016)': {'genres': 'Adventure, Drama, Family'},
-    'Finding Dory': {'genres': 'Animation, Adventure, Comedy'},
-    'Star Wars: Episode III – Revenge of the Sith': {'genres': 'Action, Adventure, Fantasy'},
-    'Harry Potter and the Order of the Phoenix': {'genres': 'Action, Adventure, Family'},
-    'Harry Potter and the Half-Blood Prince': {'genres': 'Action, Adventure, Family'},
-    'Shrek 2': {'genres': 'Animation, Adventure, Comedy'},
-    'Finding Nemo': {'genres': 'Animation, Adventure, Comedy'},
-    'Harry Potter and the Goblet of Fire': {'genres': 'Adventure, Family, Fantasy'},
-    'Spider-Man: No Way Home': {'genres': 'Action, Adventure, Fantasy'},
-    'Spider-Man: Far From Home': {'genres': 'Action, Adventure, Sci-Fi'},
-    'Harry Potter and the Chamber of Secrets': {'genres': 'Adventure, Family, Fantasy'},
-    'Jurassic Park': {'genres': 'Action, Adventure, Sci-Fi'},
-    'Star Wars: Episode I – The Phantom Menace': {'genres': 'Action, Adventure, Fantasy'},
-    'Black Panther': {'genres': 'Action, Adventure, Sci-Fi'},
-    'Harry Potter and the Philosopher\'s Stone': {'genres': 'Adventure, Family, Fantasy'},
-    'Star Wars: The Last Jedi': {'genres': 'Action, Adventure, Fantasy'},
-    'Jurassic World: Fallen Kingdom': {'genres': 'Action, Adventure, Sci-Fi'},
-    'Beauty and the Beast (2017)': {'genres': 'Family, Fantasy, Musical'},
-    'Incredibles 2': {'genres': 'Animation, Action, Adventure'},
-    'The Fate of the Furious': {'genres': 'Action, Adventure, Crime'},
-    'Iron Man 3': {'genres': 'Action, Adventure, Sci-Fi'},
-    'Minions': {'genres': 'Animation, Adventure, Comedy'},
-    'Aquaman': {'genres': 'Action, Adventure, Fantasy'},
-    'Spider-Man: Far From Home': {'genres': 'Action, Adventure, Sci-Fi'},
-    'Captain Marvel': {'genres': 'Action, Adventure, Sci-Fi'},
-    'Transformers: Dark of the Moon': {'genres': 'Action, Adventure, Sci-Fi'},
-    'Skyfall': {'genres': 'Action, Adventure, Thriller'},
-    'The Dark Knight Rises': {'genres': 'Action, Thriller'},
-    'Toy Story 4': {'genres': 'Animation, Adventure, Comedy'},
-    'Alice in Wonderland (2010)': {'genres': 'Adventure, Family, Fantasy'},
-    'Pirates of the Caribbean: Dead Man\'s Chest': {'genres': 'Action, Adventure, Fantasy'},
-    'Despicable Me 3': {'genres': 'Animation, Adventure, Comedy'},
-    'The Jungle Book (2016)': {'genres': 'Adventure, Drama, Family'},
-    'Finding Dory': {'genres': 'Animation, Adventure, Comedy'},
-    'Star Wars: Episode III – Revenge of the Sith': {'genres': 'Action, Adventure, Fantasy'},
-    'Harry Potter and the Order of the Phoenix': {'genres': 'Action, Adventure, Family'},
-    'Harry Potter and the Half-Blood Prince': {'genres': 'Action, Adventure, Family'},
-    'Shrek 2': {'genres': 'Animation, Adventure, Comedy'},
-    'Finding Nemo': {'genres': 'Animation, Adventure, Comedy'},
-    'Harry Potter and the Goblet of Fire': {'genres': 'Adventure, Family, Fantasy'},
-    'Spider-Man: No Way Home': {'genres': 'Action, Adventure, Fantasy'},
-    'Spider-Man: Far From Home': {'genres': 'Action, Adventure, Sci-Fi'},
-    'Harry Potter and the Chamber of Secrets': {'genres': 'Adventure, Family, Fantasy'},
-    'Jurassic Park': {'genres': 'Action, Adventure, Sci-Fi'},
-    'Star Wars: Episode I – The Phantom Menace': {'genres': 'Action, Adventure, Fantasy'},
-    'Black Panther': {'genres': 'Action, Adventure, Sci-Fi'},
-    'Harry Potter and the Philosopher\'s Stone': {'genres': 'Adventure, Family, Fantasy'},
-    'Star Wars: The Last Jedi': {'genres': 'Action, Adventure, Fantasy'},
-    'Jurassic World: Fallen Kingdom': {'genres': 'Action, Adventure, Sci-Fi'},
-    'Beauty and the Beast (2017)': {'genres': 'Family, Fantasy, Musical'},
-    'Incredibles 2': {'genres': 'Animation, Action, Adventure'},
-    'The Fate of the Furious': {'genres': 'Action, Adventure, Crime'},
-    'Iron Man 3': {'genres': 'Action, Adventure, Sci-Fi'},
-    'Minions': {'genres': 'Animation, Adventure, Comedy'},
-    'Aquaman': {'genres': 'Action, Adventure, Fantasy'},
-    'Spider-Man: Far From Home': {'genres': 'Action, Adventure, Sci-Fi'},
-    'Captain Marvel': {'genres': 'Action, Adventure, Sci-Fi'},
-    'Transformers: Dark of the Moon': {'genres': 'Action, Adventure, Sci-Fi'},
-    'Skyfall': {'genres': 'Action, Adventure, Thriller'},
-    'The Dark Knight Rises': {'genres': 'Action, Thriller'},
-    'Toy Story 4': {'genres': 'Animation, Adventure, Comedy'},
-    'Alice in Wonderland (2010)': {'genres': 'Adventure, Family, Fantasy'},
-    'Pirates of the Caribbean: Dead Man\'s Chest': {'genres': 'Action, Adventure, Fantasy'},
-    'Despicable Me 3': {'genres': 'Animation, Adventure, Comedy'},
-    'The Jungle Book (2016)': {'genres': 'Adventure, Drama, Family'},
-    'Finding Dory': {'genres': 'Animation, Adventure, Comedy'},
-    'Star Wars: Episode III – Revenge of the Sith': {'genres': 'Action, Adventure, Fantasy'},
-    'Harry Potter and the Order of the Phoenix': {'genres': 'Action, Adventure, Family'},
-    'Harry Potter and the Half-Blood Prince': {'genres': 'Action, Adventure, Family'},
-    'Shrek 2': {'genres': 'Animation, Adventure, Comedy'},
-    'Finding Nemo': {'genres': 'Animation, Adventure, Comedy'},
-    'Harry Potter and the Goblet of Fire': {'genres': 'Adventure, Family, Fantasy'},
+# Nearest neighbours by genre for every movie, computed once at startup
+recommender = GenreRecommender(catalog.titles, catalog.genre_matrix(), catalog.genre_names, lookup=catalog.find)
+# Trigram index over the titles for fuzzy search
+title_index = TitleIndex(catalog.titles)
 
-}
-
-# Add more movies and genres
-additional_movies = {
-     'Avatar': {'genres': 'Action, Adventure, Fantasy'},
-    'Titanic': {'genres': 'Drama, Romance'},
-    'Avengers: Endgame': {'genres': 'Action, Adventure, Drama'},
-    'The Lion King (2019)': {'genres': 'Animation, Adventure, Drama'},
-    'Jurassic Park': {'genres': 'Action, Adventure, Sci-Fi'},
-    'The Avengers': {'genres': 'Action, Adventure, Sci-Fi'},
-    'Frozen II': {'genres': 'Animation, Adventure, Comedy'},
-    'The Fate of the Furious': {'genres': 'Action, Adventure, Crime'},
-    'Harry Potter and the Deathly Hallows – Part 2': {'genres': 'Adventure, Drama, Fantasy'},
-    'Star Wars: Episode I – The Phantom Menace': {'genres': 'Action, Adventure, Fantasy'},
-    'Black Panther': {'genres': 'Action, Adventure, Sci-Fi'},
-    'Harry Potter and the Philosopher\'s Stone': {'genres': 'Adventure, Family, Fantasy'},
-    'Star Wars: The Last Jedi': {'genres': 'Action, Adventure, Fantasy'},
-    'Jurassic World: Fallen Kingdom': {'genres': 'Action, Adventure, Sci-Fi'},
-    'Beauty and the Beast (2017)': {'genres': 'Family, Fantasy, Musical'},
-    'Incredibles 2': {'genres': 'Animation, Action, Adventure'},
-    'The Fate of the Furious': {'genres': 'Action, Adventure, Crime'},
-    'Iron Man 3': {'genres': 'Action, Adventure, Sci-Fi'},
-    'Minions': {'genres': 'Animation, Adventure, Comedy'},
-    'Aquaman': {'genres': 'Action, Adventure, Fantasy'},
-    'Spider-Man: Far From Home': {'genres': 'Action, Adventure, Sci-Fi'},
-    'Captain Marvel': {'genres': 'Action, Adventure, Sci-Fi'},
-    'Transformers: Dark of the Moon': {'genres': 'Action, Adventure, Sci-Fi'},
-    'Skyfall': {'genres': 'Action, Adventure, Thriller'},
-    'The Dark Knight Rises': {'genres': 'Action, Thriller'},
-    'Toy Story 4': {'genres': 'Animation, Adventure, Comedy'},
-    'Alice in Wonderland (2010)': {'genres': 'Adventure, Family, Fantasy'},
-    'Pirates of the Caribbean: Dead Man\'s Chest': {'genres': 'Action, Adventure, Fantasy'},
-    'Despicable Me 3': {'genres': 'Animation, Adventure, Comedy'},
-    'The Jungle Book (2016)': {'genres': 'Adventure, Drama, Family'},
-    'Finding Dory': {'genres': 'Animation, Adventure, Comedy'},
-    'Star Wars: Episode III – Revenge of the Sith': {'genres': 'Action, Adventure, Fantasy'},
-    'Harry Potter and the Order of the Phoenix': {'genres': 'Action, Adventure, Family'},
-    'The Dark Knight': {'genres': 'Action, Crime, Drama'},
-    'Harry Potter and the Half-Blood Prince': {'genres': 'Action, Adventure, Family'},
-    'Shrek 2': {'genres': 'Animation, Adventure, Comedy'},
-    'Finding Nemo': {'genres': 'Animation, Adventure, Comedy'},
-    'Harry Potter and the Goblet of Fire': {'genres': 'Adventure, Family, Fantasy'},
-    'Spider-Man: No Way Home': {'genres': 'Action, Adventure, Fantasy'},
-    'Harry Potter and the Chamber of Secrets': {'genres': 'Adventure, Family, Fantasy'},
-    'The Dark Knight Rises': {'genres': 'Action, Thriller'},
-    'Pirates of the Caribbean: On Stranger Tides': {'genres': 'Action, Adventure, Fantasy'},
-    'Jurassic World': {'genres': 'Action, Adventure, Sci-Fi'},
-    'The Lion King': {'genres': 'Animation, Adventure, Drama'},
-    'The Avengers': {'genres': 'Action, Adventure, Sci-Fi'},
-    'The Avengers: Age of Ultron': {'genres': 'Action, Adventure, Sci-Fi'},
-    'Frozen': {'genres': 'Animation, Adventure, Comedy'},
-    'Beauty and the Beast': {'genres': 'Animation, Family, Fantasy'},
-    'Incredibles 2': {'genres': 'Animation, Action, Adventure'},
-    'The Fate of the Furious': {'genres': 'Action, Adventure, Crime'},
-    'Iron Man 3': {'genres': 'Action, Adventure, Sci-Fi'},
-    'Minions': {'genres': 'Animation, Adventure, Comedy'},
-    'Aquaman': {'genres': 'Action, Adventure, Fantasy'},
-    'Skyfall': {'genres': 'Action, Adventure, Thriller'},
-    'The Dark Knight Rises': {'genres': 'Action, Thriller'},
-    'Alice in Wonderland': {'genres': 'Adventure, Family, Fantasy'},
-    'Pirates of the Caribbean: Dead Man\'s Chest': {'genres': 'Action, Adventure, Fantasy'},
-    'Despicable Me 3': {'genres': 'Animation, Adventure, Comedy'},
-    'The Jungle Book': {'genres': 'Adventure, Drama, Family'},
-    'Finding Dory': {'genres': 'Animation, Adventure, Comedy'},
-    'Star Wars: Episode III – Revenge of the Sith': {'genres': 'Action, Adventure, Fantasy'},
-    'Harry Potter and the Order of the Phoenix': {'genres': 'Action, Adventure, Family'},
-    'Harry Potter and the Half-Blood Prince': {'genres': 'Action, Adventure, Family'},
-    'Shrek 2': {'genres': 'Animation, Adventure, Comedy'},
-    'Finding Nemo': {'genres': 'Animation, Adventure, Comedy'},
-    'Harry Potter and the Goblet of Fire': {'genres': 'Adventure, Family, Fantasy'},
-    'Spider-Man: No Way Home': {'genres': 'Action, Adventure, Fantasy'},
-    'Spider-Man: Far From Home': {'genres': 'Action, Adventure, Sci-Fi'},
-    'Harry Potter and the Chamber of Secrets': {'genres': 'Adventure, Family, Fantasy'},
-    'Jurassic Park': {'genres': 'Action, Adventure, Sci-Fi'},
-    'Star Wars: Episode I – The Phantom Menace': {'genres': 'Action, Adventure, Fantasy'},
-    'Black Panther': {'genres': 'Action, Adventure, Sci-Fi'},
-    'Harry Potter and the Philosopher\'s Stone': {'genres': 'Adventure, Family, Fantasy'},
-    'Star Wars: The Last Jedi': {'genres': 'Action, Adventure, Fantasy'},
-    'Jurassic World: Fallen Kingdom': {'genres': 'Action, Adventure, Sci-Fi'},
-    'Beauty and the Beast': {'genres': 'Family, Fantasy, Musical'},
-    'Toy Story 4': {'genres': 'Animation, Adventure, Comedy'},
-    'The Jungle Book (2016)': {'genres': 'Adventure, Drama, Family'},
-    'Alice in Wonderland (2010)': {'genres': 'Adventure, Family, Fantasy'},
-    'Pirates of the Caribbean: Dead Man\'s Chest': {'genres': 'Action, Adventure, Fantasy'},
-    'Despicable Me 3': {'genres': 'Animation, Adventure, Comedy'},
-    'Spider-Man: Far From Home': {'genres': 'Action, Adventure, Sci-Fi'},
-    'The Lion King (2019)': {'genres': 'Animation, Adventure, Drama'},
-    'Transformers: Dark of the Moon': {'genres': 'Action, Adventure, Sci-Fi'},
-    'Harry Potter and the Deathly Hallows – Part 2': {'genres': 'Adventure, Drama, Fantasy'},
-    'Star Wars: Episode I – The Phantom Menace': {'genres': 'Action, Adventure, Fantasy'},
-    'Black Panther': {'genres': 'Action, Adventure, Sci-Fi'},
-    'Harry Potter and the Philosopher\'s Stone': {'genres': 'Adventure, Family, Fantasy'},
-    'Star Wars: The Last Jedi': {'genres': 'Action, Adventure, Fantasy'},
-    'Jurassic World: Fallen Kingdom': {'genres': 'Action, Adventure, Sci-Fi'},
-    'Beauty and the Beast (2017)': {'genres': 'Family, Fantasy, Musical'},
-    'Incredibles 2': {'genres': 'Animation, Action, Adventure'},
-    'The Fate of the Furious': {'genres': 'Action, Adventure, Crime'},
-    'Iron Man 3': {'genres': 'Action, Adventure, Sci-Fi'},
-    'Minions': {'genres': 'Animation, Adventure, Comedy'},
-    'Aquaman': {'genres': 'Action, Adventure, Fantasy'},
-    'Spider-Man: Far From Home': {'genres': 'Action, Adventure, Sci-Fi'},
-    'Captain Marvel': {'genres': 'Action, Adventure, Sci-Fi'},
-    'Transformers: Dark of the Moon': {'genres': 'Action, Adventure, Sci-Fi'},
-    'Skyfall': {'genres': 'Action, Adventure, Thriller'},
-    'The Dark Knight Rises': {'genres': 'Action, Thriller'},
-    'Toy Story 4': {'genres': 'Animation, Adventure, Comedy'},
-    'Alice in Wonderland (2010)': {'genres': 'Adventure, Family, Fantasy'},
-    'Pirates of the Caribbean: Dead Man\'s Chest': {'genres': 'Action, Adventure, Fantasy'},
-    'Despicable Me 3': {'genres': 'Animation, Adventure, Comedy'},
-    'The Jungle Book (2016)': {'genres': 'Adventure, Drama, Family'},
-    'Finding Dory': {'genres': 'Animation, Adventure, Comedy'},
-    'Star Wars: Episode III – Revenge of the Sith': {'genres': 'Action, Adventure, Fantasy'},
-    'Harry Potter and the Order of the Phoenix': {'genres': 'Action, Adventure, Family'},
-    'Harry Potter and the Half-Blood Prince': {'genres': 'Action, Adventure, Family'},
-    'Shrek 2': {'genres': 'Animation, Adventure, Comedy'},
-    'Finding Nemo': {'genres': 'Animation, Adventure, Comedy'},
-    'Harry Potter and the Goblet of Fire': {'genres': 'Adventure, Family, Fantasy'},
-    'Spider-Man: No Way Home': {'genres': 'Action, Adventure, Fantasy'},
-    'Spider-Man: Far From Home': {'genres': 'Action, Adventure, Sci-Fi'},
-    'Harry Potter and the Chamber of Secrets': {'genres': 'Adventure, Family, Fantasy'},
-    'Jurassic Park': {'genres': 'Action, Adventure, Sci-Fi'},
-    'Star Wars: Episode I – The Phantom Menace': {'genres': 'Action, Adventure, Fantasy'},
-    'Black Panther': {'genres': 'Action, Adventure, Sci-Fi'},
-    'Harry Potter and the Philosopher\'s Stone': {'genres': 'Adventure, Family, Fantasy'},
-    'Star Wars: The Last Jedi': {'genres': 'Action, Adventure, Fantasy'},
-    'Jurassic World: Fallen Kingdom': {'genres': 'Action, Adventure, Sci-Fi'},
-    'Beauty and the Beast (2017)': {'genres': 'Family, Fantasy, Musical'},
-    'Incredibles 2': {'genres': 'Animation, Action, Adventure'},
-    'The Fate of the Furious': {'genres': 'Action, Adventure, Crime'},
-    'Iron Man 3': {'genres': 'Action, Adventure, Sci-Fi'},
-    'Minions': {'genres': 'Animation, Adventure, Comedy'},
-    'Aquaman': {'genres': 'Action, Adventure, Fantasy'},
-    'Spider-Man: Far From Home': {'genres': 'Action, Adventure, Sci-Fi'},
-    'Captain Marvel': {'genres': 'Action, Adventure, Sci-Fi'},
-    'Transformers: Dark of the Moon': {'genres': 'Action, Adventure, Sci-Fi'},
-    'Skyfall': {'genres': 'Action, Adventure, Thriller'},
-    'The Dark Knight Rises': {'genres': 'Action, Thriller'},
-    'Toy Story 4': {'genres': 'Animation, Adventure, Comedy'},
-    'Alice in Wonderland (2010)': {'genres': 'Adventure, Family, Fantasy'},
-    'Pirates of the Caribbean: Dead Man\'s Chest': {'genres': 'Action, Adventure, Fantasy'},
-    'Despicable Me 3': {'genres': 'Animation, Adventure, Comedy'},
-    'The Jungle Book (2016)': {'genres': 'Adventure, Drama, Family'},
-    'Finding Dory': {'genres': 'Animation, Adventure, Comedy'},
-    'Star Wars: Episode III – Revenge of the Sith': {'genres': 'Action, Adventure, Fantasy'},
-    'Harry Potter and the Order of the Phoenix': {'genres': 'Action, Adventure, Family'},
-    'Harry Potter and the Half-Blood Prince': {'genres': 'Action, Adventure, Family'},
-    'Shrek 2': {'genres': 'Animation, Adventure, Comedy'},
-    'Finding Nemo': {'genres': 'Animation, Adventure, Comedy'},
-    'Harry Potter and the Goblet of Fire': {'genres': 'Adventure, Family, Fantasy'},
-    'Spider-Man: No Way Home': {'genres': 'Action, Adventure, Fantasy'},
-    'Spider-Man: Far From Home': {'genres': 'Action, Adventure, Sci-Fi'},
-    'Harry Potter and the Chamber of Secrets': {'genres': 'Adventure, Family, Fantasy'},
-    'Jurassic Park': {'genres': 'Action, Adventure, Sci-Fi'},
-    'Star Wars: Episode I – The Phantom Menace': {'genres': 'Action, Adventure, Fantasy'},
-    'Black Panther': {'genres': 'Action, Adventure, Sci-Fi'},
-    'Harry Potter and the Philosopher\'s Stone': {'genres': 'Adventure, Family, Fantasy'},
-    'Star Wars: The Last Jedi': {'genres': 'Action, Adventure, Fantasy'},
-    'Jurassic World: Fallen Kingdom': {'genres': 'Action, Adventure, Sci-Fi'},
-    'Beauty and the Beast (2017)': {'genres': 'Family, Fantasy, Musical'},
-    'Incredibles 2': {'genres': 'Animation, Action, Adventure'},
-    'The Fate of the Furious': {'genres': 'Action, Adventure, Crime'},
-    'Iron Man 3': {'genres': 'Action, Adventure, Sci-Fi'},
-    'Minions': {'genres': 'Animation, Adventure, Comedy'},
-    'Aquaman': {'genres': 'Action, Adventure, Fantasy'},
-    'Spider-Man: Far From Home': {'genres': 'Action, Adventure, Sci-Fi'},
-    'Captain Marvel': {'genres': 'Action, Adventure, Sci-Fi'},
-    'Transformers: Dark of the Moon': {'genres': 'Action, Adventure, Sci-Fi'},
-    'Skyfall': {'genres': 'Action, Adventure, Thriller'},
-    'The Dark Knight Rises': {'genres': 'Action, Thriller'},
-    'Toy Story 4': {'genres': 'Animation, Adventure, Comedy'},
-    'Alice in Wonderland (2010)': {'genres': 'Adventure, Family, Fantasy'},
-    'Pirates of the Caribbean: Dead Man\'s Chest': {'genres': 'Action, Adventure, Fantasy'},
-    'Despicable Me 3': {'genres': 'Animation, Adventure, Comedy'},
-    'The Jungle Book (2016)': {'genres': 'Adventure, Drama, Family'},
-    'Finding Dory': {'genres': 'Animation, Adventure, Comedy'},
-    'Star Wars: Episode III – Revenge of the Sith': {'genres': 'Action, Adventure, Fantasy'},
-    'Harry Potter and the Order of the Phoenix': {'genres': 'Action, Adventure, Family'},
-    'Harry Potter and the Half-Blood Prince': {'genres': 'Action, Adventure, Family'},
-    'Shrek 2': {'genres': 'Animation, Adventure, Comedy'},
-    'Finding Nemo': {'genres': 'Animation, Adventure, Comedy'},
-    'Harry Potter and the Goblet of Fire': {'genres': 'Adventure, Family, Fantasy'},
-
-}
-
-movies_data.update(additional_movies)
+# Search as you type: wait this long after the last keystroke, and check for results this often
+DEBOUNCE_MS = 150
+POLL_MS = 30
 
 class MovieSearchApp:
     def __init__(self, root):
@@ -393,6 +44,7 @@ class MovieSearchApp:
 
         # Search Entry
         self.search_var = tk.StringVar()
+        self.search_var.trace_add('write', self.on_search_changed)
         search_entry = ttk.Entry(search_frame, textvariable=self.search_var, width=30)
         search_entry.grid(row=0, column=0, padx=10)
 
@@ -400,8 +52,17 @@ class MovieSearchApp:
         search_button = ttk.Button(search_frame, text="Search", command=self.search_movie)
         search_button.grid(row=0, column=1, padx=10)
 
+        # Recommendations from other users' ratings, for a user id
+        user_frame = ttk.Frame(root, padding=10)
+        user_frame.pack(pady=5)
+        self.user_var = tk.StringVar()
+        user_entry = ttk.Entry(user_frame, textvariable=self.user_var, width=12)
+        user_entry.grid(row=0, column=0, padx=10)
+        recommend_button = ttk.Button(user_frame, text="Recommend for user", command=self.recommend_for_user)
+        recommend_button.grid(row=0, column=1, padx=10)
+
         # Progress Bar
-        self.progress = ttk.Progressbar(root, orient='horizontal', mode='determinate', length=400)
+        self.progress = ttk.Progressbar(root, orient='horizontal', mode='indeterminate', length=400)
         self.progress.pack(pady=10)
 
         # Result Listbox
@@ -413,23 +74,105 @@ class MovieSearchApp:
         self.details_label = ttk.Label(root, text="")
         self.details_label.pack(pady=20)
 
-    def search_movie(self):
-        search_term = self.search_var.get()
+        # Queries run on a worker thread; only the newest one counts, older ones are skipped or dropped
+        self.searcher = IncrementalSearch(title_index, n=10, cutoff=0.1)
+        self.search_generation = 0
+        self.debounce_id = None
+        self.search_requests = queue.Queue()
+        self.search_results = queue.Queue()
+        threading.Thread(target=self.search_worker, name='movie-search', daemon=True).start()
+        self.root.after(POLL_MS, self.poll_search_results)
+
+        # Training on a big ratings file takes a while, the rest of the app is usable meanwhile
+        self.user_model = None
+        self.user_model_error = None
+        if os.path.exists(RATINGS_PATH):
+            threading.Thread(target=self.load_user_model, name='ratings-model', daemon=True).start()
+        else:
+            self.user_model_error = f"No ratings yet, add {RATINGS_PATH} (userId,movieId,rating) to get recommendations."
+
+    def load_user_model(self):
+        try:
+            self.user_model = load_model(RATINGS_PATH, catalog)
+        except (OSError, RatingsError) as error:
+            self.user_model_error = f"Could not load {RATINGS_PATH}: {error}"
+
+    def on_search_changed(self, *args):
+        if self.debounce_id is not None:
+            self.root.after_cancel(self.debounce_id)
+        self.debounce_id = self.root.after(DEBOUNCE_MS, lambda: self.search_movie(explicit=False))
+
+    def search_movie(self, explicit=True):
+        if self.debounce_id is not None:
+            self.root.after_cancel(self.debounce_id)
+            self.debounce_id = None
+        self.search_generation += 1
         self.progress.start()
-        close_matches = difflib.get_close_matches(search_term, movies_data.keys(), n=10, cutoff=0.1)
+        self.search_requests.put((self.search_generation, self.search_var.get(), explicit))
+
+    def search_worker(self):
+        while True:
+            request = self.search_requests.get()
+            # Skip straight to the newest query if more keystrokes arrived meanwhile
+            while not self.search_requests.empty():
+                request = self.search_requests.get_nowait()
+            generation, search_term, explicit = request
+            if generation != self.search_generation:
+                continue
+            close_matches = self.searcher.search(search_term)
+            self.search_results.put((generation, close_matches, explicit))
+
+    def poll_search_results(self):
+        while not self.search_results.empty():
+            generation, close_matches, explicit = self.search_results.get_nowait()
+            if generation == self.search_generation:
+                self.show_search_results(close_matches, explicit)
+        self.root.after(POLL_MS, self.poll_search_results)
+
+    def show_search_results(self, close_matches, explicit):
         self.progress.stop()
-
         self.result_listbox.delete(0, tk.END)
         for movie in close_matches:
             self.result_listbox.insert(tk.END, movie)
 
-        if not close_matches:
+        if not close_matches and explicit:
             messagebox.showinfo("No Match Found", "No movies matched your search criteria.")
 
+    def recommend_for_user(self):
+        if self.user_model is None:
+            messagebox.showinfo("Recommendations", self.user_model_error or "Still learning from the ratings, try again soon.")
+            return
+        try:
+            user_id = int(self.user_var.get())
+        except ValueError:
+            messagebox.showerror("Recommendations", "Please enter a numeric user id.")
+            return
+        try:
+            items, _ = self.user_model.recommend([user_id], n=10)
+        except OverflowError:
+            # Ids are 64-bit, anything longer can't be a user
+            messagebox.showerror("Recommendations", f"User id {user_id} is out of range.")
+            return
+        rows = catalog.rows_for(items[0][items[0] >= 0])
+        # Drop any pending search so its results don't replace these
+        self.search_generation += 1
+        self.progress.stop()
+        self.result_listbox.delete(0, tk.END)
+        for row in rows[rows >= 0]:
+            self.result_listbox.insert(tk.END, catalog.titles[row])
+        if not len(rows):
+            messagebox.showinfo("Recommendations", f"No ratings from user {user_id}.")
+
     def show_movie_details(self, event):
-        selected_movie = self.result_listbox.get(self.result_listbox.curselection())
-        details = movies_data[selected_movie]
-        details_text = f"Title: {selected_movie}\nGenres: {details['genres']}"
+        selection = self.result_listbox.curselection()
+        if not selection:
+            return
+        selected_movie = self.result_listbox.get(selection)
+        genres = ', '.join(catalog.genres(catalog.find(selected_movie)))
+        details_text = f"Title: {selected_movie}\nGenres: {genres}"
+        similar = recommender.similar(selected_movie, 5)
+        if similar:
+            details_text += "\nYou might also like: " + ", ".join(title for title, _ in similar)
         self.details_label.config(text=details_text)
 
 if __name__ == "__main__":
@@ -1,5 +1,6 @@
 import kivy
 from kivy.app import App
+from kivy.clock import Clock
 from kivy.uix.gridlayout import GridLayout
 from kivy.uix.button import Button
 from kivy.uix.label import Label
@@ -8,120 +9,63 @@ from kivy.uix.boxlayout import BoxLayout
 from kivy.uix.screenmanager import ScreenManager, Screen
 from kivy.uix.floatlayout import FloatLayout
 from kivy.uix.textinput import TextInput
-import sqlite3
+from kivy.uix.togglebutton import ToggleButton
+from user_store import default_store
+import threading
+from concurrent.futures import ThreadPoolExecutor
+from tic_tac_toe_engine import GameState, BoardVariant, CLASSIC, check_winner, minimax, random_move, ai_move, choose_move, use_opening_book, use_parallel_search, stop_parallel_search
+from tic_tac_toe_book import load_book
 
 kivy.require('2.0.0')
 
-def check_winner(board):
-    for i in range(3):
-        if board[i][0] == board[i][1] == board[i][2] != " ":
-            return board[i][0]
-        if board[0][i] == board[1][i] == board[2][i] != " ":
-            return board[0][i]
-    if board[0][0] == board[1][1] == board[2][2] != " ":
-        return board[0][0]
-    if board[0][2] == board[1][1] == board[2][0] != " ":
-        return board[0][2]
-    if all(board[i][j] != " " for i in range(3) for j in range(3)):
-        return "Draw"
-    return None
-
-def minimax(board, depth, is_maximizing, alpha, beta):
-    winner = check_winner(board)
-    if winner == "X":
-        return -1
-    elif winner == "O":
-        return 1
-    elif winner == "Draw":
-        return 0
-
-    if is_maximizing:
-        max_eval = -float('inf')
-        for i in range(3):
-            for j in range(3):
-                if board[i][j] == " ":
-                    board[i][j] = "O"
-                    eval = minimax(board, depth + 1, False, alpha, beta)
-                    board[i][j] = " "
-                    max_eval = max(max_eval, eval)
-                    alpha = max(alpha, eval)
-                    if beta <= alpha:
-                        break
-        return max_eval
-    else:
-        min_eval = float('inf')
-        for i in range(3):
-            for j in range(3):
-                if board[i][j] == " ":
-                    board[i][j] = "X"
-                    eval = minimax(board, depth + 1, True, alpha, beta)
-                    board[i][j] = " "
-                    min_eval = min(min_eval, eval)
-                    beta = min(beta, eval)
-                    if beta <= alpha:
-                        break
-        return min_eval
-
-def random_move(board):
-    from random import choice
-    empty_cells = [(i, j) for i in range(3) for j in range(3) if board[i][j] == " "]
-    move = choice(empty_cells)
-    board[move[0]][move[1]] = "O"
-
-def ai_move(board, difficulty):
-    if difficulty == "easy":
-        random_move(board)
-    elif difficulty == "medium":
-        if board[1][1] == " ":
-            board[1][1] = "O"
-        else:
-            random_move(board)
-    elif difficulty == "hard":
-        best_score = -float('inf')
-        move = None
-        for i in range(3):
-            for j in range(3):
-                if board[i][j] == " ":
-                    board[i][j] = "O"
-                    score = minimax(board, 0, False, -float('inf'), float('inf'))
-                    board[i][j] = " "
-                    if score > best_score:
-                        best_score = score
-                        move = (i, j)
-        board[move[0]][move[1]] = "O"
+# Runs the AI search on a worker thread and hands the chosen cell back on the Kivy main thread
+class AIMoveService:
+    def __init__(self, max_workers=1):
+        self.executor = ThreadPoolExecutor(max_workers=max_workers, thread_name_prefix='ai-move')
+        self.pending = None
+
+    def request_move(self, state, difficulty, callback):
+        self.cancel()
+        cancel_event = threading.Event()
+        future = self.executor.submit(choose_move, state.copy(), difficulty, None, cancel_event)
+        self.pending = (future, cancel_event)
+        future.add_done_callback(
+            lambda done: Clock.schedule_once(lambda dt: self.deliver(done, cancel_event, callback))
+        )
+
+    def deliver(self, future, cancel_event, callback):
+        if cancel_event.is_set() or future.cancelled():
+            return
+        if self.pending is not None and self.pending[0] is future:
+            self.pending = None
+        callback(future.result())
+
+    def cancel(self):
+        if self.pending is not None:
+            future, cancel_event = self.pending
+            cancel_event.set()
+            future.cancel()
+            self.pending = None
+
+    @property
+    def busy(self):
+        return self.pending is not None
+
+    def shutdown(self):
+        self.cancel()
+        self.executor.shutdown(wait=False)
+
+# Board variants offered on the dashboard: (label, board size, marks in a row to win)
+VARIANTS = (("3x3", 3, 3), ("4x4", 4, 4), ("5x5 (4 in a row)", 5, 4))
 
 def create_user_table():
-    conn = sqlite3.connect('users.db')
-    c = conn.cursor()
-    c.execute('''
-        CREATE TABLE IF NOT EXISTS users (
-            id INTEGER PRIMARY KEY AUTOINCREMENT,
-            username TEXT UNIQUE NOT NULL,
-            password TEXT NOT NULL
-        )
-    ''')
-    conn.commit()
-    conn.close()
+    default_store.create_table()
 
 def add_user(username, password):
-    conn = sqlite3.connect('users.db')
-    c = conn.cursor()
-    try:
-        c.execute('INSERT INTO users (username, password) VALUES (?, ?)', (username, password))
-        conn.commit()
-    except sqlite3.IntegrityError:
-        return False
-    finally:
-        conn.close()
-    return True
+    return default_store.add_user(username, password)
 
 def authenticate_user(username, password):
-    conn = sqlite3.connect('users.db')
-    c = conn.cursor()
-    c.execute('SELECT * FROM users WHERE username = ? AND password = ?', (username, password))
-    user = c.fetchone()
-    conn.close()
-    return user is not None
+    return default_store.authenticate(username, password)
 
 create_user_table()
 
@@ -173,6 +117,13 @@ class DashboardScreen(Screen):
         super(DashboardScreen, self).__init__(**kwargs)
         layout = FloatLayout()
 
+        self.variant = CLASSIC
+        for index, (label, size, win_length) in enumerate(VARIANTS):
+            toggle = ToggleButton(text=label, group='variant', state='down' if index == 0 else 'normal',
+                                  allow_no_selection=False, size_hint=(.3, .1), pos_hint={'x': .02 + index * .33, 'y': .86})
+            toggle.bind(on_press=lambda instance, size=size, win_length=win_length: self.set_variant(size, win_length))
+            layout.add_widget(toggle)
+
         self.easy_btn = Button(text="Easy", size_hint=(.3, .2), pos_hint={'x': .35, 'y': .6})
         self.medium_btn = Button(text="Medium", size_hint=(.3, .2), pos_hint={'x': .35, 'y': .35})
         self.hard_btn = Button(text="Hard", size_hint=(.3, .2), pos_hint={'x': .35, 'y': .1})
@@ -187,64 +138,99 @@ class DashboardScreen(Screen):
 
         self.add_widget(layout)
 
+    def set_variant(self, size, win_length):
+        self.variant = BoardVariant(size, win_length)
+
     def start_game_easy(self, instance):
-        self.manager.get_screen('game').set_difficulty('easy')
+        self.manager.get_screen('game').set_difficulty('easy', self.variant)
         self.manager.current = 'game'
 
     def start_game_medium(self, instance):
-        self.manager.get_screen('game').set_difficulty('medium')
+        self.manager.get_screen('game').set_difficulty('medium', self.variant)
         self.manager.current = 'game'
 
     def start_game_hard(self, instance):
-        self.manager.get_screen('game').set_difficulty('hard')
+        self.manager.get_screen('game').set_difficulty('hard', self.variant)
         self.manager.current = 'game'
 
 class GameScreen(Screen):
     def __init__(self, **kwargs):
         super(GameScreen, self).__init__(**kwargs)
-        self.board = [[" " for _ in range(3)] for _ in range(3)]
+        self.state = GameState()
+        self.ai_service = AIMoveService()
+        container = BoxLayout(orientation='vertical')
+        self.status_label = Label(text="Your turn", size_hint=(1, 0.1))
+        container.add_widget(self.status_label)
         self.layout = GridLayout(cols=3)
-        self.buttons = [[Button(font_size=32) for _ in range(3)] for _ in range(3)]
-        for i in range(3):
-            for j in range(3):
-                self.buttons[i][j].bind(on_press=self.on_button_press)
-                self.layout.add_widget(self.buttons[i][j])
-        self.add_widget(self.layout)
+        self.buttons = []
+        self.build_buttons()
+        container.add_widget(self.layout)
+        self.add_widget(container)
         self.difficulty = 'hard'  # default difficulty
 
-    def set_difficulty(self, difficulty):
+    @property
+    def board(self):
+        return self.state.to_board()
+
+    def build_buttons(self):
+        variant = self.state.variant
+        self.layout.clear_widgets()
+        self.layout.cols = variant.size
+        self.buttons = [Button(font_size=32 if variant.size <= 3 else 24) for _ in range(variant.cell_count)]
+        for button in self.buttons:
+            button.bind(on_press=self.on_button_press)
+            self.layout.add_widget(button)
+
+    def set_difficulty(self, difficulty, variant=None):
         self.difficulty = difficulty
+        if variant is not None and variant != self.state.variant:
+            self.state = GameState(variant=variant)
+            self.build_buttons()
         self.reset_board()
 
     def reset_board(self):
-        self.board = [[" " for _ in range(3)] for _ in range(3)]
-        for i in range(3):
-            for j in range(3):
-                self.buttons[i][j].text = " "
+        self.ai_service.cancel()
+        self.set_thinking(False)
+        self.state = GameState(variant=self.state.variant)
+        for button in self.buttons:
+            button.text = " "
+
+    def set_thinking(self, thinking):
+        self.status_label.text = "AI is thinking..." if thinking else "Your turn"
+        for button in self.buttons:
+            button.opacity = 0.6 if thinking else 1
 
     def on_button_press(self, instance):
-        for i in range(3):
-            for j in range(3):
-                if self.buttons[i][j] == instance:
-                    if self.board[i][j] == " ":
-                        self.board[i][j] = "X"
-                        self.buttons[i][j].text = "X"
-                        if check_winner(self.board):
-                            self.end_game()
-                            return
-                        ai_move(self.board, self.difficulty)
-                        self.update_board()
-                        if check_winner(self.board):
-                            self.end_game()
-                        return
+        if self.ai_service.busy:
+            return
+        cell = self.buttons.index(instance)
+        if self.state.is_empty(cell):
+            self.state.play(cell, "X")
+            instance.text = "X"
+            if self.state.winner():
+                self.end_game()
+                return
+            self.set_thinking(True)
+            self.ai_service.request_move(self.state, self.difficulty, self.on_ai_move)
+
+    def on_ai_move(self, move):
+        self.set_thinking(False)
+        if move is not None:
+            self.state.play(move, "O")
+        self.update_board()
+        if self.state.winner():
+            self.end_game()
+
+    def on_leave(self, *args):
+        self.ai_service.cancel()
+        self.set_thinking(False)
 
     def update_board(self):
-        for i in range(3):
-            for j in range(3):
-                self.buttons[i][j].text = self.board[i][j]
+        for cell, button in enumerate(self.buttons):
+            button.text = self.state.cell(cell)
 
     def end_game(self):
-        winner = check_winner(self.board)
+        winner = self.state.winner()
         content = BoxLayout(orientation='vertical')
         if winner == "Draw":
             content.add_widget(Label(text="It's a draw!"))
@@ -256,16 +242,24 @@ class GameScreen(Screen):
 
     def restart_game(self, popup):
         popup.dismiss()
+        self.ai_service.cancel()
         self.reset_board()
         self.manager.current = 'dashboard'
 
 class TicTacToeApp(App):
     def build(self):
+        use_opening_book(load_book())
+        # Hard moves on the bigger boards are searched on every core
+        use_parallel_search()
         self.sm = ScreenManager()
         self.sm.add_widget(LoginScreen(name='login'))
         self.sm.add_widget(DashboardScreen(name='dashboard'))
         self.sm.add_widget(GameScreen(name='game'))
         return self.sm
 
+    def on_stop(self):
+        self.sm.get_screen('game').ai_service.shutdown()
+        stop_parallel_search()
+
 if __name__ == '__main__':
     TicTacToeApp().run()
@@ -0,0 +1,125 @@
+import mmap
+import os
+import struct
+import sys
+from array import array
+
+from tic_tac_toe_engine import CELL_BITS, FULL_MASK, winner_bits
+
+BOOK_PATH = 'tic_tac_toe_book.bin'
+BOOK_MAGIC = b'TTT1'
+POSITIONS = 3 ** 9
+
+# Every entry is a little-endian uint16:
+#   bit 15      entry is a reachable position
+#   bits 9-10   game value + 1 (O wins = 2, draw = 1, X wins = 0)
+#   bits 0-8    mask of optimal cells for the side to move
+KNOWN_FLAG = 1 << 15
+VALUE_SHIFT = 9
+MOVES_MASK = FULL_MASK
+
+# Base-3 index of a position is BASE3[x] + 2 * BASE3[o]
+BASE3 = tuple(sum(3 ** cell for cell in range(9) if mask & CELL_BITS[cell]) for mask in range(FULL_MASK + 1))
+
+
+def position_index(x, o):
+    return BASE3[x] + 2 * BASE3[o]
+
+
+def o_to_move(x, o):
+    return bin(x).count('1') > bin(o).count('1')
+
+
+def solve(x, o, entries):
+    index = position_index(x, o)
+    entry = entries[index]
+    if entry:
+        return ((entry >> VALUE_SHIFT) & 3) - 1
+
+    winner = winner_bits(x, o)
+    if winner is not None:
+        value = {'X': -1, 'O': 1, 'Draw': 0}[winner]
+        entries[index] = KNOWN_FLAG | ((value + 1) << VALUE_SHIFT)
+        return value
+
+    is_maximizing = o_to_move(x, o)
+    occupied = x | o
+    scores = {}
+    for cell in range(9):
+        bit = CELL_BITS[cell]
+        if not occupied & bit:
+            if is_maximizing:
+                scores[cell] = solve(x, o | bit, entries)
+            else:
+                scores[cell] = solve(x | bit, o, entries)
+    value = max(scores.values()) if is_maximizing else min(scores.values())
+    moves = 0
+    for cell, score in scores.items():
+        if score == value:
+            moves |= CELL_BITS[cell]
+    entries[index] = KNOWN_FLAG | ((value + 1) << VALUE_SHIFT) | moves
+    return value
+
+
+# Function to solve every position reachable from the empty board (X moves first)
+def build_book(path=BOOK_PATH):
+    entries = array('H', bytes(2 * POSITIONS))
+    solve(0, 0, entries)
+    if sys.byteorder != 'little':
+        entries.byteswap()
+    with open(path, 'wb') as file:
+        file.write(BOOK_MAGIC)
+        entries.tofile(file)
+    return sum(1 for entry in entries if entry)
+
+
+class OpeningBook:
+    def __init__(self, path=BOOK_PATH):
+        self.file = open(path, 'rb')
+        try:
+            self.data = mmap.mmap(self.file.fileno(), 0, access=mmap.ACCESS_READ)
+        except ValueError:
+            self.file.close()
+            raise
+        if self.data[:len(BOOK_MAGIC)] != BOOK_MAGIC or len(self.data) != len(BOOK_MAGIC) + 2 * POSITIONS:
+            self.close()
+            raise ValueError(f"{path} is not a tic-tac-toe opening book")
+
+    def entry(self, x, o):
+        return struct.unpack_from('<H', self.data, len(BOOK_MAGIC) + 2 * position_index(x, o))[0]
+
+    def lookup(self, x, o):
+        entry = self.entry(x, o)
+        if not entry & KNOWN_FLAG:
+            return None
+        value = ((entry >> VALUE_SHIFT) & 3) - 1
+        moves = [cell for cell in range(9) if entry & CELL_BITS[cell]]
+        return value, moves
+
+    def best_move(self, x, o):
+        entry = self.entry(x, o)
+        moves = entry & MOVES_MASK
+        if not entry & KNOWN_FLAG or not moves:
+            return None
+        # Lowest optimal cell, the same choice the minimax search makes
+        return (moves & -moves).bit_length() - 1
+
+    def close(self):
+        self.data.close()
+        self.file.close()
+
+
+# Function to memory-map the opening book, returns None when it has not been built
+def load_book(path=BOOK_PATH):
+    if not os.path.exists(path):
+        return None
+    try:
+        return OpeningBook(path)
+    except (OSError, ValueError):
+        return None
+
+
+if __name__ == '__main__':
+    path = sys.argv[1] if len(sys.argv) > 1 else BOOK_PATH
+    count = build_book(path)
+    print(f"Wrote {count} positions to {path}")
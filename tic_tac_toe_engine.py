@@ -0,0 +1,754 @@
+import os
+import time
+from collections import OrderedDict
+from concurrent.futures import ProcessPoolExecutor, wait
+from random import choice
+
+# Cells are numbered row by row, cell i*3+j is bit (i*3+j) of a player's mask
+WIN_MASKS = (
+    0b000000111, 0b000111000, 0b111000000,  # rows
+    0b001001001, 0b010010010, 0b100100100,  # columns
+    0b100010001, 0b001010100,               # diagonals
+)
+FULL_MASK = 0b111111111
+CELL_BITS = tuple(1 << cell for cell in range(9))
+
+
+def has_won(mask):
+    for line in WIN_MASKS:
+        if mask & line == line:
+            return True
+    return False
+
+
+# Precompute the win test for every possible player mask so it is a single lookup
+WINNING = tuple(has_won(mask) for mask in range(FULL_MASK + 1))
+
+# The 8 rotations/reflections of the board, as "new cell -> old cell" maps
+SYMMETRIES = (
+    (0, 1, 2, 3, 4, 5, 6, 7, 8),  # identity
+    (6, 3, 0, 7, 4, 1, 8, 5, 2),  # rotate 90
+    (8, 7, 6, 5, 4, 3, 2, 1, 0),  # rotate 180
+    (2, 5, 8, 1, 4, 7, 0, 3, 6),  # rotate 270
+    (2, 1, 0, 5, 4, 3, 8, 7, 6),  # mirror left-right
+    (6, 7, 8, 3, 4, 5, 0, 1, 2),  # mirror top-bottom
+    (0, 3, 6, 1, 4, 7, 2, 5, 8),  # main diagonal
+    (8, 5, 2, 7, 4, 1, 6, 3, 0),  # anti diagonal
+)
+
+
+def permute_mask(mask, symmetry):
+    result = 0
+    for new_cell, old_cell in enumerate(symmetry):
+        if mask & CELL_BITS[old_cell]:
+            result |= CELL_BITS[new_cell]
+    return result
+
+
+SYMMETRY_TABLES = tuple(
+    tuple(permute_mask(mask, symmetry) for mask in range(FULL_MASK + 1))
+    for symmetry in SYMMETRIES
+)
+
+
+# Function to get the same key for every position that is a rotation/reflection of another
+def canonical_key(x, o, is_maximizing):
+    key = min(table[x] | (table[o] << 9) for table in SYMMETRY_TABLES)
+    if is_maximizing:
+        key |= 1 << 18
+    return key
+
+
+# Bound types stored in the transposition table
+EXACT = 0
+LOWER = 1
+UPPER = 2
+
+
+class TranspositionTable:
+    def __init__(self, max_size=65536):
+        self.max_size = max_size
+        self.entries = OrderedDict()
+        self.hits = 0
+        self.misses = 0
+
+    def __len__(self):
+        return len(self.entries)
+
+    def get(self, key):
+        entry = self.entries.get(key)
+        if entry is None:
+            self.misses += 1
+            return None
+        self.hits += 1
+        self.entries.move_to_end(key)
+        return entry
+
+    def store(self, key, value, flag):
+        self.entries[key] = (value, flag)
+        self.entries.move_to_end(key)
+        # Evict the least recently used positions once the table is full
+        while len(self.entries) > self.max_size:
+            self.entries.popitem(last=False)
+
+    def clear(self):
+        self.entries.clear()
+        self.hits = 0
+        self.misses = 0
+
+    def stats(self):
+        lookups = self.hits + self.misses
+        return {
+            'size': len(self.entries),
+            'hits': self.hits,
+            'misses': self.misses,
+            'hit_rate': self.hits / lookups if lookups else 0.0,
+        }
+
+
+# Shared by every game in the process so positions solved once are never searched again
+default_table = TranspositionTable()
+
+# Running count of positions searched by the hard AI, read by the self-play benchmarks
+search_stats = {'nodes': 0}
+
+
+def winning_masks(size, win_length):
+    masks = []
+    directions = ((0, 1), (1, 0), (1, 1), (1, -1))
+    for i in range(size):
+        for j in range(size):
+            for di, dj in directions:
+                end_i = i + di * (win_length - 1)
+                end_j = j + dj * (win_length - 1)
+                if 0 <= end_i < size and 0 <= end_j < size:
+                    mask = 0
+                    for step in range(win_length):
+                        mask |= 1 << ((i + di * step) * size + j + dj * step)
+                    masks.append(mask)
+    return tuple(masks)
+
+
+class BoardVariant:
+    def __init__(self, size=3, win_length=3):
+        if not 1 <= win_length <= size:
+            raise ValueError("win_length must be between 1 and the board size")
+        self.size = size
+        self.win_length = win_length
+        self.cell_count = size * size
+        self.cell_bits = tuple(1 << cell for cell in range(self.cell_count))
+        self.full_mask = (1 << self.cell_count) - 1
+        self.masks = winning_masks(size, win_length)
+        # Only the lines through the last move can have been completed by it
+        self.cell_masks = tuple(
+            tuple(mask for mask in self.masks if mask & bit) for bit in self.cell_bits
+        )
+        middle = (size - 1) / 2
+        self.center_order = tuple(sorted(
+            range(self.cell_count),
+            key=lambda cell: (abs(cell // size - middle) + abs(cell % size - middle), cell),
+        ))
+        self.is_classic = size == 3 and win_length == 3
+
+    def __eq__(self, other):
+        return isinstance(other, BoardVariant) and (self.size, self.win_length) == (other.size, other.win_length)
+
+    def __hash__(self):
+        return hash((self.size, self.win_length))
+
+    def __repr__(self):
+        return f"BoardVariant({self.size}, {self.win_length})"
+
+    def has_won(self, mask):
+        if self.is_classic:
+            return WINNING[mask]
+        for line in self.masks:
+            if mask & line == line:
+                return True
+        return False
+
+    def won_with(self, mask, cell):
+        for line in self.cell_masks[cell]:
+            if mask & line == line:
+                return True
+        return False
+
+    def winner(self, x, o):
+        if self.has_won(x):
+            return "X"
+        if self.has_won(o):
+            return "O"
+        if x | o == self.full_mask:
+            return "Draw"
+        return None
+
+
+CLASSIC = BoardVariant(3, 3)
+
+
+class GameState:
+    __slots__ = ('x', 'o', 'variant')
+
+    def __init__(self, x=0, o=0, variant=CLASSIC):
+        self.x = x
+        self.o = o
+        self.variant = variant
+
+    @classmethod
+    def from_board(cls, board):
+        size = len(board)
+        # Bigger list boards default to the 4-in-a-row variants offered in the app
+        variant = CLASSIC if size == 3 else BoardVariant(size, min(size, 4))
+        return cls.from_board_variant(board, variant)
+
+    @classmethod
+    def from_board_variant(cls, board, variant):
+        size = variant.size
+        x = o = 0
+        for i in range(size):
+            for j in range(size):
+                if board[i][j] == "X":
+                    x |= 1 << (i * size + j)
+                elif board[i][j] == "O":
+                    o |= 1 << (i * size + j)
+        return cls(x, o, variant)
+
+    def to_board(self):
+        size = self.variant.size
+        return [[self.cell(i * size + j) for j in range(size)] for i in range(size)]
+
+    def copy(self):
+        return GameState(self.x, self.o, self.variant)
+
+    def cell(self, cell):
+        if self.x >> cell & 1:
+            return "X"
+        if self.o >> cell & 1:
+            return "O"
+        return " "
+
+    def is_empty(self, cell):
+        return not (self.x | self.o) >> cell & 1
+
+    def empty_cells(self):
+        occupied = self.x | self.o
+        return [cell for cell in range(self.variant.cell_count) if not occupied >> cell & 1]
+
+    def play(self, cell, player):
+        if player == "X":
+            self.x |= 1 << cell
+        else:
+            self.o |= 1 << cell
+
+    def undo(self, cell):
+        self.x &= ~(1 << cell)
+        self.o &= ~(1 << cell)
+
+    def winner(self):
+        return self.variant.winner(self.x, self.o)
+
+
+def winner_bits(x, o):
+    if WINNING[x]:
+        return "X"
+    if WINNING[o]:
+        return "O"
+    if x | o == FULL_MASK:
+        return "Draw"
+    return None
+
+
+# Scores for the depth-limited search; wins are offset by ply so faster wins score higher
+WIN_SCORE = 1000000
+LINE_WEIGHTS = (0, 1, 10, 100, 1000, 10000, 100000)
+
+
+class SearchTimeout(Exception):
+    pass
+
+
+# Function to order the root moves: the previous depth's best first, then center-first. Both searchers
+# keep the first move with the best score in this order, so they pick the same move on ties.
+def root_moves(variant, occupied, first=None):
+    moves = [cell for cell in variant.center_order if not occupied >> cell & 1]
+    if first in moves:
+        moves.remove(first)
+        moves.insert(0, first)
+    return moves
+
+
+# Function to score a non-terminal position from O's point of view by its open lines
+def evaluate(x, o, variant):
+    score = 0
+    for line in variant.masks:
+        o_count = bin(o & line).count('1')
+        x_count = bin(x & line).count('1')
+        if x_count == 0:
+            score += LINE_WEIGHTS[min(o_count, 6)]
+        elif o_count == 0:
+            score -= LINE_WEIGHTS[min(x_count, 6)]
+    return score
+
+
+class Searcher:
+    def __init__(self, variant=CLASSIC, time_budget=1.0, max_depth=None, cancel_event=None):
+        self.variant = variant
+        self.time_budget = time_budget
+        self.cancel_event = cancel_event
+        self.max_depth = max_depth if max_depth is not None else variant.cell_count
+        self.killers = []
+        self.history = [0] * variant.cell_count
+        self.nodes = 0
+        self.depth_reached = 0
+        self.deadline = None
+
+    def ordered_moves(self, occupied, ply, first=None):
+        killers = self.killers[ply] if ply < len(self.killers) else ()
+        history = self.history
+        moves = [cell for cell in self.variant.center_order if not occupied >> cell & 1]
+        # Stable sort keeps the center-first order among moves with equal history
+        moves.sort(key=lambda cell: -history[cell])
+        front = [cell for cell in (first,) + tuple(killers) if cell is not None and cell in moves]
+        if front:
+            seen = set()
+            front = [cell for cell in front if not (cell in seen or seen.add(cell))]
+            moves = front + [cell for cell in moves if cell not in seen]
+        return moves
+
+    def store_killer(self, ply, cell):
+        while len(self.killers) <= ply:
+            self.killers.append([])
+        killers = self.killers[ply]
+        if cell not in killers:
+            killers.insert(0, cell)
+            del killers[2:]
+
+    def alphabeta(self, x, o, depth, ply, is_maximizing, alpha, beta, last_cell=None):
+        self.nodes += 1
+        if self.nodes & 1023 == 0:
+            if self.deadline is not None and time.perf_counter() > self.deadline:
+                raise SearchTimeout()
+            if self.cancel_event is not None and self.cancel_event.is_set():
+                raise SearchTimeout()
+
+        variant = self.variant
+        if last_cell is None:
+            if variant.has_won(o):
+                return WIN_SCORE - ply
+            if variant.has_won(x):
+                return -(WIN_SCORE - ply)
+        elif not is_maximizing and variant.won_with(o, last_cell):
+            return WIN_SCORE - ply
+        elif is_maximizing and variant.won_with(x, last_cell):
+            return -(WIN_SCORE - ply)
+        occupied = x | o
+        if occupied == variant.full_mask:
+            return 0
+        if depth <= 0:
+            return evaluate(x, o, variant)
+
+        if is_maximizing:
+            best = -float('inf')
+            for cell in self.ordered_moves(occupied, ply):
+                eval = self.alphabeta(x, o | 1 << cell, depth - 1, ply + 1, False, alpha, beta, cell)
+                if eval > best:
+                    best = eval
+                if eval > alpha:
+                    alpha = eval
+                if beta <= alpha:
+                    self.store_killer(ply, cell)
+                    self.history[cell] += depth * depth
+                    break
+        else:
+            best = float('inf')
+            for cell in self.ordered_moves(occupied, ply):
+                eval = self.alphabeta(x | 1 << cell, o, depth - 1, ply + 1, True, alpha, beta, cell)
+                if eval < best:
+                    best = eval
+                if eval < beta:
+                    beta = eval
+                if beta <= alpha:
+                    self.store_killer(ply, cell)
+                    self.history[cell] += depth * depth
+                    break
+        return best
+
+    def search_root(self, x, o, depth, is_maximizing, first=None):
+        best_score = -float('inf') if is_maximizing else float('inf')
+        move = None
+        alpha, beta = -float('inf'), float('inf')
+        for cell in root_moves(self.variant, x | o, first):
+            if is_maximizing:
+                score = self.alphabeta(x, o | 1 << cell, depth - 1, 1, False, alpha, beta, cell)
+                if score > best_score:
+                    best_score, move = score, cell
+                alpha = max(alpha, score)
+            else:
+                score = self.alphabeta(x | 1 << cell, o, depth - 1, 1, True, alpha, beta, cell)
+                if score < best_score:
+                    best_score, move = score, cell
+                beta = min(beta, score)
+        return move, best_score
+
+    # Function to deepen one ply at a time until the time budget or max depth runs out
+    def search(self, x, o, is_maximizing=True):
+        self.nodes = 0
+        self.depth_reached = 0
+        self.deadline = time.perf_counter() + self.time_budget if self.time_budget else None
+        empty = self.variant.cell_count - bin(x | o).count('1')
+        move = None
+        score = 0
+        for depth in range(1, min(self.max_depth, empty) + 1):
+            try:
+                move, score = self.search_root(x, o, depth, is_maximizing, move)
+            except SearchTimeout:
+                break
+            self.depth_reached = depth
+            if abs(score) >= WIN_SCORE - self.variant.cell_count:
+                break
+        if move is None:
+            move = self.ordered_moves(x | o, 0)[0]
+        return move, score
+
+
+def minimax_bits(x, o, depth, is_maximizing, alpha, beta):
+    if WINNING[x]:
+        return -1
+    if WINNING[o]:
+        return 1
+    occupied = x | o
+    if occupied == FULL_MASK:
+        return 0
+
+    if is_maximizing:
+        max_eval = -2
+        for bit in CELL_BITS:
+            if not occupied & bit:
+                eval = minimax_bits(x, o | bit, depth + 1, False, alpha, beta)
+                if eval > max_eval:
+                    max_eval = eval
+                if eval > alpha:
+                    alpha = eval
+                if beta <= alpha:
+                    break
+        return max_eval
+    else:
+        min_eval = 2
+        for bit in CELL_BITS:
+            if not occupied & bit:
+                eval = minimax_bits(x | bit, o, depth + 1, True, alpha, beta)
+                if eval < min_eval:
+                    min_eval = eval
+                if eval < beta:
+                    beta = eval
+                if beta <= alpha:
+                    break
+        return min_eval
+
+
+def minimax_tt(x, o, depth, is_maximizing, alpha, beta, table):
+    if WINNING[x]:
+        return -1
+    if WINNING[o]:
+        return 1
+    occupied = x | o
+    if occupied == FULL_MASK:
+        return 0
+
+    key = canonical_key(x, o, is_maximizing)
+    entry = table.get(key)
+    if entry is not None:
+        value, flag = entry
+        if flag == EXACT:
+            return value
+        if flag == LOWER and value > alpha:
+            alpha = value
+        elif flag == UPPER and value < beta:
+            beta = value
+        if beta <= alpha:
+            return value
+    alpha_orig, beta_orig = alpha, beta
+
+    if is_maximizing:
+        best = -2
+        for bit in CELL_BITS:
+            if not occupied & bit:
+                eval = minimax_tt(x, o | bit, depth + 1, False, alpha, beta, table)
+                if eval > best:
+                    best = eval
+                if eval > alpha:
+                    alpha = eval
+                if beta <= alpha:
+                    break
+    else:
+        best = 2
+        for bit in CELL_BITS:
+            if not occupied & bit:
+                eval = minimax_tt(x | bit, o, depth + 1, True, alpha, beta, table)
+                if eval < best:
+                    best = eval
+                if eval < beta:
+                    beta = eval
+                if beta <= alpha:
+                    break
+
+    if best <= alpha_orig:
+        flag = UPPER
+    elif best >= beta_orig:
+        flag = LOWER
+    else:
+        flag = EXACT
+    table.store(key, best, flag)
+    return best
+
+
+def best_move(state, table=None, player="O"):
+    if table is None:
+        table = default_table
+    lookups = table.hits + table.misses
+    best_score = -float('inf') if player == "O" else float('inf')
+    move = None
+    for cell in state.empty_cells():
+        if player == "O":
+            score = minimax_tt(state.x, state.o | CELL_BITS[cell], 0, False, -float('inf'), float('inf'), table)
+            better = score > best_score
+        else:
+            score = minimax_tt(state.x | CELL_BITS[cell], state.o, 0, True, -float('inf'), float('inf'), table)
+            better = score < best_score
+        if better:
+            best_score = score
+            move = cell
+    # Every non-terminal node probes the table exactly once
+    search_stats['nodes'] += table.hits + table.misses - lookups
+    return move
+
+
+# Solved positions memory-mapped by tic_tac_toe_book.load_book, None means search instead
+opening_book = None
+
+
+def use_opening_book(book):
+    global opening_book
+    opening_book = book
+
+
+# Function run in a worker process: the depth-limited value of one root move, exact when it falls
+# inside the alpha..beta window
+def score_root_move(size, win_length, x, o, cell, depth, is_maximizing, alpha=-float('inf'), beta=float('inf'),
+                    deadline=None, cancel_event=None):
+    searcher = Searcher(BoardVariant(size, win_length), time_budget=None, cancel_event=cancel_event)
+    if deadline is not None:
+        # Wall-clock deadline, the monotonic clocks of different processes are not comparable
+        searcher.deadline = time.perf_counter() + deadline - time.time()
+    try:
+        if is_maximizing:
+            value = searcher.alphabeta(x, o | 1 << cell, depth - 1, 1, False, alpha, beta, cell)
+        else:
+            value = searcher.alphabeta(x | 1 << cell, o, depth - 1, 1, True, alpha, beta, cell)
+    except SearchTimeout:
+        return None, searcher.nodes
+    return value, searcher.nodes
+
+
+# How often a waiting parallel search checks its cancel event, in seconds
+CANCEL_POLL = 0.02
+
+
+class ParallelSearcher:
+    def __init__(self, variant=CLASSIC, workers=None, executor=None, cancel_event=None):
+        self.variant = variant
+        self.workers = workers or os.cpu_count() or 1
+        self.executor = executor
+        self.cancel_event = cancel_event
+        self.nodes = 0
+        self.depth_reached = 0
+
+    def cancelled(self):
+        return self.cancel_event is not None and self.cancel_event.is_set()
+
+    # Function to score root moves on the pool, (None, nodes) for any cut off by the deadline or a cancel
+    def score_moves(self, executor, x, o, moves, depth, is_maximizing, alpha, beta, deadline):
+        args = (self.variant.size, self.variant.win_length, x, o)
+        if executor is None:
+            results = []
+            for cell in moves:
+                results.append(score_root_move(*args, cell, depth, is_maximizing, alpha, beta, deadline,
+                                               self.cancel_event))
+            return results
+        futures = [executor.submit(score_root_move, *args, cell, depth, is_maximizing, alpha, beta, deadline)
+                   for cell in moves]
+        pending = set(futures)
+        while pending and not self.cancelled():
+            timeout = CANCEL_POLL
+            if deadline is not None:
+                remaining = deadline - time.time() + 0.1
+                if remaining <= 0:
+                    break
+                timeout = min(timeout, remaining)
+            _, pending = wait(pending, timeout=timeout)
+        for future in pending:
+            future.cancel()
+        return [future.result() if future.done() and not future.cancelled() else (None, 0) for future in futures]
+
+    # Function to search one depth, split across processes. The first move (the previous depth's best) is
+    # searched alone with a full window; the rest only need to show whether they beat its score, so they
+    # run in parallel with the window narrowed to that, the same cut the serial root loop makes.
+    def search_depth(self, x, o, depth, is_maximizing, deadline=None, first=None):
+        moves = root_moves(self.variant, x | o, first)
+        executor = None
+        if self.workers > 1 or self.executor is not None:
+            executor = self.executor or ProcessPoolExecutor(max_workers=self.workers)
+        try:
+            results = self.score_moves(executor, x, o, moves[:1], depth, is_maximizing,
+                                       -float('inf'), float('inf'), deadline)
+            value = results[0][0]
+            if value is not None and len(moves) > 1:
+                alpha, beta = (value, float('inf')) if is_maximizing else (-float('inf'), value)
+                results += self.score_moves(executor, x, o, moves[1:], depth, is_maximizing, alpha, beta, deadline)
+        finally:
+            if executor is not None and self.executor is None:
+                executor.shutdown(wait=False, cancel_futures=True)
+        self.nodes += sum(nodes for _, nodes in results)
+        if len(results) < len(moves) or any(value is None for value, _ in results):
+            return None
+        # Moves that only tie (or fail low against) the first score no better than it and are never picked;
+        # among those that beat it, the earliest best wins, as in Searcher.search_root
+        best_move, best_score = None, None
+        for cell, (value, _) in zip(moves, results):
+            if best_score is None or (value > best_score if is_maximizing else value < best_score):
+                best_move, best_score = cell, value
+        return best_move, best_score
+
+    def search(self, x, o, is_maximizing=True, depth=None, time_budget=None):
+        self.nodes = 0
+        self.depth_reached = 0
+        deadline = time.time() + time_budget if time_budget else None
+        empty = self.variant.cell_count - bin(x | o).count('1')
+        max_depth = empty if depth is None else min(depth, empty)
+        # Deepens one ply at a time like Searcher.search, so a fixed depth gives the same move and score
+        result = None
+        for current in range(1, max_depth + 1):
+            found = self.search_depth(x, o, current, is_maximizing, deadline, result[0] if result else None)
+            if found is None:
+                break
+            result = found
+            self.depth_reached = current
+            if abs(result[1]) >= WIN_SCORE - self.variant.cell_count:
+                break
+            if deadline is not None and time.time() >= deadline:
+                break
+        if result is None:
+            result = (root_moves(self.variant, x | o)[0], 0)
+        return result
+
+
+# Process pool shared by the hard AI on big boards, set up by use_parallel_search
+parallel_executor = None
+parallel_workers = 1
+
+
+def use_parallel_search(workers=None):
+    global parallel_executor, parallel_workers
+    stop_parallel_search()
+    parallel_workers = workers or os.cpu_count() or 1
+    if parallel_workers > 1:
+        parallel_executor = ProcessPoolExecutor(max_workers=parallel_workers)
+
+
+def stop_parallel_search():
+    global parallel_executor, parallel_workers
+    if parallel_executor is not None:
+        parallel_executor.shutdown(wait=False, cancel_futures=True)
+        parallel_executor = None
+    parallel_workers = 1
+
+
+# Per-move time budget for the searches on boards bigger than 3x3
+TIME_BUDGET = 1.0
+
+
+def choose_move(state, difficulty, time_budget=None, cancel_event=None, player="O"):
+    variant = state.variant
+    if difficulty == "easy":
+        return choice(state.empty_cells())
+    elif difficulty == "medium":
+        for cell in variant.center_order[:4 if variant.size % 2 == 0 else 1]:
+            if state.is_empty(cell):
+                return cell
+        return choice(state.empty_cells())
+    elif difficulty == "hard":
+        if not variant.is_classic and parallel_executor is not None:
+            searcher = ParallelSearcher(variant, parallel_workers, parallel_executor, cancel_event)
+            move = searcher.search(state.x, state.o, player == "O",
+                                   time_budget=time_budget if time_budget is not None else TIME_BUDGET)[0]
+            search_stats['nodes'] += searcher.nodes
+            return move
+        if not variant.is_classic:
+            searcher = Searcher(variant, time_budget if time_budget is not None else TIME_BUDGET,
+                                cancel_event=cancel_event)
+            move = searcher.search(state.x, state.o, player == "O")[0]
+            search_stats['nodes'] += searcher.nodes
+            return move
+        if opening_book is not None:
+            move = opening_book.best_move(state.x, state.o)
+            if move is not None:
+                return move
+        return best_move(state, player=player)
+
+
+# Function to play the AI's move as "O" on the game state, returns the chosen cell
+def ai_move_state(state, difficulty, time_budget=None):
+    move = choose_move(state, difficulty, time_budget)
+    if move is not None:
+        state.play(move, "O")
+    return move
+
+
+# List-of-lists board helpers, kept for callers that still pass board[i][j] grids
+def check_winner(board):
+    return GameState.from_board(board).winner()
+
+
+# Function to score a board like the original minimax: 1 if O wins, -1 if X wins, 0 for a draw. With
+# max_depth, positions still undecided max_depth plies from the root also score 0.
+# Function to score a list board on the -1/0/1 scale. depth is the number of plies already played, as the
+# recursive callers thread it; max_depth is the ply the search stops at, so max_depth - depth plies are
+# looked at. A 3x3 board without max_depth is solved exactly. Anything else is deepened one ply at a time
+# up to that limit (or the end of the game) and stops after TIME_BUDGET, with the deepest finished score.
+def minimax(board, depth, is_maximizing, alpha, beta, max_depth=None):
+    state = GameState.from_board(board)
+    if max_depth is None and state.variant.is_classic:
+        return minimax_bits(state.x, state.o, depth, is_maximizing, alpha, beta)
+    # The window is on the -1/0/1 scale, so the Searcher gets a full one and its score is mapped back
+    variant = state.variant
+    searcher = Searcher(variant, time_budget=TIME_BUDGET)
+    searcher.deadline = time.perf_counter() + TIME_BUDGET
+    limit = variant.cell_count if max_depth is None else max(max_depth - depth, 0)
+    empty = variant.cell_count - bin(state.x | state.o).count('1')
+    score = 0
+    for remaining in range(min(limit, empty) + 1):
+        try:
+            score = searcher.alphabeta(state.x, state.o, remaining, depth, is_maximizing,
+                                       -float('inf'), float('inf'))
+        except SearchTimeout:
+            break
+        if abs(score) >= WIN_SCORE - variant.cell_count:
+            break
+    if score >= WIN_SCORE - state.variant.cell_count:
+        return 1
+    if score <= -(WIN_SCORE - state.variant.cell_count):
+        return -1
+    return 0
+
+
+def random_move(board):
+    state = GameState.from_board(board)
+    move = choice(state.empty_cells())
+    board[move // len(board)][move % len(board)] = "O"
+
+
+def ai_move(board, difficulty):
+    state = GameState.from_board(board)
+    move = ai_move_state(state, difficulty)
+    if move is not None:
+        board[move // len(board)][move % len(board)] = "O"
@@ -0,0 +1,212 @@
+import argparse
+import json
+import math
+import os
+import random
+import sys
+import time
+from concurrent.futures import ProcessPoolExecutor
+
+import tic_tac_toe_engine as engine
+from tic_tac_toe_book import BOOK_PATH, load_book
+from tic_tac_toe_engine import BoardVariant, GameState, choose_move
+
+STRATEGIES = ("easy", "medium", "hard")
+
+
+# Log-spaced latency buckets (8 per doubling, in microseconds) so millions of moves merge cheaply
+class LatencyHistogram:
+    BUCKETS_PER_DOUBLING = 8
+
+    def __init__(self, counts=None):
+        self.counts = counts if counts is not None else {}
+
+    def add(self, seconds):
+        micros = max(seconds * 1e6, 1.0)
+        bucket = int(math.log2(micros) * self.BUCKETS_PER_DOUBLING)
+        self.counts[bucket] = self.counts.get(bucket, 0) + 1
+
+    def merge(self, other):
+        for bucket, count in other.counts.items():
+            self.counts[bucket] = self.counts.get(bucket, 0) + count
+
+    def percentile(self, fraction):
+        total = sum(self.counts.values())
+        if not total:
+            return 0.0
+        target = fraction * total
+        seen = 0
+        for bucket in sorted(self.counts):
+            seen += self.counts[bucket]
+            if seen >= target:
+                # Upper edge of the bucket, converted back to milliseconds
+                return 2 ** ((bucket + 1) / self.BUCKETS_PER_DOUBLING) / 1000
+        return 0.0
+
+
+def new_totals():
+    return {
+        'games': 0,
+        'wins_a': 0,
+        'wins_b': 0,
+        'draws': 0,
+        'moves': {'a': 0, 'b': 0},
+        'nodes': {'a': 0, 'b': 0},
+        'latency': {'a': {}, 'b': {}},
+        'seconds': 0.0,
+    }
+
+
+def merge_totals(totals, chunk):
+    for key in ('games', 'wins_a', 'wins_b', 'draws', 'seconds'):
+        totals[key] += chunk[key]
+    for side in ('a', 'b'):
+        totals['moves'][side] += chunk['moves'][side]
+        totals['nodes'][side] += chunk['nodes'][side]
+        LatencyHistogram(totals['latency'][side]).merge(LatencyHistogram(chunk['latency'][side]))
+
+
+def play_game(variant, players, histograms, totals, time_budget):
+    state = GameState(variant=variant)
+    turn = "X"
+    while state.winner() is None:
+        side = players[turn]
+        nodes_before = engine.search_stats['nodes']
+        start = time.perf_counter()
+        move = choose_move(state, totals['strategy'][side], time_budget, player=turn)
+        histograms[side].add(time.perf_counter() - start)
+        totals['nodes'][side] += engine.search_stats['nodes'] - nodes_before
+        totals['moves'][side] += 1
+        state.play(move, turn)
+        turn = "O" if turn == "X" else "X"
+    return state.winner()
+
+
+# Function to play one chunk of games inside a worker process
+def play_chunk(strategy_a, strategy_b, games, seed, size, win_length, time_budget, alternate, book_path):
+    random.seed(seed)
+    if book_path:
+        engine.use_opening_book(load_book(book_path))
+    variant = BoardVariant(size, win_length)
+    totals = new_totals()
+    totals['strategy'] = {'a': strategy_a, 'b': strategy_b}
+    histograms = {'a': LatencyHistogram(), 'b': LatencyHistogram()}
+    start = time.perf_counter()
+    for game in range(games):
+        a_plays = "X" if not alternate or game % 2 == 0 else "O"
+        players = {a_plays: 'a', ("O" if a_plays == "X" else "X"): 'b'}
+        winner = play_game(variant, players, histograms, totals, time_budget)
+        totals['games'] += 1
+        if winner == "Draw":
+            totals['draws'] += 1
+        elif players[winner] == 'a':
+            totals['wins_a'] += 1
+        else:
+            totals['wins_b'] += 1
+    totals['seconds'] = time.perf_counter() - start
+    totals['latency'] = {side: histogram.counts for side, histogram in histograms.items()}
+    del totals['strategy']
+    return totals
+
+
+def run_tournament(strategy_a, strategy_b, games, workers=None, chunk_size=1000, seed=0,
+                   size=3, win_length=3, time_budget=None, alternate=True, book_path=BOOK_PATH):
+    if strategy_a not in STRATEGIES or strategy_b not in STRATEGIES:
+        raise ValueError(f"strategies must be one of {', '.join(STRATEGIES)}")
+    if book_path and not os.path.exists(book_path):
+        book_path = None
+    workers = workers or os.cpu_count() or 1
+    chunks = [min(chunk_size, games - start) for start in range(0, games, chunk_size)]
+    totals = new_totals()
+    start = time.perf_counter()
+    with ProcessPoolExecutor(max_workers=workers) as executor:
+        futures = [
+            executor.submit(play_chunk, strategy_a, strategy_b, count, seed + index, size, win_length,
+                            time_budget, alternate, book_path)
+            for index, count in enumerate(chunks)
+        ]
+        for future in futures:
+            merge_totals(totals, future.result())
+    wall_seconds = time.perf_counter() - start
+    return summarize(strategy_a, strategy_b, totals, wall_seconds, workers, size, win_length, book_path)
+
+
+def summarize(strategy_a, strategy_b, totals, wall_seconds, workers, size, win_length, book_path):
+    games = totals['games'] or 1
+    moves = totals['moves']['a'] + totals['moves']['b']
+    players = {}
+    for side, strategy in (('a', strategy_a), ('b', strategy_b)):
+        histogram = LatencyHistogram(totals['latency'][side])
+        side_moves = totals['moves'][side] or 1
+        players[side] = {
+            'strategy': strategy,
+            'moves': totals['moves'][side],
+            'nodes_per_move': totals['nodes'][side] / side_moves,
+            'latency_ms': {
+                'p50': histogram.percentile(0.50),
+                'p90': histogram.percentile(0.90),
+                'p99': histogram.percentile(0.99),
+                'p999': histogram.percentile(0.999),
+            },
+        }
+    return {
+        'board': {'size': size, 'win_length': win_length},
+        'opening_book': bool(book_path),
+        'workers': workers,
+        'games': totals['games'],
+        'win_rate_a': totals['wins_a'] / games,
+        'win_rate_b': totals['wins_b'] / games,
+        'draw_rate': totals['draws'] / games,
+        'wins_a': totals['wins_a'],
+        'wins_b': totals['wins_b'],
+        'draws': totals['draws'],
+        'moves': moves,
+        'moves_per_second': moves / wall_seconds if wall_seconds else 0.0,
+        'wall_seconds': wall_seconds,
+        'players': players,
+    }
+
+
+def main(argv=None):
+    parser = argparse.ArgumentParser(description="Headless self-play tournaments between tic-tac-toe AIs")
+    parser.add_argument('strategy_a', nargs='?', choices=STRATEGIES)
+    parser.add_argument('strategy_b', nargs='?', choices=STRATEGIES)
+    parser.add_argument('--suite', action='store_true', help="play every pairing of strategies")
+    parser.add_argument('--games', type=int, default=10000)
+    parser.add_argument('--workers', type=int, default=None)
+    parser.add_argument('--chunk-size', type=int, default=1000)
+    parser.add_argument('--seed', type=int, default=0)
+    parser.add_argument('--size', type=int, default=3)
+    parser.add_argument('--win-length', type=int, default=None)
+    parser.add_argument('--time-budget', type=float, default=None, help="seconds per hard move on big boards")
+    parser.add_argument('--no-alternate', action='store_true', help="strategy A always plays X")
+    parser.add_argument('--book', default=BOOK_PATH, help="opening book to use, '' to always search")
+    parser.add_argument('--output', help="write the JSON results to this file instead of stdout")
+    args = parser.parse_args(argv)
+    if args.suite:
+        pairings = [(a, b) for index, a in enumerate(STRATEGIES) for b in STRATEGIES[index:]]
+    elif args.strategy_a and args.strategy_b:
+        pairings = [(args.strategy_a, args.strategy_b)]
+    else:
+        parser.error("give two strategies or --suite")
+
+    runs = [
+        run_tournament(
+            a, b, args.games, workers=args.workers, chunk_size=args.chunk_size,
+            seed=args.seed, size=args.size, win_length=args.win_length or min(args.size, 4),
+            time_budget=args.time_budget, alternate=not args.no_alternate, book_path=args.book,
+        )
+        for a, b in pairings
+    ]
+    results = {'timestamp': time.time(), 'python': sys.version.split()[0], 'runs': runs}
+    text = json.dumps(results, indent=2)
+    if args.output:
+        with open(args.output, 'w') as file:
+            file.write(text + '\n')
+    else:
+        print(text)
+    return 0
+
+
+if __name__ == '__main__':
+    sys.exit(main())
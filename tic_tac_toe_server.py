@@ -0,0 +1,191 @@
+import argparse
+import asyncio
+import json
+import random
+import sys
+import time
+from concurrent.futures import ThreadPoolExecutor
+
+import tic_tac_toe_engine as engine
+from tic_tac_toe_book import BOOK_PATH, load_book
+from tic_tac_toe_session import GameError, SessionManager
+
+# Protocol: one JSON object per line in each direction.
+#   {"op": "new", "difficulty": "hard", "size": 3}   -> {"ok": true, "session": "q3V...", "board": "         ", ...}
+#   {"op": "move", "session": "q3V...", "cell": 4}    -> {"ok": true, "ai_move": 0, "winner": null, ...}
+#   {"op": "result", "session": "q3V..."}             -> {"ok": true, "winner": "Draw", ...}
+#   {"op": "close", "session": "q3V..."}              -> {"ok": true}
+# Errors come back as {"ok": false, "error": "..."}.
+HOST = '127.0.0.1'
+PORT = 8765
+
+
+class GameServer:
+    def __init__(self, manager=None, search_threads=4):
+        self.manager = manager or SessionManager()
+        # Searches on big boards can take up to the time budget, keep them off the event loop
+        self.search_pool = ThreadPoolExecutor(max_workers=search_threads, thread_name_prefix='game-search')
+        self.requests = 0
+
+    async def handle_request(self, request):
+        if not isinstance(request, dict):
+            raise GameError("Requests must be JSON objects")
+        op = request.get('op')
+        if op == 'new':
+            session = self.manager.new_game(
+                request.get('difficulty', 'hard'), request.get('size', 3),
+                request.get('win_length'), request.get('time_budget'),
+            )
+            return session.snapshot()
+        session = self.manager.get(str(request.get('session')))
+        if op == 'move':
+            session.play_human(request.get('cell'))
+            if session.variant.is_classic or session.difficulty != 'hard':
+                move = session.choose_ai_move()
+            else:
+                # Other connections get an error for this game's moves until the search is done
+                session.thinking = True
+                try:
+                    move = await asyncio.get_running_loop().run_in_executor(self.search_pool, session.choose_ai_move)
+                finally:
+                    session.thinking = False
+            session.play_ai(move)
+            return session.snapshot(move)
+        if op == 'result':
+            return session.snapshot()
+        if op == 'close':
+            self.manager.close(session.session_id)
+            return {}
+        raise GameError(f"Unknown op: {op}")
+
+    async def handle_client(self, reader, writer):
+        try:
+            while True:
+                line = await reader.readline()
+                if not line:
+                    break
+                self.requests += 1
+                try:
+                    reply = await self.handle_request(json.loads(line))
+                    reply['ok'] = True
+                except (GameError, ValueError, TypeError) as error:
+                    reply = {'ok': False, 'error': str(error)}
+                writer.write(json.dumps(reply).encode() + b'\n')
+                await writer.drain()
+        except ConnectionError:
+            pass
+        finally:
+            writer.close()
+
+    async def expire_loop(self, interval=60):
+        while True:
+            await asyncio.sleep(interval)
+            self.manager.expire_idle()
+
+    async def start(self, host=HOST, port=PORT):
+        server = await asyncio.start_server(self.handle_client, host, port, limit=2 ** 16, backlog=4096)
+        self.expire_task = asyncio.create_task(self.expire_loop())
+        return server
+
+    def close(self):
+        self.expire_task.cancel()
+        self.search_pool.shutdown(wait=False)
+
+
+async def serve(host=HOST, port=PORT):
+    engine.use_opening_book(load_book(BOOK_PATH))
+    game_server = GameServer()
+    server = await game_server.start(host, port)
+    print(f"Tic-tac-toe server listening on {host}:{port}")
+    async with server:
+        await server.serve_forever()
+
+
+# Load generator: each client plays whole games over its own connection with random legal moves
+async def run_client(host, port, games, difficulty, size, latencies, results):
+    reader, writer = await asyncio.open_connection(host, port)
+
+    async def call(request):
+        start = time.perf_counter()
+        writer.write(json.dumps(request).encode() + b'\n')
+        await writer.drain()
+        reply = json.loads(await reader.readline())
+        latencies.append(time.perf_counter() - start)
+        return reply
+
+    for _ in range(games):
+        reply = await call({'op': 'new', 'difficulty': difficulty, 'size': size})
+        session = reply['session']
+        while reply.get('winner') is None:
+            empty = [cell for cell, mark in enumerate(reply['board']) if mark == ' ']
+            reply = await call({'op': 'move', 'session': session, 'cell': random.choice(empty)})
+            if not reply['ok']:
+                raise RuntimeError(reply['error'])
+        results[reply['winner']] = results.get(reply['winner'], 0) + 1
+        await call({'op': 'close', 'session': session})
+    writer.close()
+
+
+def percentile(sorted_values, fraction):
+    if not sorted_values:
+        return 0.0
+    return sorted_values[min(int(fraction * len(sorted_values)), len(sorted_values) - 1)]
+
+
+async def benchmark(clients=1000, games=5, difficulty='hard', size=3, host=None, port=PORT):
+    game_server = server = None
+    if host is None:
+        # No remote server given: run one in this process on an ephemeral port
+        engine.use_opening_book(load_book(BOOK_PATH))
+        game_server = GameServer()
+        server = await game_server.start(HOST, 0)
+        host, port = HOST, server.sockets[0].getsockname()[1]
+    latencies = []
+    results = {}
+    start = time.perf_counter()
+    await asyncio.gather(*(run_client(host, port, games, difficulty, size, latencies, results)
+                           for _ in range(clients)))
+    seconds = time.perf_counter() - start
+    if server is not None:
+        game_server.close()
+        server.close()
+        await server.wait_closed()
+    latencies.sort()
+    return {
+        'clients': clients,
+        'games': clients * games,
+        'requests': len(latencies),
+        'seconds': seconds,
+        'requests_per_second': len(latencies) / seconds,
+        'games_per_second': clients * games / seconds,
+        'latency_ms': {name: percentile(latencies, fraction) * 1000
+                       for name, fraction in (('p50', 0.5), ('p90', 0.9), ('p99', 0.99), ('max', 1.0))},
+        'results': results,
+    }
+
+
+def main(argv=None):
+    parser = argparse.ArgumentParser(description="Headless tic-tac-toe game server")
+    subparsers = parser.add_subparsers(dest='command', required=True)
+    serve_parser = subparsers.add_parser('serve', help="run the game server")
+    serve_parser.add_argument('--host', default=HOST)
+    serve_parser.add_argument('--port', type=int, default=PORT)
+    bench_parser = subparsers.add_parser('bench', help="measure throughput and latency with a local load generator")
+    bench_parser.add_argument('--clients', type=int, default=1000)
+    bench_parser.add_argument('--games', type=int, default=5, help="games per client")
+    bench_parser.add_argument('--difficulty', default='hard')
+    bench_parser.add_argument('--size', type=int, default=3)
+    bench_parser.add_argument('--host', default=None, help="benchmark a running server instead of an in-process one")
+    bench_parser.add_argument('--port', type=int, default=PORT)
+    args = parser.parse_args(argv)
+
+    if args.command == 'serve':
+        asyncio.run(serve(args.host, args.port))
+    else:
+        results = asyncio.run(benchmark(args.clients, args.games, args.difficulty, args.size, args.host, args.port))
+        print(json.dumps(results, indent=2))
+    return 0
+
+
+if __name__ == '__main__':
+    sys.exit(main())
@@ -0,0 +1,129 @@
+import secrets
+import time
+
+from tic_tac_toe_engine import BoardVariant, GameState, choose_move
+
+DIFFICULTIES = ("easy", "medium", "hard")
+# Board sizes a session may ask for; setting up a variant grows quickly with the size
+MIN_SIZE = 3
+MAX_SIZE = 7
+# Longest a client may have the AI think per move, in seconds
+MAX_TIME_BUDGET = 5.0
+
+
+class GameError(Exception):
+    pass
+
+
+def is_integer(value):
+    return isinstance(value, int) and not isinstance(value, bool)
+
+
+# One game between a human playing X and the AI playing O, with no UI attached
+class GameSession:
+    def __init__(self, session_id, difficulty='hard', size=3, win_length=None, time_budget=None):
+        if difficulty not in DIFFICULTIES:
+            raise GameError(f"Unknown difficulty: {difficulty}")
+        if not is_integer(size) or not MIN_SIZE <= size <= MAX_SIZE:
+            raise GameError(f"Size must be between {MIN_SIZE} and {MAX_SIZE}")
+        if win_length is not None and (not is_integer(win_length) or not MIN_SIZE <= win_length <= size):
+            raise GameError(f"Win length must be between {MIN_SIZE} and the board size")
+        if time_budget is not None:
+            if not isinstance(time_budget, (int, float)) or isinstance(time_budget, bool) or not time_budget > 0:
+                raise GameError("Time budget must be a positive number of seconds")
+            time_budget = min(time_budget, MAX_TIME_BUDGET)
+        variant = BoardVariant(size, win_length or min(size, 4))
+        self.session_id = session_id
+        self.difficulty = difficulty
+        self.time_budget = time_budget
+        self.state = GameState(variant=variant)
+        self.last_active = time.monotonic()
+        # Set while the AI searches off the event loop, the human can't move until it has replied
+        self.thinking = False
+
+    @property
+    def variant(self):
+        return self.state.variant
+
+    def winner(self):
+        return self.state.winner()
+
+    def board(self):
+        return [self.state.cell(cell) for cell in range(self.variant.cell_count)]
+
+    def snapshot(self, ai_move=None):
+        return {
+            'session': self.session_id,
+            'size': self.variant.size,
+            'win_length': self.variant.win_length,
+            'board': ''.join(self.board()),
+            'ai_move': ai_move,
+            'winner': self.winner(),
+        }
+
+    def check_move(self, cell):
+        self.last_active = time.monotonic()
+        if self.thinking:
+            raise GameError("Wait for the AI to move")
+        if self.winner() is not None:
+            raise GameError("The game is over")
+        if not is_integer(cell) or not 0 <= cell < self.variant.cell_count:
+            raise GameError(f"Cell must be between 0 and {self.variant.cell_count - 1}")
+        if not self.state.is_empty(cell):
+            raise GameError("That cell is already taken")
+
+    def play_human(self, cell):
+        self.check_move(cell)
+        self.state.play(cell, "X")
+
+    def choose_ai_move(self):
+        if self.winner() is not None:
+            return None
+        return choose_move(self.state.copy(), self.difficulty, self.time_budget)
+
+    def play_ai(self, move):
+        if move is not None:
+            self.state.play(move, "O")
+        return move
+
+    # Function to play the human's move and the AI reply in one call
+    def play(self, cell):
+        self.play_human(cell)
+        move = self.play_ai(self.choose_ai_move())
+        return self.snapshot(move)
+
+
+class SessionManager:
+    def __init__(self, max_sessions=100000, idle_timeout=600):
+        self.max_sessions = max_sessions
+        self.idle_timeout = idle_timeout
+        self.sessions = {}
+
+    def __len__(self):
+        return len(self.sessions)
+
+    def new_game(self, difficulty='hard', size=3, win_length=None, time_budget=None):
+        if len(self.sessions) >= self.max_sessions:
+            self.expire_idle()
+            if len(self.sessions) >= self.max_sessions:
+                raise GameError("Too many active games")
+        # Unguessable ids, so a client can only play in the games it started
+        session = GameSession(secrets.token_urlsafe(16), difficulty, size, win_length, time_budget)
+        self.sessions[session.session_id] = session
+        return session
+
+    def get(self, session_id):
+        session = self.sessions.get(session_id)
+        if session is None:
+            raise GameError(f"Unknown game: {session_id}")
+        return session
+
+    def close(self, session_id):
+        return self.sessions.pop(session_id, None) is not None
+
+    def expire_idle(self):
+        cutoff = time.monotonic() - self.idle_timeout
+        expired = [session_id for session_id, session in self.sessions.items() if session.last_active < cutoff]
+        for session_id in expired:
+            del self.sessions[session_id]
+        return len(expired)
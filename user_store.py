@@ -0,0 +1,388 @@
+import argparse
+import csv
+import hashlib
+import json
+import os
+import queue
+import sqlite3
+import sys
+import tempfile
+import threading
+import time
+from collections import OrderedDict
+from concurrent.futures import ThreadPoolExecutor
+from contextlib import contextmanager
+
+DB_PATH = 'users.db'
+
+CREATE_USERS_SQL = '''
+    CREATE TABLE IF NOT EXISTS users (
+        id INTEGER PRIMARY KEY AUTOINCREMENT,
+        username TEXT UNIQUE NOT NULL,
+        password TEXT NOT NULL
+    )
+'''
+INSERT_USER_SQL = 'INSERT INTO users (username, password) VALUES (?, ?)'
+AUTHENTICATE_SQL = 'SELECT 1 FROM users WHERE username = ? AND password = ?'
+PASSWORD_SQL = 'SELECT password FROM users WHERE username = ?'
+# Imports take the exported columns; stats missing from the file fall back to the column defaults
+IMPORT_USER_SQL = '''
+    INSERT OR IGNORE INTO users (username, password, last_login, games_played, games_won, games_drawn)
+    VALUES (?, ?, ?, COALESCE(?, 0), COALESCE(?, 0), COALESCE(?, 0))
+'''
+EXPORT_USERS_SQL = 'SELECT username, password, last_login, games_played, games_won, games_drawn FROM users ORDER BY id'
+EXPORT_FIELDS = ('username', 'password', 'last_login', 'games_played', 'games_won', 'games_drawn')
+
+# Schema changes, applied in order and tracked with PRAGMA user_version. ADD COLUMN and
+# CREATE INDEX only append to the database file, so existing users.db files are not rewritten.
+MIGRATIONS = (
+    (
+        'ALTER TABLE users ADD COLUMN last_login REAL',
+        'ALTER TABLE users ADD COLUMN games_played INTEGER NOT NULL DEFAULT 0',
+        'ALTER TABLE users ADD COLUMN games_won INTEGER NOT NULL DEFAULT 0',
+        'ALTER TABLE users ADD COLUMN games_drawn INTEGER NOT NULL DEFAULT 0',
+        'CREATE INDEX IF NOT EXISTS idx_users_last_login ON users (last_login)',
+    ),
+    (
+        'CREATE INDEX IF NOT EXISTS idx_users_games_won ON users (games_won)',
+    ),
+)
+
+
+class ConnectionPool:
+    def __init__(self, path=DB_PATH, size=8, timeout=30):
+        self.path = path
+        self.timeout = timeout
+        self.idle = queue.LifoQueue(maxsize=size)
+        self.created = 0
+        self.size = size
+        self.lock = threading.Lock()
+
+    def connect(self):
+        # isolation_level=None leaves transactions to the explicit BEGIN in transaction()
+        conn = sqlite3.connect(self.path, timeout=self.timeout, check_same_thread=False,
+                               isolation_level=None, cached_statements=256)
+        conn.execute('PRAGMA journal_mode=WAL')
+        conn.execute('PRAGMA synchronous=NORMAL')
+        conn.execute(f'PRAGMA busy_timeout={int(self.timeout * 1000)}')
+        return conn
+
+    def acquire(self):
+        try:
+            return self.idle.get_nowait()
+        except queue.Empty:
+            pass
+        with self.lock:
+            if self.created < self.size:
+                self.created += 1
+                return self.connect()
+        return self.idle.get(timeout=self.timeout)
+
+    def release(self, conn):
+        self.idle.put(conn)
+
+    @contextmanager
+    def connection(self):
+        conn = self.acquire()
+        try:
+            yield conn
+        finally:
+            self.release(conn)
+
+    @contextmanager
+    def transaction(self):
+        with self.connection() as conn:
+            conn.execute('BEGIN IMMEDIATE')
+            try:
+                yield conn
+            except BaseException:
+                conn.execute('ROLLBACK')
+                raise
+            conn.execute('COMMIT')
+
+    def close(self):
+        while True:
+            try:
+                self.idle.get_nowait().close()
+            except queue.Empty:
+                break
+        with self.lock:
+            self.created = 0
+
+
+# Recently successful logins, keyed by username with a digest of the password that worked
+class AuthCache:
+    def __init__(self, max_size=1024, ttl=60):
+        self.max_size = max_size
+        self.ttl = ttl
+        self.entries = OrderedDict()
+        self.lock = threading.Lock()
+        self.hits = 0
+        self.misses = 0
+
+    @staticmethod
+    def digest(password):
+        return hashlib.sha256(password.encode()).digest()
+
+    def check(self, username, password):
+        with self.lock:
+            entry = self.entries.get(username)
+            if entry is not None and entry[1] > time.monotonic() and entry[0] == self.digest(password):
+                self.entries.move_to_end(username)
+                self.hits += 1
+                return True
+            self.misses += 1
+            return False
+
+    def remember(self, username, password):
+        with self.lock:
+            self.entries[username] = (self.digest(password), time.monotonic() + self.ttl)
+            self.entries.move_to_end(username)
+            while len(self.entries) > self.max_size:
+                self.entries.popitem(last=False)
+
+    def forget(self, username):
+        with self.lock:
+            self.entries.pop(username, None)
+
+
+class UserStore:
+    def __init__(self, path=DB_PATH, pool_size=8, cache_size=1024, cache_ttl=60):
+        self.pool = ConnectionPool(path, pool_size)
+        self.cache = AuthCache(cache_size, cache_ttl)
+
+    def create_table(self):
+        with self.pool.connection() as conn:
+            conn.execute(CREATE_USERS_SQL)
+        self.migrate()
+
+    def schema_version(self):
+        with self.pool.connection() as conn:
+            return conn.execute('PRAGMA user_version').fetchone()[0]
+
+    # Function to bring an existing users table up to the latest schema, returns the new version
+    def migrate(self):
+        with self.pool.transaction() as conn:
+            version = conn.execute('PRAGMA user_version').fetchone()[0]
+            for statements in MIGRATIONS[version:]:
+                for statement in statements:
+                    conn.execute(statement)
+            conn.execute(f'PRAGMA user_version={len(MIGRATIONS)}')
+        return len(MIGRATIONS)
+
+    def add_user(self, username, password):
+        try:
+            with self.pool.connection() as conn:
+                conn.execute(INSERT_USER_SQL, (username, password))
+        except sqlite3.IntegrityError:
+            return False
+        self.cache.forget(username)
+        return True
+
+    # Function to register many users in one transaction, returns which ones were added
+    def add_users(self, users):
+        added = []
+        with self.pool.transaction() as conn:
+            for username, password in users:
+                try:
+                    conn.execute(INSERT_USER_SQL, (username, password))
+                    added.append(True)
+                except sqlite3.IntegrityError:
+                    added.append(False)
+        return added
+
+    def authenticate(self, username, password):
+        if self.cache.check(username, password):
+            return True
+        with self.pool.connection() as conn:
+            found = conn.execute(AUTHENTICATE_SQL, (username, password)).fetchone() is not None
+        if found:
+            self.cache.remember(username, password)
+        return found
+
+    def record_login(self, username):
+        with self.pool.connection() as conn:
+            conn.execute('UPDATE users SET last_login = ? WHERE username = ?', (time.time(), username))
+
+    def record_game(self, username, result):
+        column = {'win': 'games_won', 'draw': 'games_drawn'}.get(result)
+        extra = f', {column} = {column} + 1' if column else ''
+        with self.pool.connection() as conn:
+            conn.execute(f'UPDATE users SET games_played = games_played + 1{extra} WHERE username = ?', (username,))
+
+    # Function to stream accounts from a CSV or JSONL file into the table in chunked transactions
+    def import_users(self, path, chunk_size=10000, progress=None):
+        read = inserted = 0
+        for chunk in read_chunks(path, chunk_size):
+            with self.pool.transaction() as conn:
+                before = conn.total_changes
+                conn.executemany(IMPORT_USER_SQL, chunk)
+                inserted += conn.total_changes - before
+            read += len(chunk)
+            if progress is not None:
+                progress(read, inserted)
+        return read, inserted
+
+    def export_users(self, path, chunk_size=10000, progress=None):
+        written = 0
+        jsonl = path.endswith(('.jsonl', '.json'))
+        with open(path, 'w', newline='', encoding='utf-8') as file, self.pool.connection() as conn:
+            writer = None if jsonl else csv.writer(file)
+            if writer is not None:
+                writer.writerow(EXPORT_FIELDS)
+            cursor = conn.execute(EXPORT_USERS_SQL)
+            while True:
+                rows = cursor.fetchmany(chunk_size)
+                if not rows:
+                    break
+                if writer is not None:
+                    writer.writerows(rows)
+                else:
+                    file.writelines(json.dumps(dict(zip(EXPORT_FIELDS, row))) + '\n' for row in rows)
+                written += len(rows)
+                if progress is not None:
+                    progress(written, written)
+        return written
+
+    def recover_password(self, username):
+        with self.pool.connection() as conn:
+            result = conn.execute(PASSWORD_SQL, (username,)).fetchone()
+        return result[0] if result else None
+
+    def close(self):
+        self.pool.close()
+
+
+def read_chunks(path, chunk_size):
+    chunk = []
+    with open(path, newline='', encoding='utf-8') as file:
+        if path.endswith(('.jsonl', '.json')):
+            rows = (json.loads(line) for line in file if line.strip())
+        else:
+            rows = csv.DictReader(file)
+        for row in rows:
+            # Absent columns and empty CSV cells are both NULL
+            optional = (row.get(field) for field in EXPORT_FIELDS[2:])
+            chunk.append((row['username'], row['password'], *(None if value == '' else value for value in optional)))
+            if len(chunk) >= chunk_size:
+                yield chunk
+                chunk = []
+    if chunk:
+        yield chunk
+
+
+def print_progress(done, inserted):
+    print(f"\r{done} rows processed, {inserted} written", end='', file=sys.stderr, flush=True)
+
+
+# Shared by the tic-tac-toe and chatbot apps, connections are opened on first use
+default_store = UserStore(DB_PATH)
+
+
+def legacy_authenticate(path, username, password):
+    conn = sqlite3.connect(path)
+    c = conn.cursor()
+    c.execute('SELECT * FROM users WHERE username = ? AND password = ?', (username, password))
+    user = c.fetchone()
+    conn.close()
+    return user is not None
+
+
+def benchmark(users=1000, logins=20000, clients=64, repeat_fraction=0.5):
+    results = {}
+    with tempfile.TemporaryDirectory() as directory:
+        path = os.path.join(directory, 'users.db')
+        store = UserStore(path, pool_size=clients)
+        store.create_table()
+        accounts = [(f"user{index}", f"password{index}") for index in range(users)]
+        start = time.perf_counter()
+        store.add_users(accounts)
+        results['batched_registrations_per_second'] = users / (time.perf_counter() - start)
+
+        # A share of logins repeat a recently used account, like users re-entering the app
+        hot = accounts[:max(1, users // 20)]
+        attempts = [hot[index % len(hot)] if index % 100 < repeat_fraction * 100 else accounts[index % users]
+                    for index in range(logins)]
+
+        def run(login):
+            start = time.perf_counter()
+            with ThreadPoolExecutor(max_workers=clients) as executor:
+                assert all(executor.map(lambda account: login(*account), attempts))
+            return logins / (time.perf_counter() - start)
+
+        results['legacy_logins_per_second'] = run(lambda username, password: legacy_authenticate(path, username, password))
+        results['pooled_logins_per_second'] = run(store.authenticate)
+        results['auth_cache_hits'] = store.cache.hits
+        results['auth_cache_misses'] = store.cache.misses
+        store.close()
+    return results
+
+
+def benchmark_import(rows=1000000, chunk_size=10000):
+    results = {}
+    with tempfile.TemporaryDirectory() as directory:
+        source = os.path.join(directory, 'users.csv')
+        with open(source, 'w', newline='', encoding='utf-8') as file:
+            writer = csv.writer(file)
+            writer.writerow(('username', 'password'))
+            writer.writerows((f"user{index}", f"password{index}") for index in range(rows))
+        store = UserStore(os.path.join(directory, 'users.db'))
+        store.create_table()
+        start = time.perf_counter()
+        store.import_users(source, chunk_size)
+        results['import_rows_per_second'] = rows / (time.perf_counter() - start)
+        start = time.perf_counter()
+        store.export_users(os.path.join(directory, 'export.jsonl'), chunk_size)
+        results['export_rows_per_second'] = rows / (time.perf_counter() - start)
+        start = time.perf_counter()
+        for index in range(0, rows, max(1, rows // 1000)):
+            store.recover_password(f"user{index}")
+        results['indexed_lookups_per_second'] = 1000 / (time.perf_counter() - start)
+        store.close()
+    return results
+
+
+def main(argv=None):
+    parser = argparse.ArgumentParser(description="Manage and benchmark the users database")
+    parser.add_argument('--db', default=DB_PATH)
+    subparsers = parser.add_subparsers(dest='command', required=True)
+    import_parser = subparsers.add_parser('import', help="load users from a .csv or .jsonl file")
+    import_parser.add_argument('path')
+    import_parser.add_argument('--chunk-size', type=int, default=10000)
+    export_parser = subparsers.add_parser('export', help="write users to a .csv or .jsonl file")
+    export_parser.add_argument('path')
+    export_parser.add_argument('--chunk-size', type=int, default=10000)
+    subparsers.add_parser('migrate', help="upgrade the users table to the latest schema")
+    logins_parser = subparsers.add_parser('bench-logins', help="pooled store against per-call connections")
+    logins_parser.add_argument('--users', type=int, default=1000)
+    logins_parser.add_argument('--logins', type=int, default=20000)
+    logins_parser.add_argument('--clients', type=int, default=64)
+    import_bench_parser = subparsers.add_parser('bench-import', help="bulk import/export into a scratch database")
+    import_bench_parser.add_argument('--rows', type=int, default=1000000)
+    import_bench_parser.add_argument('--chunk-size', type=int, default=10000)
+    args = parser.parse_args(argv)
+
+    if args.command in ('import', 'export', 'migrate'):
+        store = UserStore(args.db)
+        store.create_table()
+        if args.command == 'import':
+            read, inserted = store.import_users(args.path, args.chunk_size, print_progress)
+            print(f"\nImported {inserted} of {read} users", file=sys.stderr)
+        elif args.command == 'export':
+            written = store.export_users(args.path, args.chunk_size, print_progress)
+            print(f"\nExported {written} users", file=sys.stderr)
+        else:
+            print(f"Schema version {store.schema_version()}")
+        store.close()
+        return 0
+    if args.command == 'bench-logins':
+        results = benchmark(args.users, args.logins, args.clients)
+    else:
+        results = benchmark_import(args.rows, args.chunk_size)
+    for name, value in results.items():
+        print(f"{name}: {value:.0f}")
+    return 0
+
+
+if __name__ == '__main__':
+    sys.exit(main())